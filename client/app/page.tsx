@@ -11,11 +11,11 @@ import { PostGrid } from "@/components/PostGrid";
 import { SearchBar } from "@/components/SearchBar";
 import { Pagination } from "@/components/Pagination";
 import { api } from "@/lib/api";
-import type { Post, PaginatedResponse } from "@/lib/types";
+import type { PostSummary, PaginatedResponse } from "@/lib/types";
 import Link from "next/link";
 
 export default function Home() {
-   const [posts, setPosts] = useState<Post[]>([]);
+   const [posts, setPosts] = useState<PostSummary[]>([]);
    const [isLoading, setIsLoading] = useState(true);
    const [currentPage, setCurrentPage] = useState(1);
    const [totalPages, setTotalPages] = useState(1);
@@ -24,10 +24,11 @@ export default function Home() {
    const fetchPosts = useCallback(async () => {
       setIsLoading(true);
       try {
-         const response: PaginatedResponse<Post> = await api.getPosts({
+         const response: PaginatedResponse<PostSummary> = await api.getPosts({
             page: currentPage,
             per_page: 9,
             search: searchQuery,
+            excerpt_length: 160,
          });
          setPosts(response.data);
          setTotalPages(response.total_pages);
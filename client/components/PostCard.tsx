@@ -6,12 +6,12 @@
 
 import Link from "next/link";
 import { motion } from "motion/react";
-import type { Post } from "@/lib/types";
+import type { PostSummary } from "@/lib/types";
 import { MessageSquare, Calendar, User } from "lucide-react";
 import { Card, CardTitle, CardDescription } from "@/components/ui/card";
 
 interface PostCardProps {
-   post: Post;
+   post: PostSummary;
    index?: number;
 }
 
@@ -24,11 +24,6 @@ export function PostCard({ post, index = 0 }: PostCardProps) {
       });
    };
 
-   const truncateContent = (content: string, maxLength: number = 150) => {
-      if (content.length <= maxLength) return content;
-      return content.substring(0, maxLength) + "...";
-   };
-
    return (
       <motion.div
          initial={{ opacity: 0, y: 20 }}
@@ -53,7 +48,7 @@ export function PostCard({ post, index = 0 }: PostCardProps) {
                            {post.title}
                         </CardTitle>
                         <CardDescription className="mt-1 text-sm text-slate-600 dark:text-slate-400 line-clamp-3">
-                           {truncateContent(post.content, 160)}
+                           {post.excerpt}
                         </CardDescription>
                      </div>
                   </div>
@@ -6,12 +6,12 @@
 
 import { useEffect, useMemo, useState } from "react";
 import { PostCard } from "./PostCard";
-import type { Post, Comment } from "@/lib/types";
+import type { PostSummary, Comment } from "@/lib/types";
 import { Card, CardContent } from "@/components/ui/card";
 import { api } from "@/lib/api";
 
 interface PostGridProps {
-   posts: Post[];
+   posts: PostSummary[];
    isLoading?: boolean;
 }
 
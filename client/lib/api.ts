@@ -5,6 +5,7 @@
 
 import type {
    Post,
+   PostSummary,
    Comment,
    PaginatedResponse,
    CreatePostInput,
@@ -56,23 +57,27 @@ class ApiClient {
    // ==================== POSTS API ====================
 
    /**
-    * Get all posts with pagination and optional search
+    * Get post summaries (excerpt instead of content) with pagination and
+    * optional search
     */
    async getPosts(params?: {
       page?: number;
       per_page?: number;
       search?: string;
-   }): Promise<PaginatedResponse<Post>> {
+      excerpt_length?: number;
+   }): Promise<PaginatedResponse<PostSummary>> {
       const searchParams = new URLSearchParams();
       if (params?.page) searchParams.set("page", params.page.toString());
       if (params?.per_page)
          searchParams.set("per_page", params.per_page.toString());
       if (params?.search) searchParams.set("search", params.search);
+      if (params?.excerpt_length)
+         searchParams.set("excerpt_length", params.excerpt_length.toString());
 
       const query = searchParams.toString();
       const resp = await this.request<{
          success: boolean;
-         data: Post[];
+         data: PostSummary[];
          pagination: {
             page: number;
             per_page: number;
@@ -89,7 +94,7 @@ class ApiClient {
          page: resp.pagination.page,
          per_page: resp.pagination.per_page,
          total_pages: resp.pagination.pages,
-      } as PaginatedResponse<Post>;
+      } as PaginatedResponse<PostSummary>;
    }
 
    /**
@@ -11,7 +11,33 @@ export interface Post {
    created_at: string;
    updated_at: string;
    comment_count: number;
+   average_rating: number | null;
    comments?: Comment[];
+   comments_pagination?: CursorPagination;
+}
+
+/**
+ * Post as returned by listings: the default "summary" field set has a
+ * server-computed `excerpt` instead of the full `content`
+ */
+export interface PostSummary {
+   id: number;
+   title: string;
+   excerpt: string;
+   author: string;
+   created_at: string;
+   updated_at: string;
+   comment_count: number;
+   average_rating: number | null;
+}
+
+export interface CursorPagination {
+   per_page: number;
+   next_cursor: string | null;
+   prev_cursor: string | null;
+   has_next: boolean;
+   has_prev: boolean;
+   total?: number;
 }
 
 export interface Comment {
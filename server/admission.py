@@ -0,0 +1,329 @@
+"""
+Admission control: rate limits and concurrency caps that shed load early.
+
+A burst of costly requests (full-text search, deep or large pages) would
+otherwise queue for the database pool until every worker thread waits on
+it and the whole API stops answering. `init_admission` registers a
+before-request hook that answers such requests at once instead:
+
+- 429 when the client's token bucket for the route is empty
+- 503 when the route's bucket is empty, or when the route already runs
+  `max_in_flight` requests in this process and no slot frees up within
+  the request's queue-time budget (`max_queue_ms`, less the time spent
+  queued in front of the app as reported by `X-Request-Start`)
+
+Both carry a `Retry-After` header. Each request is classed by cost
+(`classify`), and each class has its own budget in `ADMISSION_BUDGETS`,
+so searches and deep pages get stricter limits than cached reads.
+
+Token buckets live in Redis (shared by all processes, refilled by a Lua
+script) or, with `ADMISSION_BACKEND = 'memory'`, in process; if Redis is
+unreachable the in-process buckets take over. In-flight caps are always
+per process.
+"""
+
+import logging
+import math
+import threading
+import time
+from flask import current_app, g, jsonify, request
+from instrumentation import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# Refills a bucket for the time elapsed since its last use, then takes
+# `cost` tokens if it holds enough (a negative cost gives tokens back, up
+# to `burst`). Returns the seconds until it will, as a string (Lua numbers
+# are truncated to integers on the way out).
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = math.min(burst, tokens - cost)
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class MemoryTokenBuckets:
+    """
+    In-process token buckets.
+
+    Args:
+        prune_every: Drop idle (full) buckets after this many takes
+    """
+
+    def __init__(self, prune_every=1000):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._prune_every = prune_every
+        self._takes = 0
+
+    def take(self, key, rate, burst, cost=1):
+        """
+        Take `cost` tokens from the bucket `key`.
+
+        Args:
+            key: Bucket name
+            rate: Tokens added per second
+            burst: Bucket size (and the tokens of a new bucket)
+            cost: Tokens to take; negative to give back tokens taken for
+                a request that was rejected later on
+
+        Returns:
+            0 if the tokens were taken, else the seconds until they could be
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (burst, now, None))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0
+            if tokens >= cost:
+                tokens = min(burst, tokens - cost)
+            else:
+                wait = (cost - tokens) / rate
+            # A bucket untouched for burst / rate seconds is full again, the
+            # same as a missing one
+            self._buckets[key] = (tokens, now, now + burst / rate)
+            self._takes += 1
+            if self._takes % self._prune_every == 0:
+                for key in [key for key, (_, _, full_at) in self._buckets.items() if full_at < now]:
+                    del self._buckets[key]
+        return wait
+
+
+class RedisTokenBuckets:
+    """
+    Token buckets in Redis hashes under `prefix`, shared by every process.
+
+    Falls back to in-process buckets while Redis is unavailable.
+
+    Args:
+        client: redis.Redis client
+        prefix: Key prefix
+    """
+
+    def __init__(self, client, prefix='admission:'):
+        self.client = client
+        self.prefix = prefix
+        self.fallback = MemoryTokenBuckets()
+        self._take = client.register_script(TAKE_SCRIPT)
+
+    def take(self, key, rate, burst, cost=1):
+        """Take `cost` tokens (see MemoryTokenBuckets.take)."""
+        try:
+            return float(self._take(keys=[self.prefix + key], args=[rate, burst, cost]))
+        except Exception:
+            logger.exception('Redis unavailable for admission control, using in-process buckets')
+            return self.fallback.take(key, rate, burst, cost)
+
+
+class InFlightLimiter:
+    """Caps the requests running at once per route and cost class in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slots = {}
+
+    def acquire(self, route, limit, timeout):
+        """
+        Wait up to `timeout` seconds for one of the `limit` slots of `route`.
+
+        Args:
+            route: Name of the slots ('<endpoint>:<cost class>'); `limit`
+                must be the same on every call for it
+            limit: Slots of the route
+            timeout: Seconds to wait
+
+        Returns:
+            Callable releasing the slot, or None if none freed up in time
+        """
+        with self._lock:
+            slots = self._slots.get(route)
+            if slots is None:
+                slots = self._slots[route] = threading.BoundedSemaphore(limit)
+        if not slots.acquire(timeout=max(timeout, 0)):
+            return None
+        return slots.release
+
+
+def classify(req, config):
+    """
+    Cost class of a request: an `ADMISSION_ROUTE_CLASSES` entry for its
+    endpoint, else 'write' for writes, 'export' for the NDJSON exports,
+    'expensive' for searches and deep or large offset pages, and 'read'.
+    """
+    name = config['ADMISSION_ROUTE_CLASSES'].get(req.endpoint)
+    if name:
+        return name
+    if req.method not in ('GET', 'HEAD'):
+        return 'write'
+    if req.blueprint == 'export':
+        return 'export'
+
+    args = req.args
+    if args.get('search') or args.get('sort') == 'relevance':
+        return 'expensive'
+    # Keyset pages cost the same at any depth; offset pages grow with it
+    if 'cursor' not in args and args.get('page', 1, type=int) > config['ADMISSION_DEEP_PAGE']:
+        return 'expensive'
+    if args.get('per_page', 0, type=int) > config['ADMISSION_LARGE_PAGE']:
+        return 'expensive'
+    return 'read'
+
+
+def client_id(req, config):
+    """
+    Client a request counts against.
+
+    Each proxy appends the address it received the request from to
+    `ADMISSION_CLIENT_HEADER` (X-Forwarded-For), and a client can put
+    anything in front of that, so only the entries added by our own
+    `ADMISSION_TRUSTED_PROXIES` proxies are believed: the client is the
+    entry that many places from the right. Without the header, or with no
+    trusted proxies, it is the peer address.
+    """
+    header = config['ADMISSION_CLIENT_HEADER']
+    hops = config['ADMISSION_TRUSTED_PROXIES']
+    value = req.headers.get(header) if header and hops > 0 else None
+    if value:
+        entries = [entry.strip() for entry in value.split(',')]
+        if len(entries) >= hops and entries[-hops]:
+            return entries[-hops]
+    return req.remote_addr or 'unknown'
+
+
+def upstream_queue_time(header, now=None):
+    """
+    Seconds a request waited before reaching the app, from an
+    `X-Request-Start` value ('t=<seconds, ms or us since the epoch>').
+
+    Returns:
+        Seconds (0 if the header is absent or malformed)
+    """
+    if not header:
+        return 0.0
+    try:
+        started = float(header.strip().removeprefix('t='))
+    except ValueError:
+        return 0.0
+    # Proxies send seconds (nginx $msec), milliseconds or microseconds
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    now = time.time() if now is None else now
+    return max(0.0, now - started)
+
+
+def get_token_buckets():
+    """
+    Get the token buckets of the current app.
+
+    Returns:
+        RedisTokenBuckets or MemoryTokenBuckets, created once per app
+    """
+    buckets = current_app.extensions.get('admission_buckets')
+    if buckets is None:
+        config = current_app.config
+        name = config['ADMISSION_BACKEND']
+        if name == 'auto':
+            name = 'redis' if config['CACHE_TYPE'] == 'RedisCache' else 'memory'
+        if name == 'redis':
+            import redis
+            buckets = RedisTokenBuckets(redis.from_url(config['REDIS_URL']))
+        else:
+            buckets = MemoryTokenBuckets()
+        current_app.extensions['admission_buckets'] = buckets
+    return buckets
+
+
+def _reject(status, retry_after, reason, cost_class):
+    get_metrics().inc(
+        'admission_rejected_total', 'Requests shed by admission control',
+        endpoint=request.endpoint, cost_class=cost_class, reason=reason
+    )
+    error = 'Too many requests, retry later' if status == 429 else 'Server busy, retry later'
+    response = jsonify({'success': False, 'error': error})
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response, status
+
+
+def admit_request():
+    """Before-request hook: reject the request if it is over budget."""
+    config = current_app.config
+    endpoint = request.endpoint
+    if endpoint is None or endpoint in config['ADMISSION_EXEMPT'] or request.method == 'OPTIONS':
+        return None
+
+    cost_class = classify(request, config)
+    budget = config['ADMISSION_BUDGETS'][cost_class]
+    buckets = get_token_buckets()
+
+    # Each cost class of a route has its own buckets and slots, so costly
+    # requests never use up the budget of cheap ones
+    route = f'{endpoint}:{cost_class}'
+    client_key = None
+    if budget.get('client_rate'):
+        client_key = f'client:{client_id(request, config)}:{route}'
+        wait = buckets.take(client_key, budget['client_rate'], budget['client_burst'])
+        if wait:
+            return _reject(429, wait, 'client_rate', cost_class)
+    if budget.get('rate'):
+        wait = buckets.take(f'route:{route}', budget['rate'], budget['burst'])
+        if wait:
+            # Not served, so not counted against the client
+            if client_key:
+                buckets.take(client_key, budget['client_rate'], budget['client_burst'], cost=-1)
+            return _reject(503, wait, 'route_rate', cost_class)
+
+    if budget.get('max_in_flight'):
+        queued = upstream_queue_time(request.headers.get('X-Request-Start'))
+        timeout = budget.get('max_queue_ms', 0) / 1000 - queued
+        if timeout < 0:
+            return _reject(503, config['ADMISSION_RETRY_AFTER'], 'queue_time', cost_class)
+        limiter = current_app.extensions['admission_limiter']
+        release = limiter.acquire(route, budget['max_in_flight'], timeout)
+        if release is None:
+            return _reject(503, config['ADMISSION_RETRY_AFTER'], 'in_flight', cost_class)
+        g.admission_release = release
+    return None
+
+
+def hold_slot_while_streaming(response):
+    """After-request hook: a streamed response keeps its slot until it is closed."""
+    release = g.pop('admission_release', None)
+    if release is not None:
+        if response.is_streamed:
+            response.call_on_close(release)
+        else:
+            release()
+    return response
+
+
+def release_slot(error=None):
+    """Teardown hook: free the slot of a request that never got a response."""
+    release = g.pop('admission_release', None)
+    if release is not None:
+        release()
+
+
+def init_admission(app):
+    """Shed requests over their budget (if `ADMISSION_ENABLED`)."""
+    if app.config['ADMISSION_ENABLED']:
+        app.extensions['admission_limiter'] = InFlightLimiter()
+        app.before_request(admit_request)
+        app.after_request(hold_slot_while_streaming)
+        app.teardown_request(release_slot)
@@ -6,15 +6,17 @@ import os
 from flask import Flask, jsonify
 from flask_cors import CORS
 from flask_migrate import Migrate
-from flask_caching import Cache
 from config import config
+from database import configure_engine_options, init_pool_instrumentation, init_replica_routing
+from serializers import json_provider_class
 
 # Import db from models (it's created there)
 from models import db
+# Import cache from caching (it's created there, so routes can use it)
+from caching import cache
 
 # Initialize extensions
 migrate = Migrate()
-cache = Cache()
 
 
 def create_app(config_name=None):
@@ -32,18 +34,26 @@ def create_app(config_name=None):
     
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    app.json = json_provider_class(app.config['JSON_PROVIDER'])(app)
     
     # Initialize extensions with app
+    configure_engine_options(app)
     db.init_app(app)
+    init_replica_routing(app)
     migrate.init_app(app, db)
-    # Use Redis for caching in Docker environment. `REDIS_URL` is defined
-    # in `server/config.py` (can be overridden with env vars).
+    # Use Redis for caching in Docker environment. `REDIS_URL` and
+    # `CACHE_TYPE` are defined in `server/config.py` (can be overridden
+    # with env vars; tests use the in-process SimpleCache).
     cache.init_app(app, config={
-        'CACHE_TYPE': 'RedisCache',
+        'CACHE_TYPE': app.config['CACHE_TYPE'],
         'CACHE_REDIS_URL': app.config.get('REDIS_URL'),
         'CACHE_DEFAULT_TIMEOUT': app.config['CACHE_DEFAULT_TIMEOUT']
     })
     
+    # In-process L1 tier statistics on /metrics (see local_cache.py)
+    from local_cache import init_local_cache
+    init_local_cache(app)
+    
     # Configure CORS
     CORS(app, origins=app.config['CORS_ORIGINS'])
     
@@ -53,9 +63,28 @@ def create_app(config_name=None):
     # Register blueprints
     from routes.posts import posts_bp
     from routes.comments import comments_bp
+    from routes.export import export_bp
     
     app.register_blueprint(posts_bp, url_prefix='/api/posts')
     app.register_blueprint(comments_bp, url_prefix='/api/comments')
+    app.register_blueprint(export_bp, url_prefix='/api/export')
+    
+    # Per-request query/cache instrumentation, Server-Timing and /metrics
+    from instrumentation import init_instrumentation
+    init_instrumentation(app)
+    init_pool_instrumentation(app)
+    
+    # Rate limits and in-flight caps that shed load with 429/503
+    from admission import init_admission
+    init_admission(app)
+    
+    # Negotiated gzip/br/zstd compression of responses
+    from compression import init_compression
+    init_compression(app)
+    
+    # Register maintenance CLI commands
+    from commands import register_commands
+    register_commands(app)
     
     # Root endpoint
     @app.route('/')
@@ -65,7 +94,8 @@ def create_app(config_name=None):
             'version': '1.0.0',
             'endpoints': {
                 'posts': '/api/posts',
-                'comments': '/api/comments'
+                'comments': '/api/comments',
+                'export': '/api/export'
             }
         })
     
@@ -0,0 +1,12 @@
+"""
+ASGI entry point for the async API (see async_api.py).
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+
+Uses the configuration named by FLASK_ENV (default: production).
+"""
+
+import os
+from async_api import create_asgi_app
+
+app = create_asgi_app(os.environ.get('FLASK_ENV', 'production'))
@@ -0,0 +1,671 @@
+"""
+Async (ASGI) variant of the API, served by uvicorn (see asgi.py).
+
+Handlers are `async def` Starlette endpoints. They reach the database
+through SQLAlchemy's asyncio extension (asyncpg on PostgreSQL, aiosqlite
+on SQLite) and the cache through redis.asyncio (see async_caching.py), so
+a worker waiting on I/O keeps serving its other connections instead of
+holding a thread per request. They reuse the models, validation.py, the
+pagination helpers and the cache keys of the Flask blueprints and return
+the same JSON.
+
+Listing, reading and single-item writes of posts and comments are served
+natively. Every other request (search, batch writes, exports, /metrics)
+falls through to the Flask app, which is mounted as a WSGI fallback and
+runs in a thread pool, so the ASGI server exposes the whole API.
+
+The async engine always uses the primary database; read replicas
+(`DATABASE_REPLICA_URLS`) only serve the Flask routes.
+"""
+
+import math
+import os
+from contextlib import asynccontextmanager
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import delete, func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse as StarletteJSONResponse, Response
+from starlette.routing import Mount, Route
+from app import create_app
+from async_caching import AsyncResponseCache, async_cache_client
+from local_cache import get_local_tier
+from caching import COMMENTS_SCOPE, POSTS_SCOPE, post_scope
+from conditional import Validators, cache_control
+from database import _apply_driver_options
+from models import Comment, Post, POST_COLUMNS, COMMENT_COLUMNS
+from pagination import InvalidCursor, keyset_page, keyset_window, parse_cursor_args
+from search import get_search_backend
+from projection import PostProjection
+from rankings import get_rankings
+from serializers import comment_dict, dumps_bytes, orjson, parse_post_fields, post_dict
+from validation import (
+    ValidationError, validate_comment_changes, validate_new_comment, validate_new_post,
+    validate_post_changes
+)
+
+# Async driver used for each database backend
+ASYNC_DRIVERS = {
+    'postgresql': 'asyncpg',
+    'sqlite': 'aiosqlite',
+}
+
+# Engine options that only apply to the synchronous engine
+_SYNC_ONLY_OPTIONS = ('poolclass', 'connect_args')
+
+
+def async_database_uri(uri):
+    """
+    Rewrite a database URI to use the async driver of its backend.
+
+    Args:
+        uri: SQLAlchemy URI (e.g. postgresql://... or sqlite:///...)
+
+    Returns:
+        URL object with the async driver
+
+    Raises:
+        ValueError: If the backend has no supported async driver
+    """
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'No async driver for {backend} databases')
+    return url.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}')
+
+
+def create_async_engine_for(app):
+    """
+    Create the async engine for the primary database of a Flask app, with
+    the same pool settings and statement timeout as its sync engine.
+    """
+    uri = async_database_uri(app.config['SQLALCHEMY_DATABASE_URI'])
+    options = {
+        name: value for name, value in (app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}).items()
+        if name not in _SYNC_ONLY_OPTIONS
+    }
+    _apply_driver_options(app, options, uri)
+    return create_async_engine(uri, **options)
+
+
+# Names the bytes JSONResponse renders in ETags; with orjson they match
+# the Flask app's OrjsonProvider, so both servers send the same ETags
+RESPONSE_ENCODER = 'OrjsonProvider' if orjson is not None else 'dumps_bytes'
+
+
+class JSONResponse(StarletteJSONResponse):
+    """JSON response encoded like the Flask app's (orjson when installed)."""
+
+    def render(self, content):
+        return dumps_bytes(content) + b'\n'
+
+
+def _error(message, status):
+    return JSONResponse({'success': False, 'error': message}, status_code=status)
+
+
+def _check_not_modified(request, key, endpoint):
+    """
+    Validate a request against the response cached under `key`; see
+    `check_not_modified` in conditional.py.
+
+    Args:
+        request: Starlette request
+        key: Cache key of the response
+        endpoint: Name of the matching Flask endpoint, which selects the
+            `Cache-Control` policy
+
+    Returns:
+        Tuple of (validators or None, 304 response or None)
+    """
+    validators = Validators.for_key(key, RESPONSE_ENCODER)
+    if validators is None or not validators.matches(request.headers):
+        return validators, None
+    headers = dict(validators.headers(), **{'Cache-Control': cache_control(request.app.state.config, endpoint)})
+    return validators, Response(status_code=304, headers=headers)
+
+
+def _with_validators(request, response, validators, endpoint):
+    """Add validators and the endpoint's `Cache-Control` to a 200 response."""
+    if validators is not None:
+        response.headers.update(validators.headers())
+    response.headers['Cache-Control'] = cache_control(request.app.state.config, endpoint)
+    return response
+
+
+def _int_arg(request, name, default):
+    """Integer query parameter, or `default` if missing or malformed."""
+    try:
+        return int(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+
+
+async def _json_body(request):
+    """Request JSON, or None if the body is empty or not JSON."""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def _fallback(request):
+    """Hand the request to the Flask app (any ASGI app can be returned)."""
+    return request.app.state.wsgi
+
+
+async def _search_backend_call(request, method, *args):
+    """Tell the Flask app's search backend about a write, in a worker thread."""
+    def call():
+        with request.app.state.flask_app.app_context():
+            getattr(get_search_backend(), method)(*args)
+    await run_in_threadpool(call)
+
+
+async def _rankings_call(request, method, **kwargs):
+    """Apply a write to the Flask app's rankings, in a worker thread."""
+    def call():
+        with request.app.state.flask_app.app_context():
+            getattr(get_rankings(), method)(**kwargs)
+    await run_in_threadpool(call)
+
+
+async def _offset_page(session, statement, order_by, page, per_page):
+    """
+    Fetch one page with LIMIT/OFFSET, like Flask-SQLAlchemy's `paginate`.
+
+    Returns:
+        Tuple of (items, pagination dict)
+    """
+    total = await session.scalar(select(func.count()).select_from(statement.subquery()))
+    items = (await session.execute(
+        statement.order_by(*order_by).limit(per_page).offset((page - 1) * per_page)
+    )).all()
+    pages = math.ceil(total / per_page) if total else 0
+    return items, {
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': pages,
+        'has_next': page < pages,
+        'has_prev': page > 1
+    }
+
+
+async def _keyset_result(session, statement, model, cursor, per_page, include_total, secret):
+    """Fetch one keyset page; returns (items, pagination dict)."""
+    total = None
+    if include_total:
+        total = await session.scalar(select(func.count()).select_from(statement.subquery()))
+    rows = (await session.execute(keyset_window(statement, model, cursor, per_page))).all()
+    result = keyset_page(rows, cursor, per_page, total)
+    return result.items, result.pagination_dict(per_page, secret)
+
+
+async def list_posts(request):
+    """
+    Get all posts with pagination; same parameters and response as
+    GET /api/posts. Searches are served by the Flask app.
+    """
+    state = request.app.state
+    try:
+        if request.query_params.get('search', '').strip():
+            return _fallback(request)
+
+        page = max(_int_arg(request, 'page', 1), 1)
+        per_page = _int_arg(request, 'per_page', 10)
+        sort = request.query_params.get('sort', 'newest')
+        if per_page < 1 or per_page > 100:
+            per_page = 10
+        if sort not in ('newest', 'relevance'):
+            sort = 'newest'
+
+        excerpt_length = _int_arg(request, 'excerpt_length', state.config['POST_EXCERPT_LENGTH'])
+        if excerpt_length < 1 or excerpt_length > state.config['POST_EXCERPT_MAX_LENGTH']:
+            excerpt_length = state.config['POST_EXCERPT_LENGTH']
+
+        try:
+            projection = PostProjection(parse_post_fields(request.query_params.get('fields', '')), excerpt_length)
+            cursor_mode, cursor, include_total = parse_cursor_args(request.query_params, state.secret)
+        except (InvalidCursor, ValidationError) as e:
+            return _error(str(e), 400)
+
+        if cursor_mode and sort == 'relevance':
+            return _error('sort=relevance is not supported with cursor pagination', 400)
+
+        async def build_page():
+            async with state.sessions() as session:
+                if cursor_mode:
+                    items, pagination = await _keyset_result(
+                        session, select(*projection.columns), Post, cursor, per_page, include_total, state.secret
+                    )
+                else:
+                    items, pagination = await _offset_page(
+                        session, select(*projection.columns), [Post.created_at.desc()], page, per_page
+                    )
+            return {
+                'success': True,
+                'data': [projection.to_dict(row) for row in items],
+                'pagination': pagination
+            }
+
+        # Same key as the Flask route, so both servers share entries
+        key = await state.cache.cache_key(
+            'posts:list', [POSTS_SCOPE],
+            page=page, per_page=per_page, search='', sort=sort,
+            cursor=cursor.key() if cursor else cursor_mode,
+            include_total=include_total, **projection.cache_params()
+        )
+        validators, not_modified = _check_not_modified(request, key, 'posts.get_all_posts')
+        if not_modified:
+            return not_modified
+
+        payload = await state.cache.read_through(key, state.config['CACHE_POSTS_TIMEOUT'], build_page)
+        return _with_validators(request, JSONResponse(payload), validators, 'posts.get_all_posts')
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+async def get_post(request):
+    """Get a single post with its most recent comments (see GET /api/posts/<id>)."""
+    state = request.app.state
+    try:
+        post_id = request.path_params['post_id']
+        default_comments = state.config['POST_DETAIL_COMMENTS']
+        comments_limit = _int_arg(request, 'comments', default_comments)
+        include_comments = request.query_params.get('include_comments', 'true').lower() not in ('0', 'false', 'no')
+        if comments_limit < 1 or comments_limit > 100:
+            comments_limit = default_comments
+
+        async def build_post():
+            async with state.sessions() as session:
+                row = (await session.execute(select(*POST_COLUMNS).where(Post.id == post_id))).first()
+                if not row:
+                    return None
+
+                data = post_dict(row)
+                if include_comments:
+                    items, pagination = await _keyset_result(
+                        session, select(*COMMENT_COLUMNS).where(Comment.post_id == post_id), Comment,
+                        None, comments_limit, False, state.secret
+                    )
+                    data['comments'] = [comment_dict(row) for row in items]
+                    data['comments_pagination'] = pagination
+            return {
+                'success': True,
+                'data': data
+            }
+
+        key = await state.cache.cache_key(
+            'posts:detail', [post_scope(post_id)],
+            post_id=post_id, comments=comments_limit if include_comments else 0
+        )
+        validators, not_modified = _check_not_modified(request, key, 'posts.get_post')
+        if not_modified:
+            return not_modified
+
+        payload = await state.cache.read_through(key, state.config['CACHE_POSTS_TIMEOUT'], build_post)
+
+        if payload is None:
+            return _error('Post not found', 404)
+        return _with_validators(request, JSONResponse(payload), validators, 'posts.get_post')
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+async def create_post(request):
+    """Create a new blog post (see POST /api/posts)."""
+    state = request.app.state
+    try:
+        data = await _json_body(request)
+        if not data:
+            return _error('Request body is required', 400)
+
+        try:
+            fields = validate_new_post(data)
+        except ValidationError as e:
+            return _error(str(e), 400)
+
+        async with state.sessions() as session:
+            post = Post(**fields)
+            session.add(post)
+            await session.commit()
+
+        await state.cache.invalidate(POSTS_SCOPE, post_scope(post.id))
+        await _search_backend_call(request, 'post_saved', post)
+
+        return JSONResponse({
+            'success': True,
+            'message': 'Post created successfully',
+            'data': post.to_dict()
+        }, status_code=201)
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+async def update_post(request):
+    """Update an existing blog post (see PUT /api/posts/<id>)."""
+    state = request.app.state
+    try:
+        post_id = request.path_params['post_id']
+        async with state.sessions() as session:
+            post = await session.get(Post, post_id)
+            if not post:
+                return _error('Post not found', 404)
+
+            data = await _json_body(request)
+            if not data:
+                return _error('Request body is required', 400)
+
+            try:
+                changes = validate_post_changes(data)
+            except ValidationError as e:
+                return _error(str(e), 400)
+
+            for field, value in changes.items():
+                setattr(post, field, value)
+            await session.commit()
+
+        await state.cache.invalidate(POSTS_SCOPE, post_scope(post_id))
+        await _search_backend_call(request, 'post_saved', post)
+
+        return JSONResponse({
+            'success': True,
+            'message': 'Post updated successfully',
+            'data': post.to_dict()
+        })
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+async def delete_post(request):
+    """Delete a blog post and its comments (see DELETE /api/posts/<id>)."""
+    state = request.app.state
+    try:
+        post_id = request.path_params['post_id']
+        async with state.sessions() as session:
+            if await session.get(Post, post_id) is None:
+                return _error('Post not found', 404)
+
+            # The dynamic `comments` relationship cannot be loaded by an
+            # async session, so delete the comments explicitly
+            await session.execute(delete(Comment).where(Comment.post_id == post_id))
+            await session.execute(delete(Post).where(Post.id == post_id))
+            await session.commit()
+
+        await state.cache.invalidate(POSTS_SCOPE, COMMENTS_SCOPE, post_scope(post_id))
+        await _search_backend_call(request, 'post_deleted', post_id)
+        await _rankings_call(request, 'posts_deleted', post_ids=[post_id])
+
+        return JSONResponse({
+            'success': True,
+            'message': 'Post deleted successfully'
+        })
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+async def _comments_page(request, endpoint, prefix, scope, post_id, filtered):
+    """
+    Shared body of the two comment listings.
+
+    Args:
+        request: Starlette request
+        endpoint: Name of the matching Flask endpoint
+        prefix: Cache key prefix of the matching Flask route
+        scope: Cache scope the listing depends on
+        post_id: Post to list comments of, or None for all comments
+        filtered: Whether `post_id` was given (returns 404 if it does not exist)
+    """
+    state = request.app.state
+    page = max(_int_arg(request, 'page', 1), 1)
+    per_page = _int_arg(request, 'per_page', 20)
+    if per_page < 1 or per_page > 100:
+        per_page = 20
+
+    try:
+        cursor_mode, cursor, include_total = parse_cursor_args(request.query_params, state.secret)
+    except InvalidCursor as e:
+        return _error(str(e), 400)
+
+    async def build_page():
+        async with state.sessions() as session:
+            statement = select(*COMMENT_COLUMNS)
+            if filtered:
+                if await session.get(Post, post_id) is None:
+                    return None
+                statement = statement.where(Comment.post_id == post_id)
+
+            if cursor_mode:
+                items, pagination = await _keyset_result(
+                    session, statement, Comment, cursor, per_page, include_total, state.secret
+                )
+            else:
+                items, pagination = await _offset_page(
+                    session, statement, [Comment.created_at.desc()], page, per_page
+                )
+        return {
+            'success': True,
+            'data': [comment_dict(row) for row in items],
+            'pagination': pagination
+        }
+
+    key = await state.cache.cache_key(
+        prefix, [scope],
+        page=page, per_page=per_page, post_id=post_id,
+        cursor=cursor.key() if cursor else cursor_mode,
+        include_total=include_total
+    )
+    validators, not_modified = _check_not_modified(request, key, endpoint)
+    if not_modified:
+        return not_modified
+
+    payload = await state.cache.read_through(key, state.config['CACHE_COMMENTS_TIMEOUT'], build_page)
+
+    if payload is None:
+        return _error('Post not found', 404)
+    return _with_validators(request, JSONResponse(payload), validators, endpoint)
+
+
+async def list_comments(request):
+    """Get all comments, optionally of one post (see GET /api/comments)."""
+    try:
+        post_id = _int_arg(request, 'post_id', None)
+        return await _comments_page(request, 'comments.get_all_comments', 'comments:list', COMMENTS_SCOPE, post_id, bool(post_id))
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+async def list_post_comments(request):
+    """Get the comments of a post (see GET /api/comments/post/<id>)."""
+    try:
+        post_id = request.path_params['post_id']
+        return await _comments_page(request, 'comments.get_comments_for_post', 'comments:post', post_scope(post_id), post_id, True)
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+async def _invalidate_comments(request, post_id):
+    await request.app.state.cache.invalidate(POSTS_SCOPE, COMMENTS_SCOPE, post_scope(post_id))
+
+
+async def _apply_comment_delta(session, post_id, comments, rating_sum, ratings):
+    statement = Post.comment_deltas_statement({post_id: (comments, rating_sum, ratings)})
+    if statement is not None:
+        await session.execute(*statement)
+
+
+async def create_comment(request):
+    """Create a new comment on a post (see POST /api/comments)."""
+    state = request.app.state
+    try:
+        if state.config['COMMENT_INGEST_MODE'] == 'queue':
+            return _fallback(request)
+
+        data = await _json_body(request)
+        if not data:
+            return _error('Request body is required', 400)
+
+        try:
+            fields = validate_new_comment(data)
+        except ValidationError as e:
+            return _error(str(e), 400)
+
+        post_id = fields['post_id']
+        async with state.sessions() as session:
+            if await session.get(Post, post_id) is None:
+                return _error('Post not found', 404)
+
+            comment = Comment(**fields)
+            session.add(comment)
+            await _apply_comment_delta(session, post_id, 1, *Comment.rating_delta(None, fields['rating']))
+            await session.commit()
+
+        await _invalidate_comments(request, post_id)
+        await _rankings_call(
+            request, 'comments_changed', added=[(post_id, None)], rated=[post_id] if fields['rating'] else ()
+        )
+
+        return JSONResponse({
+            'success': True,
+            'message': 'Comment created successfully',
+            'data': comment.to_dict()
+        }, status_code=201)
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+async def update_comment(request):
+    """Update an existing comment (see PUT /api/comments/<id>)."""
+    state = request.app.state
+    try:
+        async with state.sessions() as session:
+            comment = await session.get(Comment, request.path_params['comment_id'])
+            if not comment:
+                return _error('Comment not found', 404)
+
+            data = await _json_body(request)
+            if not data:
+                return _error('Request body is required', 400)
+
+            old_rating = comment.rating
+            try:
+                changes = validate_comment_changes(data)
+            except ValidationError as e:
+                return _error(str(e), 400)
+
+            for field, value in changes.items():
+                setattr(comment, field, value)
+
+            # Keep the post's rating aggregates in step with a rating change
+            await _apply_comment_delta(session, comment.post_id, 0, *Comment.rating_delta(old_rating, comment.rating))
+            await session.commit()
+
+        await _invalidate_comments(request, comment.post_id)
+        if comment.rating != old_rating:
+            await _rankings_call(request, 'comments_changed', rated=[comment.post_id])
+
+        return JSONResponse({
+            'success': True,
+            'message': 'Comment updated successfully',
+            'data': comment.to_dict()
+        })
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+async def delete_comment(request):
+    """Delete a comment (see DELETE /api/comments/<id>)."""
+    state = request.app.state
+    try:
+        async with state.sessions() as session:
+            comment = await session.get(Comment, request.path_params['comment_id'])
+            if not comment:
+                return _error('Comment not found', 404)
+
+            post_id = comment.post_id
+            await session.delete(comment)
+            await _apply_comment_delta(session, post_id, -1, *Comment.rating_delta(comment.rating, None))
+            await session.commit()
+
+        await _invalidate_comments(request, post_id)
+        await _rankings_call(
+            request, 'comments_changed', removed=[(post_id, comment.created_at)], rated=[post_id] if comment.rating else ()
+        )
+
+        return JSONResponse({
+            'success': True,
+            'message': 'Comment deleted successfully'
+        })
+    except Exception as e:
+        return _error(str(e), 500)
+
+
+async def health(request):
+    return JSONResponse({'status': 'healthy'})
+
+
+ROUTES = [
+    Route('/health', health),
+    Route('/api/posts', list_posts, methods=['GET']),
+    Route('/api/posts', create_post, methods=['POST']),
+    Route('/api/posts/{post_id:int}', get_post, methods=['GET']),
+    Route('/api/posts/{post_id:int}', update_post, methods=['PUT']),
+    Route('/api/posts/{post_id:int}', delete_post, methods=['DELETE']),
+    Route('/api/comments', list_comments, methods=['GET']),
+    Route('/api/comments', create_comment, methods=['POST']),
+    Route('/api/comments/post/{post_id:int}', list_post_comments, methods=['GET']),
+    Route('/api/comments/{comment_id:int}', update_comment, methods=['PUT']),
+    Route('/api/comments/{comment_id:int}', delete_comment, methods=['DELETE']),
+]
+
+
+def create_asgi_app(config_name=None):
+    """
+    Create the ASGI application.
+
+    Args:
+        config_name: Configuration to use (development, production, testing)
+
+    Returns:
+        Starlette application
+    """
+    if config_name is None:
+        config_name = os.environ.get('FLASK_ENV', 'development')
+
+    flask_app = create_app(config_name)
+    wsgi = WSGIMiddleware(flask_app)
+    engine = create_async_engine_for(flask_app)
+    cache = AsyncResponseCache(
+        async_cache_client(flask_app), flask_app.config, local_tier=lambda: get_local_tier(flask_app)
+    )
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await cache.close()
+        await engine.dispose()
+
+    app = Starlette(
+        routes=ROUTES + [Mount('/', app=wsgi)],
+        # Replaces the Flask-CORS headers of fallback responses, so the
+        # two never disagree
+        middleware=[Middleware(
+            CORSMiddleware, allow_origins=flask_app.config['CORS_ORIGINS'],
+            allow_methods=['*'], allow_headers=['*']
+        )],
+        lifespan=lifespan
+    )
+    app.state.flask_app = flask_app
+    app.state.wsgi = wsgi
+    app.state.config = flask_app.config
+    app.state.secret = flask_app.config['SECRET_KEY']
+    app.state.engine = engine
+    # Objects stay usable after commit, as they cannot lazy-load attributes
+    app.state.sessions = async_sessionmaker(engine, expire_on_commit=False)
+    app.state.cache = cache
+    return app
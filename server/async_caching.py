@@ -0,0 +1,343 @@
+"""
+Async counterpart of caching.py for the ASGI API (async_api.py).
+
+Keys, generations, value encoding and fill locks are the same as
+caching.py's, so the Flask and ASGI servers share one cache: a write
+through either server invalidates the entries cached by both, and a key
+is built by one of them at a time. Both read values through the process's
+in-process (L1) tier when it is enabled (see local_cache.py).
+
+With `CACHE_TYPE=RedisCache` the cache is reached through redis.asyncio,
+so a cache round trip never blocks the event loop. The in-process
+backends used in development and tests (SimpleCache, NullCache) are
+called directly, as they do no I/O.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from cachelib import RedisCache
+from caching import (
+    GENERATION_TIMEOUT, CacheEntry, _generation_key, _now_ms, cache, entry_value, format_key,
+    needs_refresh, next_generation
+)
+from singleflight import RELEASE_SCRIPT, AsyncSingleFlight, FillLock, lock_key
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRedisCache:
+    """
+    The part of the cachelib Redis API used by `AsyncResponseCache`, on an
+    async Redis client.
+
+    Args:
+        client: redis.asyncio client
+        key_prefix: Prefix of the Flask-Caching backend
+        serializer: Serializer of the Flask-Caching backend
+        lock_ttl: Seconds a fill lock is held at most
+    """
+
+    def __init__(self, client, key_prefix, serializer, lock_ttl):
+        self.client = client
+        self.key_prefix = key_prefix
+        self.serializer = serializer
+        self.lock_ttl = lock_ttl
+
+    async def get(self, key):
+        return self.serializer.loads(await self.client.get(self.key_prefix + key))
+
+    async def get_many(self, *keys):
+        values = await self.client.mget([self.key_prefix + key for key in keys])
+        return [self.serializer.loads(value) for value in values]
+
+    async def add(self, key, value, timeout=None):
+        # A timeout of 0 means no expiry, as in cachelib
+        return bool(await self.client.set(
+            self.key_prefix + key, self.serializer.dumps(value), nx=True, ex=timeout or None
+        ))
+
+    async def set(self, key, value, timeout=None):
+        await self.client.set(self.key_prefix + key, self.serializer.dumps(value), ex=timeout or None)
+
+    async def set_many(self, mapping, timeout=None):
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, value in mapping.items():
+                pipe.set(self.key_prefix + key, self.serializer.dumps(value), ex=timeout or None)
+            await pipe.execute()
+
+    async def publish(self, channel, message):
+        await self.client.publish(channel, message)
+
+    async def acquire_lock(self, key):
+        # The same lock as singleflight.FillLock
+        token = uuid.uuid4().hex
+        acquired = await self.client.set(
+            self.key_prefix + lock_key(key), token, nx=True, px=int(self.lock_ttl * 1000)
+        )
+        return token if acquired else None
+
+    async def lock_held(self, key):
+        return bool(await self.client.exists(self.key_prefix + lock_key(key)))
+
+    async def release_lock(self, key, token):
+        await self.client.eval(RELEASE_SCRIPT, 1, self.key_prefix + lock_key(key), token)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class InProcessCache:
+    """Async interface over an in-process cachelib backend."""
+
+    def __init__(self, backend, lock_ttl):
+        self.backend = backend
+        self.lock = FillLock(backend, lock_ttl)
+
+    async def get(self, key):
+        return self.backend.get(key)
+
+    async def get_many(self, *keys):
+        return self.backend.get_many(*keys)
+
+    async def add(self, key, value, timeout=None):
+        return self.backend.add(key, value, timeout=timeout)
+
+    async def set(self, key, value, timeout=None):
+        self.backend.set(key, value, timeout=timeout)
+
+    async def set_many(self, mapping, timeout=None):
+        self.backend.set_many(mapping, timeout=timeout)
+
+    async def publish(self, channel, message):
+        # In-process backends serve a single process; nobody to tell
+        pass
+
+    async def acquire_lock(self, key):
+        return self.lock.acquire(key)
+
+    async def lock_held(self, key):
+        return self.lock.held(key)
+
+    async def release_lock(self, key, token):
+        self.lock.release(key, token)
+
+    async def close(self):
+        pass
+
+
+def async_cache_client(app):
+    """
+    Async client for the cache backend that Flask-Caching set up for `app`.
+
+    Args:
+        app: Flask app, after `cache.init_app`
+
+    Returns:
+        AsyncRedisCache or InProcessCache
+    """
+    backend = app.extensions['cache'][cache]
+    lock_ttl = app.config['CACHE_LOCK_TIMEOUT']
+    if isinstance(backend, RedisCache):
+        import redis.asyncio
+        client = redis.asyncio.from_url(app.config['REDIS_URL'])
+        return AsyncRedisCache(client, backend.key_prefix, backend.serializer, lock_ttl)
+    return InProcessCache(backend, lock_ttl)
+
+
+class AsyncResponseCache:
+    """
+    Read-through response caching with generation-based invalidation;
+    see `get_generations`, `invalidate`, `cache_key` and `read_through` in
+    caching.py, which these methods mirror.
+
+    Args:
+        client: AsyncRedisCache or InProcessCache
+        config: App config (the `CACHE_STALE_TTL`, `CACHE_XFETCH_BETA` and
+            `CACHE_LOCK_*` settings)
+        local_tier: Callable returning the process's LocalTier (or None)
+    """
+
+    def __init__(self, client, config, local_tier=lambda: None):
+        self.client = client
+        self.local_tier = local_tier
+        self.stale_ttl = config['CACHE_STALE_TTL']
+        self.beta = config['CACHE_XFETCH_BETA']
+        self.lock_wait = config['CACHE_LOCK_WAIT']
+        self.poll_interval = config['CACHE_LOCK_POLL_INTERVAL']
+        self.flights = AsyncSingleFlight()
+
+    async def get_generations(self, *scopes):
+        keys = [_generation_key(scope) for scope in scopes]
+        try:
+            values = await self.client.get_many(*keys)
+        except Exception:
+            logger.exception('Cache unavailable while reading generations')
+            return [None] * len(scopes)
+
+        generations = []
+        for key, value in zip(keys, values):
+            if value is None:
+                value = _now_ms()
+                try:
+                    if not await self.client.add(key, value, timeout=GENERATION_TIMEOUT):
+                        value = await self.client.get(key) or value
+                except Exception:
+                    logger.exception('Cache unavailable while initializing generation')
+            generations.append(int(value))
+        return generations
+
+    async def invalidate(self, *scopes):
+        keys = [_generation_key(scope) for scope in scopes]
+        try:
+            current = await self.client.get_many(*keys)
+            now = _now_ms()
+            await self.client.set_many(
+                {key: next_generation(value, now) for key, value in zip(keys, current)},
+                timeout=GENERATION_TIMEOUT
+            )
+        except Exception:
+            logger.exception('Cache unavailable while invalidating %s', scopes)
+
+        tier = self.local_tier()
+        if tier:
+            tier.cache.delete(*keys)
+            if tier.bus is not None:
+                try:
+                    await self.client.publish(tier.bus.channel, tier.bus.message(keys))
+                except Exception:
+                    logger.exception('Cache invalidation channel unavailable while publishing')
+
+    async def cache_key(self, prefix, scopes, **params):
+        generations = await self.get_generations(*scopes)
+        if None in generations:
+            return None
+        return format_key(prefix, generations, params)
+
+    async def _acquire_fill_lock(self, key):
+        try:
+            return await self.client.acquire_lock(key)
+        except Exception:
+            logger.exception('Cache unavailable while locking %s', key)
+            return ''
+
+    async def _release_fill_lock(self, key, token):
+        if token:
+            try:
+                await self.client.release_lock(key, token)
+            except Exception:
+                logger.exception('Cache unavailable while unlocking %s', key)
+
+    async def _get(self, key):
+        """Read `key` from the L1 tier, then the shared cache (see caching.cache_get)."""
+        tier = self.local_tier()
+        if tier is None:
+            return await self.client.get(key)
+
+        value = tier.cache.get(key)
+        tier.stats.record('l1', value is not None)
+        if value is None:
+            value = await self.client.get(key)
+            tier.stats.record('l2', value is not None)
+            if value is not None:
+                tier.cache.set(key, value, tier.ttl)
+        return value
+
+    async def _refreshed_elsewhere(self, key):
+        """See caching._refreshed_elsewhere."""
+        tier = self.local_tier()
+        if tier is None:
+            return None
+        try:
+            entry = await self.client.get(key)
+        except Exception:
+            logger.exception('Cache unavailable while reading %s', key)
+            return None
+        if entry is None or needs_refresh(entry, self.beta):
+            return None
+        tier.cache.set(key, entry, tier.ttl)
+        return entry
+
+    async def _build_and_store(self, key, timeout, builder):
+        started = time.perf_counter()
+        value = await builder()
+        build_time = time.perf_counter() - started
+        if value is not None:
+            entry = CacheEntry(value, time.time() + timeout, build_time)
+            try:
+                await self.client.set(key, entry, timeout=timeout + self.stale_ttl)
+            except Exception:
+                logger.exception('Cache unavailable while writing %s', key)
+            tier = self.local_tier()
+            if tier:
+                tier.cache.set(key, entry, tier.ttl)
+        return value
+
+    async def _fill_on_miss(self, key, timeout, builder):
+        token = await self._acquire_fill_lock(key)
+        if token is None:
+            deadline = time.monotonic() + self.lock_wait
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                try:
+                    entry = await self.client.get(key)
+                    if entry is not None:
+                        return entry_value(entry)
+                    if not await self.client.lock_held(key):
+                        break
+                except Exception:
+                    logger.exception('Cache unavailable while waiting for %s', key)
+                    break
+            return await self._build_and_store(key, timeout, builder)
+
+        try:
+            if token:
+                entry = await self.client.get(key)
+                if entry is not None:
+                    return entry_value(entry)
+            return await self._build_and_store(key, timeout, builder)
+        finally:
+            await self._release_fill_lock(key, token)
+
+    async def read_through(self, key, timeout, builder):
+        """
+        Return the cached value for `key`, awaiting `builder()` on a miss.
+
+        Misses and refreshes are coalesced as in caching.read_through.
+
+        Args:
+            key: Cache key from `cache_key` (None bypasses the cache)
+            timeout: Seconds the value stays fresh
+            builder: Coroutine function producing the value; a None result
+                is not cached
+        """
+        if key is None:
+            return await builder()
+
+        try:
+            entry = await self._get(key)
+        except Exception:
+            logger.exception('Cache unavailable while reading %s', key)
+            return await builder()
+
+        if entry is not None:
+            if not needs_refresh(entry, self.beta):
+                return entry_value(entry)
+            fresh = await self._refreshed_elsewhere(key)
+            if fresh is not None:
+                return entry_value(fresh)
+            token = await self._acquire_fill_lock(key)
+            if token is None:
+                return entry_value(entry)
+            try:
+                return await self._build_and_store(key, timeout, builder)
+            finally:
+                await self._release_fill_lock(key, token)
+
+        return await self.flights.run(
+            key, lambda: self._fill_on_miss(key, timeout, builder), self.lock_wait
+        )
+
+    async def close(self):
+        await self.client.close()
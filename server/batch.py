@@ -0,0 +1,111 @@
+"""
+Helpers shared by the batch endpoints.
+
+A batch request is a JSON object with a list of items (or ids) and an
+optional `atomic` flag. Atomic batches (the default) are applied only if
+every item is valid; non-atomic batches apply the valid items and report
+the failures. Either way the response lists a result per item.
+"""
+
+from flask import current_app, jsonify
+from sqlalchemy import bindparam, select, update
+from models import db
+from validation import ValidationError
+
+
+def read_batch(data, key='items'):
+    """
+    Read the item list and atomicity flag from a batch request body.
+
+    Args:
+        data: Request JSON
+        key: Name of the list field ('items' or 'ids')
+
+    Returns:
+        Tuple of (items, atomic)
+
+    Raises:
+        ValidationError: If the body is malformed or the batch is too large
+    """
+    if not isinstance(data, dict):
+        raise ValidationError('Request body is required')
+
+    items = data.get(key)
+    if not isinstance(items, list) or not items:
+        raise ValidationError(f'{key} must be a non-empty list')
+
+    max_items = current_app.config['BATCH_MAX_ITEMS']
+    if len(items) > max_items:
+        raise ValidationError(f'A batch can contain at most {max_items} items')
+
+    atomic = data.get('atomic', True)
+    if not isinstance(atomic, bool):
+        raise ValidationError('atomic must be a boolean')
+
+    return items, atomic
+
+
+def existing_ids(column, ids):
+    """Return the subset of `ids` present in `column`, with one IN query."""
+    if not ids:
+        return set()
+    return set(db.session.scalars(select(column).where(column.in_(set(ids)))))
+
+
+def update_many(table, changes_by_id):
+    """
+    Apply per-row changes with one executemany UPDATE per set of columns.
+
+    Args:
+        table: Table to update (its `id` column is the key)
+        changes_by_id: Dictionary mapping id to a dictionary of new values
+    """
+    groups = {}
+    for row_id, changes in changes_by_id.items():
+        groups.setdefault(tuple(sorted(changes)), []).append(
+            dict(changes, _id=row_id)
+        )
+
+    for columns, params in groups.items():
+        db.session.execute(
+            update(table)
+            .where(table.c.id == bindparam('_id'))
+            .values({column: bindparam(column) for column in columns}),
+            params
+        )
+
+
+class BatchResults:
+    """Collects the per-item outcome of a batch."""
+
+    def __init__(self, size):
+        self.items = [None] * size
+        self.failed = 0
+
+    def fail(self, index, error):
+        self.items[index] = {'index': index, 'success': False, 'error': error}
+        self.failed += 1
+
+    def succeed(self, index, **data):
+        self.items[index] = dict({'index': index, 'success': True}, **data)
+
+    def rejected(self):
+        """Response for an atomic batch that was not applied."""
+        return jsonify({
+            'success': False,
+            'error': f'Batch rejected: {self.failed} invalid item(s), nothing was applied',
+            'data': [item for item in self.items if item is not None and not item['success']]
+        }), 400
+
+    def response(self, message, status=200):
+        """
+        Response for an applied batch.
+
+        Returns `status` if every item succeeded, 207 otherwise.
+        """
+        succeeded = len(self.items) - self.failed
+        return jsonify({
+            'success': self.failed == 0,
+            'message': f'{message}: {succeeded} succeeded, {self.failed} failed',
+            'data': self.items
+        }), status if self.failed == 0 else 207
@@ -0,0 +1,5 @@
+"""
+Performance benchmarks for the Blogsite API.
+
+Run them from the server/ directory, e.g. ``python -m benchmarks.bench_search``.
+"""
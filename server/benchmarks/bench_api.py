@@ -0,0 +1,439 @@
+"""
+HTTP benchmark and load test for the posts and comments API.
+
+Seeds a database with `seed.populate`, then drives every endpoint of
+routes/posts.py and routes/comments.py (listings, deep pages, search,
+detail of heavily commented posts, single and batch writes) through the
+Flask test client and/or a real threaded WSGI server. For each scenario
+it reports p50/p95/p99 latency, throughput and SQL queries per request.
+
+Results can be saved as a baseline; later runs compared against it exit
+with status 1 when a scenario's p95 latency or query count regresses by
+more than the threshold.
+
+Usage (from server/):
+    python -m benchmarks.bench_api --posts 10000 --comments 100000 --save-baseline bench.json
+    python -m benchmarks.bench_api --posts 10000 --comments 100000 --baseline bench.json
+
+Pass --database-url to run against PostgreSQL; the database is dropped
+and recreated, so point it at a dedicated benchmark database.
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+TRANSPORTS = ('test-client', 'wsgi')
+
+
+class Scenario:
+    """
+    A named request pattern.
+
+    Args:
+        name: Scenario name (the key in results and baselines)
+        method: HTTP method
+        build: Callable taking the iteration number and returning
+            (path, json_body or None)
+    """
+
+    def __init__(self, name, method, build):
+        self.name = name
+        self.method = method
+        self.build = build
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a sorted list."""
+    if not samples:
+        return 0.0
+    index = max(0, min(len(samples) - 1, math.ceil(fraction * len(samples)) - 1))
+    return samples[index]
+
+
+def summarize(latencies_ms, elapsed, queries, errors):
+    """Build the result entry of one scenario."""
+    latencies_ms = sorted(latencies_ms)
+    requests = len(latencies_ms)
+    return {
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies_ms, 0.50), 3),
+        'p95_ms': round(percentile(latencies_ms, 0.95), 3),
+        'p99_ms': round(percentile(latencies_ms, 0.99), 3),
+        'throughput_rps': round(requests / elapsed, 1) if elapsed else 0.0,
+        'queries_per_request': round(queries / requests, 2) if requests else 0.0,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results with a baseline.
+
+    A scenario regresses when any of its requests failed, when its p95
+    latency grows by more than `threshold` (a fraction), or when it issues
+    more queries per request. Scenarios missing from the baseline are only
+    checked for errors; those missing from the results are ignored.
+
+    Returns:
+        List of human-readable regression descriptions
+    """
+    regressions = []
+    for transport, scenarios in results.items():
+        for name, current in scenarios.items():
+            previous = baseline.get(transport, {}).get(name)
+            # Failed requests are often the fastest, so errors never pass
+            if current['errors']:
+                before = f"{previous['errors']} -> " if previous is not None else ''
+                regressions.append(f"{transport}/{name}: errors {before}{current['errors']}")
+            if previous is None:
+                continue
+            if current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+                regressions.append(
+                    f"{transport}/{name}: p95 {previous['p95_ms']:.2f}ms -> {current['p95_ms']:.2f}ms"
+                )
+            if current['queries_per_request'] > previous['queries_per_request']:
+                regressions.append(
+                    f"{transport}/{name}: queries/request "
+                    f"{previous['queries_per_request']} -> {current['queries_per_request']}"
+                )
+    return regressions
+
+
+class QueryCounter:
+    """Counts SQL statements executed on an engine, across threads."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+
+    def _before_cursor_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+
+def build_scenarios(fixtures):
+    """
+    Scenarios over every posts and comments endpoint.
+
+    Write scenarios run after the reads and use ids created by earlier
+    write scenarios, so deletes never touch seeded data.
+    """
+    hot = fixtures['hot_post_id']
+    posts = fixtures['post_ids']
+    created_posts = fixtures['created_post_ids']
+    created_comments = fixtures['created_comment_ids']
+    last_posts_page = fixtures['last_posts_page']
+    last_comments_page = fixtures['last_comments_page']
+
+    def post_body(i):
+        return {'title': f'Benchmark post {i}', 'content': 'Benchmark content ' * 20, 'author': 'Bench'}
+
+    def comment_body(i, post_id=hot):
+        return {'post_id': post_id, 'author': 'Bench', 'content': f'Benchmark comment {i}', 'rating': i % 5 + 1}
+
+    def pick(ids, i):
+        return ids[i % len(ids)]
+
+    return [
+        Scenario('posts_first_page', 'GET', lambda i: ('/api/posts?page=1', None)),
+        Scenario('posts_deep_page', 'GET', lambda i: (f'/api/posts?page={last_posts_page}', None)),
+        Scenario('posts_first_page_full', 'GET', lambda i: ('/api/posts?page=1&fields=full', None)),
+        Scenario('posts_cursor_first_page', 'GET', lambda i: ('/api/posts?cursor=', None)),
+        Scenario('posts_search', 'GET', lambda i: ('/api/posts?search=journey', None)),
+        Scenario('posts_search_relevance', 'GET', lambda i: ('/api/posts?search=quiet%20lesson&sort=relevance', None)),
+        Scenario('post_detail', 'GET', lambda i: (f'/api/posts/{pick(posts, i)}', None)),
+        Scenario('post_detail_hot', 'GET', lambda i: (f'/api/posts/{hot}?comments=100', None)),
+        Scenario('comments_first_page', 'GET', lambda i: ('/api/comments?page=1', None)),
+        Scenario('comments_deep_page', 'GET', lambda i: (f'/api/comments?page={last_comments_page}', None)),
+        Scenario('comments_for_hot_post', 'GET', lambda i: (f'/api/comments/post/{hot}', None)),
+        Scenario('comments_for_hot_post_cursor', 'GET', lambda i: (f'/api/comments/post/{hot}?cursor=', None)),
+        Scenario('comments_by_post_filter', 'GET', lambda i: (f'/api/comments?post_id={hot}', None)),
+        Scenario('create_post', 'POST', lambda i: ('/api/posts', post_body(i))),
+        Scenario('update_post', 'PUT', lambda i: (f'/api/posts/{pick(created_posts, i)}', {'title': f'Edited {i}'})),
+        Scenario('create_comment', 'POST', lambda i: ('/api/comments', comment_body(i))),
+        Scenario('update_comment', 'PUT', lambda i: (f'/api/comments/{pick(created_comments, i)}', {'rating': i % 5 + 1})),
+        Scenario('create_posts_batch', 'POST', lambda i: ('/api/posts/batch', {
+            'items': [post_body(i * 10 + j) for j in range(10)]
+        })),
+        Scenario('create_comments_batch', 'POST', lambda i: ('/api/comments/batch', {
+            'items': [comment_body(i * 10 + j, pick(posts, i * 10 + j)) for j in range(10)]
+        })),
+        Scenario('delete_comment', 'DELETE', lambda i: (f'/api/comments/{created_comments.pop()}', None)),
+        Scenario('delete_post', 'DELETE', lambda i: (f'/api/posts/{created_posts.pop()}', None)),
+    ]
+
+
+class TestClientTransport:
+    """Requests through the Flask test client (no network, one thread)."""
+
+    name = 'test-client'
+
+    def __init__(self, app, concurrency):
+        self.client = app.test_client()
+
+    def request(self, method, path, body):
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+    def map(self, fn, iterations):
+        return [fn(i) for i in iterations]
+
+    def close(self):
+        pass
+
+
+class WsgiTransport:
+    """Requests over HTTP/1.1 keep-alive to a threaded Werkzeug server."""
+
+    name = 'wsgi'
+
+    def __init__(self, app, concurrency):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self.server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.pool = ThreadPoolExecutor(max_workers=concurrency)
+        self.local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = http.client.HTTPConnection('127.0.0.1', self.port)
+        return connection
+
+    def request(self, method, path, body):
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        connection = self._connection()
+        try:
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            self.local.connection = None
+            raise
+        if response.getheader('Connection', '').lower() == 'close':
+            connection.close()
+            self.local.connection = None
+        try:
+            return response.status, json.loads(data)
+        except ValueError:
+            return response.status, None
+
+    def map(self, fn, iterations):
+        return list(self.pool.map(fn, iterations))
+
+    def close(self):
+        self.pool.shutdown()
+        self.server.shutdown()
+
+
+def run_scenario(transport, scenario, requests, warmup, counter):
+    """Run one scenario and return its summary."""
+    for i in range(warmup):
+        path, body = scenario.build(i)
+        transport.request(scenario.method, path, body)
+
+    offset = count(warmup)
+    lock = threading.Lock()
+
+    def one(_):
+        with lock:
+            path, body = scenario.build(next(offset))
+        started = time.perf_counter()
+        try:
+            status, _ = transport.request(scenario.method, path, body)
+        except Exception:
+            status = 599
+        return (time.perf_counter() - started) * 1000, status
+
+    queries_before = counter.count
+    started = time.perf_counter()
+    samples = transport.map(one, range(requests))
+    elapsed = time.perf_counter() - started
+    queries = counter.count - queries_before
+
+    errors = sum(1 for _, status in samples if status >= 400)
+    return summarize([latency for latency, _ in samples], elapsed, queries, errors)
+
+
+def prepare_fixtures(app, requests, warmup):
+    """Pick ids for the scenarios and create the rows write scenarios consume."""
+    from sqlalchemy import func, select
+    from models import db, Post, Comment
+
+    with app.app_context():
+        hot = db.session.scalar(select(Post.id).order_by(Post.comment_count.desc(), Post.id).limit(1))
+        post_ids = list(db.session.scalars(select(Post.id).order_by(Post.id).limit(1000)))
+        post_count = db.session.scalar(select(func.count(Post.id)))
+        comment_count = db.session.scalar(select(func.count(Comment.id)))
+
+    # Deletes use up one created row per request, for each transport
+    needed = (requests + warmup) * len(TRANSPORTS)
+    client = app.test_client()
+    created_posts = []
+    created_comments = []
+    for start in range(0, needed, 500):
+        size = min(500, needed - start)
+        response = client.post('/api/posts/batch', json={'items': [
+            {'title': f'Fixture {start + j}', 'content': 'Fixture', 'author': 'Bench'} for j in range(size)
+        ]})
+        created_posts.extend(item['id'] for item in response.get_json()['data'])
+        response = client.post('/api/comments/batch', json={'items': [
+            {'post_id': hot, 'author': 'Bench', 'content': 'Fixture'} for _ in range(size)
+        ]})
+        created_comments.extend(item['id'] for item in response.get_json()['data'])
+
+    per_page = app.config['POSTS_PER_PAGE']
+    return {
+        'hot_post_id': hot,
+        'post_ids': post_ids,
+        'created_post_ids': created_posts,
+        'created_comment_ids': created_comments,
+        'last_posts_page': max(1, -(-post_count // per_page)),
+        'last_comments_page': max(1, -(-comment_count // app.config['COMMENTS_PER_PAGE'])),
+    }
+
+
+def create_bench_app(database_url, cache_type):
+    from app import create_app
+    from config import config, ProductionConfig
+
+    config['bench_api'] = type('BenchApiConfig', (ProductionConfig,), {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'CACHE_TYPE': cache_type,
+        'ADMISSION_ENABLED': False,
+    })
+    return create_app('bench_api')
+
+
+def run(args):
+    """
+    Seed the database and run every scenario on every selected transport.
+
+    Returns:
+        Results dictionary: transport -> scenario -> summary
+    """
+    from models import db
+    from seed import populate
+
+    path = None
+    database_url = args.database_url
+    if database_url is None:
+        path = os.path.join(tempfile.mkdtemp(), 'bench_api.db')
+        database_url = f'sqlite:///{path}'
+
+    app = create_bench_app(database_url, args.cache_type)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        populate(
+            posts=args.posts, comments=args.comments, skew=args.skew,
+            content_length=args.content_length, seed=args.seed
+        )
+        counter = QueryCounter(db.engine)
+
+    fixtures = prepare_fixtures(app, args.requests, args.warmup)
+    results = {}
+    for transport_name in args.transports:
+        transport_class = TestClientTransport if transport_name == 'test-client' else WsgiTransport
+        transport = transport_class(app, args.concurrency)
+        results[transport_name] = {}
+        print(f'\n{transport_name} ({args.concurrency if transport_name == "wsgi" else 1} concurrent)')
+        print(f'  {"scenario":<30}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"req/s":>9}{"queries":>9}{"errors":>8}')
+        try:
+            for scenario in build_scenarios(fixtures):
+                if args.only and scenario.name not in args.only:
+                    continue
+                summary = run_scenario(transport, scenario, args.requests, args.warmup, counter)
+                results[transport_name][scenario.name] = summary
+                print(
+                    f'  {scenario.name:<30}{summary["p50_ms"]:>9.2f}{summary["p95_ms"]:>9.2f}'
+                    f'{summary["p99_ms"]:>9.2f}{summary["throughput_rps"]:>9.0f}'
+                    f'{summary["queries_per_request"]:>9.1f}{summary["errors"]:>8}'
+                )
+        finally:
+            transport.close()
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    if path:
+        os.remove(path)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Database to benchmark (default: a temporary SQLite file)')
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--comments', type=int, default=20000)
+    parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent of comments per post')
+    parser.add_argument('--content-length', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=4, help='Client threads for the WSGI transport')
+    parser.add_argument('--transports', nargs='+', choices=TRANSPORTS, default=list(TRANSPORTS))
+    parser.add_argument('--only', nargs='+', metavar='SCENARIO', help='Run only these scenarios')
+    parser.add_argument('--cache-type', default='NullCache',
+                        help='Flask-Caching backend; the default NullCache measures the database path')
+    parser.add_argument('--baseline', help='Baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed p95 regression as a fraction (default: 0.2)')
+    parser.add_argument('--save-baseline', metavar='PATH', help='Write the results as a baseline JSON')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(args)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(dict(results, _meta={
+                'posts': args.posts,
+                'comments': args.comments,
+                'requests': args.requests,
+                'concurrency': args.concurrency,
+                'python': platform.python_version(),
+            }), f, indent=2, sort_keys=True)
+        print(f'\nSaved baseline to {args.save_baseline}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) against {args.baseline}:')
+            for regression in regressions:
+                print(f'  {regression}')
+            return 1
+        print(f'\nNo regressions against {args.baseline}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""
+Compare the Flask API under gunicorn with the async API under uvicorn as
+the number of concurrent connections grows.
+
+Seeds a SQLite file, then serves it with gunicorn (wsgi:app, gthread
+workers configured by gunicorn.conf.py) and with uvicorn (asgi:app, see
+async_api.py), and drives the same mix of read endpoints against each
+from keep-alive clients at every concurrency level. Reports throughput
+and latency percentiles.
+
+A gthread worker serves at most `threads` requests at once, so beyond
+`workers x threads` connections requests queue; an event-loop worker
+keeps accepting them while earlier ones wait on the database or cache.
+The gap grows with database latency: SQLite answers in-process, so run
+against PostgreSQL (`--database-url`) to see production-like numbers.
+
+Usage (from server/):
+    python -m benchmarks.bench_asgi --duration 10 --concurrency 16 64 256
+    python -m benchmarks.bench_asgi --database-url postgresql://... --workers 4
+"""
+
+import argparse
+import os
+import sys
+from benchmarks.bench_wsgi import READ_PATHS, _free_port, prepare_database, run_server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--comments', type=int, default=20000)
+    parser.add_argument('--database-url', help='Serve an existing, seeded database instead of SQLite')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds of load per server and level')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[16, 64, 256],
+                        help='Concurrent keep-alive clients, one run per value')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes per server')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per gunicorn worker')
+    args = parser.parse_args(argv)
+
+    path = None
+    database_url = args.database_url
+    if database_url is None:
+        path, database_url = prepare_database(args.posts, args.comments)
+
+    env = dict(
+        os.environ,
+        FLASK_ENV='production',
+        DATABASE_URL=database_url,
+        CACHE_TYPE='NullCache',
+        ADMISSION_ENABLED='false',  # measure the server, not the rate limits
+        WSGI_WORKERS=str(args.workers),
+        WSGI_THREADS=str(args.threads),
+        WSGI_ACCESS_LOG='',
+        WSGI_MAX_REQUESTS='0',
+    )
+
+    for concurrency in args.concurrency:
+        level = argparse.Namespace(duration=args.duration, concurrency=concurrency)
+        print(f'\n{concurrency} clients, {args.duration:g}s per server')
+        print(f'  {"server":<34}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"errors":>8}')
+
+        port = _free_port()
+        gunicorn = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', 'wsgi:app']
+        run_server(f'gunicorn ({args.workers}w x {args.threads}t)', gunicorn, env, port, READ_PATHS, level)
+
+        port = _free_port()
+        uvicorn = [
+            sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+            '--workers', str(args.workers), '--no-access-log', '--log-level', 'warning',
+        ]
+        run_server(f'uvicorn ({args.workers}w, async)', uvicorn, env, port, READ_PATHS, level)
+
+    if path is not None:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Compare comment ingestion with COMMENT_INGEST_MODE = 'sync' and 'queue'.
+
+sync:  every POST /api/comments inserts its comment, updates the post's
+       aggregates and commits
+queue: every POST appends to the SQLite comment queue and answers 202;
+       the worker (`run_worker`) then inserts the comments in batches
+
+Each mode sends `--comments` POSTs from `--threads` test clients against a
+file SQLite database. For the queue mode, the worker is timed separately
+and end to end (requests plus draining the queue).
+
+Usage (from server/):
+    python -m benchmarks.bench_ingest --comments 5000 --threads 4
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.bench_api import create_bench_app
+
+
+def send_comments(app, post_ids, total, threads):
+    """POST `total` comments from `threads` clients; returns (seconds, statuses)."""
+    def worker(offset):
+        client = app.test_client()
+        statuses = []
+        for i in range(offset, total, threads):
+            response = client.post('/api/comments', json={
+                'post_id': post_ids[i % len(post_ids)], 'author': 'Bench',
+                'content': f'Comment {i}', 'rating': 1 + i % 5
+            })
+            statuses.append(response.status_code)
+        return statuses
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        statuses = [status for chunk in pool.map(worker, range(threads)) for status in chunk]
+    return time.perf_counter() - started, statuses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=100)
+    parser.add_argument('--comments', type=int, default=5000, help='Comments POSTed per mode')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args(argv)
+
+    from models import db, Comment, Post
+    from ingest import run_worker
+    from seed import populate
+
+    directory = tempfile.mkdtemp()
+    print(f'\n{args.comments} comments from {args.threads} thread(s), comments/s (higher is better)')
+
+    for mode in ('sync', 'queue'):
+        path = os.path.join(directory, f'bench_ingest_{mode}.db')
+        app = create_bench_app(f'sqlite:///{path}', 'NullCache')
+        app.config.update(
+            COMMENT_INGEST_MODE=mode,
+            COMMENT_QUEUE_PATH=os.path.join(directory, 'comment_queue.db'),
+            COMMENT_QUEUE_MAX_PENDING=args.comments,
+        )
+        with app.app_context():
+            db.create_all()
+            with contextlib.redirect_stdout(io.StringIO()):
+                populate(posts=args.posts, comments=0)
+            post_ids = [post.id for post in Post.query.all()]
+
+        elapsed, statuses = send_comments(app, post_ids, args.comments, args.threads)
+        expected = 201 if mode == 'sync' else 202
+        assert statuses.count(expected) == args.comments, f'{mode}: unexpected statuses'
+        print(f'  {mode + ": requests":<24}{args.comments / elapsed:>12,.0f}')
+
+        if mode == 'queue':
+            with app.app_context():
+                started = time.perf_counter()
+                created, failed = run_worker(args.batch_size, max_wait=0, once=True)
+                drained = time.perf_counter() - started
+                assert (created, failed) == (args.comments, 0)
+            print(f'  {"queue: worker inserts":<24}{args.comments / drained:>12,.0f}')
+            print(f'  {"queue: end to end":<24}{args.comments / (elapsed + drained):>12,.0f}')
+
+        with app.app_context():
+            assert db.session.query(Comment).count() == args.comments
+            db.session.remove()
+            db.engine.dispose()
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Compare the in-process inverted index with the ILIKE search path.
+
+For each corpus size, synthetic posts are written to a SQLite file and
+searched through both `LikeSearchBackend` (the original ILIKE scan) and
+`MemorySearchBackend`. Reports index build time and per-query latency.
+
+Usage (from server/):
+    python -m benchmarks.bench_search --sizes 10000 100000 1000000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Queries: a rare word, a common word, a prefix and a phrase
+QUERIES = ['zephyr', 'river', 'moun', '"quiet river"']
+
+_WORDS = [
+    'life', 'travel', 'river', 'mountain', 'forest', 'quiet', 'market', 'city',
+    'story', 'lesson', 'journey', 'friend', 'memory', 'morning', 'winter',
+    'summer', 'ocean', 'village', 'garden', 'music', 'letter', 'window',
+]
+_RARE_WORDS = ['zephyr', 'quixotic', 'lumen', 'halcyon']
+
+
+def _sentence(rng, length):
+    words = rng.choices(_WORDS, k=length)
+    if rng.random() < 0.001:
+        words[rng.randrange(length)] = rng.choice(_RARE_WORDS)
+    return ' '.join(words)
+
+
+def generate_rows(count, seed=0, chunk_size=5000):
+    """Yield chunks of synthetic post rows."""
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    chunk = []
+    for i in range(count):
+        chunk.append({
+            'title': _sentence(rng, 5).title(),
+            'content': '. '.join(_sentence(rng, 12) for _ in range(6)),
+            'author': f'{rng.choice(["Ava", "Liam", "Noah", "Mia"])} {rng.choice(["Smith", "Lee", "Patel"])}',
+            'created_at': start + timedelta(minutes=i),
+            'updated_at': start + timedelta(minutes=i),
+        })
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def run(size, repeat, per_page=10):
+    from app import create_app
+    from config import config, TestingConfig
+    from models import db, Post
+    from search import LikeSearchBackend, MemorySearchBackend
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench_search.db')
+    config['bench_search'] = type('BenchSearchConfig', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'
+    })
+    app = create_app('bench_search')
+
+    with app.app_context():
+        db.create_all()
+        for chunk in generate_rows(size):
+            db.session.execute(Post.__table__.insert(), chunk)
+        db.session.commit()
+
+        like = LikeSearchBackend()
+        memory = MemorySearchBackend()
+
+        started = time.perf_counter()
+        memory.ensure_built()
+        build_seconds = time.perf_counter() - started
+
+        print(f'\n{size:,} posts (index build {build_seconds:.1f}s)')
+        print(f'  {"query":<16}{"ilike ms":>12}{"index ms":>12}{"matches":>10}')
+        for query in QUERIES:
+            term = query.strip('"')
+
+            def like_page():
+                q = like.search(Post.query, term).order_by(Post.created_at.desc())
+                q.paginate(page=1, per_page=per_page, error_out=False).items
+
+            def index_page():
+                ids = memory.ranked_ids(query)
+                Post.query.filter(Post.id.in_(ids[:per_page])).all()
+
+            like_ms = _time(like_page, repeat)
+            index_ms = _time(index_page, repeat)
+            matches = len(memory.ranked_ids(query))
+            print(f'  {query:<16}{like_ms:>12.1f}{index_ms:>12.1f}{matches:>10,}')
+
+        db.session.remove()
+        db.engine.dispose()
+    os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per query (median is reported)')
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        run(size, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Measure how many post and comment rows per second the list endpoints
+serialize, before and after the row-tuple/orjson path.
+
+before: ORM instances, the original `to_dict` (an aware copy of every
+        timestamp) and Flask's stdlib JSON provider
+after:  rows of POST_COLUMNS/COMMENT_COLUMNS, `post_dict`/`comment_dict`
+        and the orjson provider
+
+Each side is timed on pages of `--page-size` rows, for building the
+dictionaries alone, encoding them alone, and the whole fetch, build and
+encode path.
+
+Usage (from server/):
+    python -m benchmarks.bench_serialization --rows 5000 --page-size 100
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import timezone
+from flask.json.provider import DefaultJSONProvider
+from benchmarks.bench_api import create_bench_app
+
+
+def legacy_post_dict(post):
+    """`Post.to_dict` as it was before serializers.py."""
+    return {
+        'id': post.id,
+        'title': post.title,
+        'content': post.content,
+        'author': post.author,
+        'created_at': post.created_at.replace(tzinfo=timezone.utc).isoformat() if post.created_at else None,
+        'updated_at': post.updated_at.replace(tzinfo=timezone.utc).isoformat() if post.updated_at else None,
+        'comment_count': post.comment_count,
+        'average_rating': round(post.rating_sum / post.rating_count, 2) if post.rating_count else None
+    }
+
+
+def legacy_comment_dict(comment):
+    """`Comment.to_dict` as it was before serializers.py."""
+    return {
+        'id': comment.id,
+        'post_id': comment.post_id,
+        'author': comment.author,
+        'content': comment.content,
+        'rating': comment.rating,
+        'created_at': comment.created_at.replace(tzinfo=timezone.utc).isoformat() if comment.created_at else None,
+        'updated_at': comment.updated_at.replace(tzinfo=timezone.utc).isoformat() if comment.updated_at else None
+    }
+
+
+def rows_per_second(fn, rows, min_time):
+    """Call `fn` until `min_time` seconds pass; returns rows processed per second."""
+    calls = 0
+    started = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            return calls * rows / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000, help='Posts and comments seeded')
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--min-time', type=float, default=1.0, help='Seconds per measurement')
+    args = parser.parse_args(argv)
+
+    from models import db, Comment, Post, COMMENT_COLUMNS, POST_COLUMNS
+    from seed import populate
+    from serializers import OrjsonProvider, comment_dict, post_dict
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench_serialization.db')
+    app = create_bench_app(f'sqlite:///{path}', 'NullCache')
+    stdlib = DefaultJSONProvider(app)
+    fast = OrjsonProvider(app)
+
+    with app.app_context():
+        db.create_all()
+        populate(posts=args.rows, comments=args.rows)
+
+        print(f'\n{args.page_size}-row pages, rows/s (higher is better)')
+        print(f'  {"":<34}{"before":>12}{"after":>12}{"speedup":>10}')
+
+        for name, model, columns, legacy, build in (
+            ('posts', Post, POST_COLUMNS, legacy_post_dict, post_dict),
+            ('comments', Comment, COMMENT_COLUMNS, legacy_comment_dict, comment_dict),
+        ):
+            order = (model.created_at.desc(), model.id.desc())
+            instances = model.query.order_by(*order).limit(args.page_size).all()
+            rows = db.session.query(*columns).order_by(*order).limit(args.page_size).all()
+            size = len(rows)
+            old_dicts = [legacy(instance) for instance in instances]
+            new_dicts = [build(row) for row in rows]
+            assert old_dicts == new_dicts
+
+            def before_full():
+                page = model.query.order_by(*order).limit(args.page_size).all()
+                stdlib.dumps({'success': True, 'data': [legacy(instance) for instance in page]})
+
+            def after_full():
+                page = db.session.query(*columns).order_by(*order).limit(args.page_size).all()
+                fast.dumps({'success': True, 'data': [build(row) for row in page]})
+
+            for stage, before, after in (
+                ('build dicts', lambda: [legacy(i) for i in instances], lambda: [build(r) for r in rows]),
+                ('encode JSON', lambda: stdlib.dumps({'data': old_dicts}), lambda: fast.dumps({'data': new_dicts})),
+                ('fetch + build + encode', before_full, after_full),
+            ):
+                old_rate = rows_per_second(before, size, args.min_time)
+                new_rate = rows_per_second(after, size, args.min_time)
+                print(f'  {name + ": " + stage:<34}{old_rate:>12,.0f}{new_rate:>12,.0f}{new_rate / old_rate:>9.1f}x')
+
+        db.session.remove()
+        db.engine.dispose()
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""
+Compare the Werkzeug development server with gunicorn.
+
+Seeds a SQLite file, then serves the app with `app.run()` (what
+`python app.py` does, minus the reloader and debugger) and with gunicorn
+using gunicorn.conf.py, and drives the same mix of read endpoints against
+each from concurrent keep-alive clients for a fixed duration. Reports
+throughput and latency percentiles.
+
+Usage (from server/):
+    python -m benchmarks.bench_wsgi --duration 20 --concurrency 32
+    python -m benchmarks.bench_wsgi --gunicorn-workers 4 --gunicorn-threads 8
+"""
+
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.bench_api import create_bench_app, percentile
+
+# Mix of read endpoints requested round-robin
+READ_PATHS = ['/api/posts?page=1', '/api/posts?page=5', '/api/posts/1', '/api/comments?page=1', '/api/comments/post/1']
+
+DEV_SERVER = (
+    "import sys\n"
+    "from app import create_app\n"
+    "create_app('production').run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True)\n"
+)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Server exited with status {process.returncode}')
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/health')
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('Server did not start')
+
+
+def drive(port, paths, duration, concurrency):
+    """
+    Request `paths` round-robin from `concurrency` threads for `duration`
+    seconds.
+
+    Returns:
+        Tuple of (sorted latencies in ms, errors, elapsed seconds)
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(offset):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local = []
+        failed = 0
+        i = offset
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 400:
+                    failed += 1
+                if response.getheader('Connection', '').lower() == 'close':
+                    connection.close()
+            except (http.client.HTTPException, OSError):
+                failed += 1
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            local.append((time.perf_counter() - started) * 1000)
+        connection.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), errors[0], time.perf_counter() - started
+
+
+def run_server(name, command, env, port, paths, args):
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_until_up(port, process)
+        drive(port, paths, min(2, args.duration), args.concurrency)  # warm up
+        latencies, errors, elapsed = drive(port, paths, args.duration, args.concurrency)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    print(
+        f'  {name:<34}{len(latencies) / elapsed:>10.0f}{percentile(latencies, 0.5):>10.2f}'
+        f'{percentile(latencies, 0.95):>10.2f}{percentile(latencies, 0.99):>10.2f}{errors:>8}'
+    )
+
+
+def prepare_database(posts, comments):
+    """Seed a temporary SQLite file; returns (path, database URL)."""
+    from models import db
+    from seed import populate
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench_server.db')
+    database_url = f'sqlite:///{path}'
+    app = create_bench_app(database_url, 'NullCache')
+    with app.app_context():
+        db.create_all()
+        populate(posts=posts, comments=comments, skew=1.1)
+        db.engine.dispose()
+    return path, database_url
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--comments', type=int, default=20000)
+    parser.add_argument('--duration', type=float, default=10, help='Seconds of load per server')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent keep-alive clients')
+    parser.add_argument('--gunicorn-workers', type=int, default=2 * (os.cpu_count() or 1) + 1)
+    parser.add_argument('--gunicorn-threads', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    path, database_url = prepare_database(args.posts, args.comments)
+
+    paths = READ_PATHS
+    env = dict(
+        os.environ,
+        FLASK_ENV='production',
+        DATABASE_URL=database_url,
+        CACHE_TYPE='NullCache',
+        ADMISSION_ENABLED='false',  # measure the server, not the rate limits
+        WSGI_WORKERS=str(args.gunicorn_workers),
+        WSGI_THREADS=str(args.gunicorn_threads),
+        WSGI_ACCESS_LOG='',
+        WSGI_MAX_REQUESTS='0',
+    )
+
+    print(f'\n{args.concurrency} clients, {args.duration:g}s per server')
+    print(f'  {"server":<34}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"errors":>8}')
+
+    port = _free_port()
+    run_server('werkzeug (app.run)', [sys.executable, '-c', DEV_SERVER, str(port)], env, port, paths, args)
+
+    port = _free_port()
+    gunicorn = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', 'wsgi:app']
+    name = f'gunicorn ({args.gunicorn_workers}w x {args.gunicorn_threads}t, preload)'
+    run_server(name, gunicorn, env, port, paths, args)
+
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
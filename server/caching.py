@@ -0,0 +1,393 @@
+"""
+Read-through response caching with generation-based invalidation.
+
+Every cache key embeds the current generation of one or more scopes
+(e.g. ``posts`` for the listing, ``post:<id>`` for a single post). Writes
+bump the generations of the scopes they affect, which makes the old keys
+unreachable; they are never deleted explicitly and simply expire.
+
+Since a write never reuses a key, an entry past its timeout is still
+correct, only due for a rebuild. `read_through` keeps entries for
+`CACHE_STALE_TTL` seconds longer and lets one request rebuild a stale
+entry while the others keep getting it (stale-while-revalidate). Entries
+are also rebuilt a little early, at random (`CACHE_XFETCH_BETA`), so a hot
+key is usually refreshed before it goes stale at all. Misses are
+coalesced so that a key is built once at a time (see singleflight.py).
+
+With `CACHE_L1_ENABLED`, values and generations are read from an
+in-process cache before the shared one (see local_cache.py).
+"""
+
+import hashlib
+import logging
+import math
+import random
+import time
+from typing import Any, NamedTuple
+from flask import current_app, g, has_request_context
+from flask_caching import Cache
+from database import served_by_replica
+from instrumentation import record_cache_access
+from local_cache import get_local_tier
+from singleflight import FillLock, SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Created here (like `db` in models.py) so routes can import it without
+# importing the app module.
+cache = Cache()
+
+# Generation counters must outlive the entries that embed them
+GENERATION_TIMEOUT = 0  # never expire
+
+POSTS_SCOPE = 'posts'
+COMMENTS_SCOPE = 'comments'
+
+
+def post_scope(post_id):
+    """Scope covering a single post and its comments."""
+    return f'post:{post_id}'
+
+
+def _generation_key(scope):
+    return f'gen:{scope}'
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def get_generations(*scopes):
+    """
+    Get the current generation of each scope in one cache round trip.
+
+    A missing generation (first use, or evicted by the cache backend) is
+    initialized to the current time in milliseconds, so it can never
+    collide with a generation used before the eviction.
+
+    Args:
+        scopes: Scope names
+
+    Returns:
+        List of integer generations, in the order of `scopes`
+    """
+    keys = [_generation_key(scope) for scope in scopes]
+    tier = get_local_tier()
+    values = [tier.cache.get(key) for key in keys] if tier else [None] * len(keys)
+    missing = [key for key, value in zip(keys, values) if value is None]
+    if missing:
+        try:
+            fetched = dict(zip(missing, cache.get_many(*missing)))
+        except Exception:
+            logger.exception('Cache unavailable while reading generations')
+            return [None] * len(scopes)
+        values = [fetched.get(key, value) for key, value in zip(keys, values)]
+
+    generations = []
+    for key, value in zip(keys, values):
+        if value is None:
+            value = _now_ms()
+            try:
+                # add() keeps a concurrently initialized value if there is one
+                if not cache.add(key, value, timeout=GENERATION_TIMEOUT):
+                    value = cache.get(key) or value
+            except Exception:
+                logger.exception('Cache unavailable while initializing generation')
+        generations.append(int(value))
+
+    if tier:
+        for key, generation in zip(keys, generations):
+            if key in missing:
+                tier.cache.set(key, generation, tier.generation_ttl)
+    return generations
+
+
+def invalidate(*scopes):
+    """
+    Bump the generation of each scope, invalidating every key built on it.
+
+    Generations move to the current time in milliseconds (or the previous
+    value plus one if the clock has not advanced), so they keep increasing
+    across processes without a shared counter.
+
+    Args:
+        scopes: Scope names
+    """
+    keys = [_generation_key(scope) for scope in scopes]
+    try:
+        current = cache.get_many(*keys)
+        now = _now_ms()
+        cache.set_many(
+            {key: next_generation(value, now) for key, value in zip(keys, current)},
+            timeout=GENERATION_TIMEOUT
+        )
+    except Exception:
+        logger.exception('Cache unavailable while invalidating %s', scopes)
+
+    tier = get_local_tier()
+    if tier:
+        tier.invalidated(keys)
+
+
+def next_generation(current, now):
+    """Generation that replaces `current` (None if unset) at time `now`."""
+    return max(int(current or 0) + 1, now)
+
+
+def format_key(prefix, generations, params):
+    """
+    Lay out a cache key; shared with async_caching.py so both servers
+    read and write the same entries.
+    """
+    digest = hashlib.sha1(repr(sorted(params.items())).encode('utf-8')).hexdigest()
+    version = '.'.join(str(generation) for generation in generations)
+    return f'{prefix}:{version}:{digest}'
+
+
+def invalidate_post(post_id):
+    """Invalidate cached data affected by a write to a post."""
+    invalidate(POSTS_SCOPE, post_scope(post_id))
+
+
+def invalidate_post_comments(post_id):
+    """Invalidate cached data affected by a write to a post's comments."""
+    # Listings embed comment aggregates, so they go stale as well
+    invalidate(POSTS_SCOPE, COMMENTS_SCOPE, post_scope(post_id))
+
+
+def cache_key(prefix, scopes, **params):
+    """
+    Build a cache key from a prefix, scope generations and query parameters.
+
+    Args:
+        prefix: Key namespace (e.g. 'posts:list')
+        scopes: Scopes whose generations the cached value depends on
+        params: Normalized request parameters
+
+    Returns:
+        Cache key string, or None if the cache is unavailable
+    """
+    generations = get_generations(*scopes)
+    if None in generations:
+        return None
+
+    if has_request_context():
+        g.newest_generation = max(g.get('newest_generation', 0), *generations)
+
+    return format_key(prefix, generations, params)
+
+
+def may_be_stale():
+    """
+    Whether a value just built may predate the newest write it depends on.
+
+    Generations are write timestamps, so a value read from a replica within
+    the replica's allowed lag of a write may miss that write; caching it
+    would keep serving the stale value after the replica catches up.
+    """
+    if not served_by_replica():
+        return False
+    max_lag_ms = current_app.config['REPLICA_MAX_LAG_SECONDS'] * 1000
+    return _now_ms() - g.get('newest_generation', 0) < max_lag_ms
+
+
+def cache_get(key):
+    """
+    Read `key` from the in-process cache, then from the shared one (and
+    keep what it returns in the former).
+
+    Raises the shared cache's errors.
+    """
+    tier = get_local_tier()
+    if tier is None:
+        return cache.get(key)
+
+    value = tier.cache.get(key)
+    tier.stats.record('l1', value is not None)
+    if value is None:
+        value = cache.get(key)
+        tier.stats.record('l2', value is not None)
+        if value is not None:
+            tier.cache.set(key, value, tier.ttl)
+    return value
+
+
+def cache_set(key, value, timeout):
+    """Write `key` to the shared cache and the in-process one; raises the shared cache's errors."""
+    cache.set(key, value, timeout=timeout)
+    tier = get_local_tier()
+    if tier:
+        tier.cache.set(key, value, min(tier.ttl, timeout) if timeout else tier.ttl)
+
+
+class CacheEntry(NamedTuple):
+    """A cached value, the time it goes stale and the seconds it took to build."""
+    value: Any
+    fresh_until: float
+    build_time: float
+
+
+def entry_value(entry):
+    """Value of a cache entry (values cached before CacheEntry are bare)."""
+    return entry.value if isinstance(entry, CacheEntry) else entry
+
+
+def needs_refresh(entry, beta, now=None, rand=random.random):
+    """
+    Whether a request should rebuild a cached entry.
+
+    Stale entries always are. Fresh ones are with a probability that grows
+    as they near staleness and with the time they take to build (XFetch:
+    Vattani et al., "Optimal Probabilistic Cache Stampede Prevention").
+
+    Args:
+        entry: Cached CacheEntry (bare values are never refreshed)
+        beta: Eagerness of early refreshes (0 disables them)
+        now: Current time in seconds (default: now)
+        rand: Source of uniform random numbers in [0, 1)
+    """
+    if not isinstance(entry, CacheEntry):
+        return False
+    now = time.time() if now is None else now
+    if now >= entry.fresh_until:
+        return True
+    return beta > 0 and now - entry.build_time * beta * math.log(1 - rand()) >= entry.fresh_until
+
+
+def _fill_state():
+    """Per-app SingleFlight and FillLock, created on first use."""
+    state = current_app.extensions.get('cache_fills')
+    if state is None:
+        backend = current_app.extensions['cache'][cache]
+        state = (SingleFlight(), FillLock(backend, current_app.config['CACHE_LOCK_TIMEOUT']))
+        current_app.extensions['cache_fills'] = state
+    return state
+
+
+def _acquire_fill_lock(lock, key):
+    """Token of the key's fill lock, None if another process holds it, '' if unavailable."""
+    try:
+        return lock.acquire(key)
+    except Exception:
+        logger.exception('Cache unavailable while locking %s', key)
+        return ''
+
+
+def _release_fill_lock(lock, key, token):
+    if token:
+        try:
+            lock.release(key, token)
+        except Exception:
+            logger.exception('Cache unavailable while unlocking %s', key)
+
+
+def _build_and_store(key, timeout, builder):
+    """Build the value of `key` and cache it for `timeout` (+ the stale TTL)."""
+    started = time.perf_counter()
+    value = builder()
+    build_time = time.perf_counter() - started
+    if value is not None and not may_be_stale():
+        entry = CacheEntry(value, time.time() + timeout, build_time)
+        try:
+            cache_set(key, entry, timeout + current_app.config['CACHE_STALE_TTL'])
+        except Exception:
+            logger.exception('Cache unavailable while writing %s', key)
+    return value
+
+
+def _fill_on_miss(key, timeout, builder):
+    """Build a missing key, or wait for the process already building it."""
+    lock = _fill_state()[1]
+    token = _acquire_fill_lock(lock, key)
+    if token is None:
+        deadline = time.monotonic() + current_app.config['CACHE_LOCK_WAIT']
+        while time.monotonic() < deadline:
+            time.sleep(current_app.config['CACHE_LOCK_POLL_INTERVAL'])
+            try:
+                entry = cache.get(key)
+                if entry is not None:
+                    return entry_value(entry)
+                if not lock.held(key):
+                    break
+            except Exception:
+                logger.exception('Cache unavailable while waiting for %s', key)
+                break
+        # The other process failed or is too slow: build it here
+        return _build_and_store(key, timeout, builder)
+
+    try:
+        # Another process may have stored it between the miss and the lock
+        if token:
+            entry = cache.get(key)
+            if entry is not None:
+                return entry_value(entry)
+        return _build_and_store(key, timeout, builder)
+    finally:
+        _release_fill_lock(lock, key, token)
+
+
+def _refreshed_elsewhere(key, beta):
+    """
+    The shared cache's entry for `key` if another process already
+    refreshed it, so an aging L1 copy does not trigger a second rebuild.
+    """
+    tier = get_local_tier()
+    if tier is None:
+        return None
+    try:
+        entry = cache.get(key)
+    except Exception:
+        logger.exception('Cache unavailable while reading %s', key)
+        return None
+    if entry is None or needs_refresh(entry, beta):
+        return None
+    tier.cache.set(key, entry, tier.ttl)
+    return entry
+
+
+def read_through(key, timeout, builder):
+    """
+    Return the cached value for `key`, building and storing it on a miss.
+
+    Concurrent misses of a key build it once: other threads of the process
+    wait for the first one, other processes for the holder of the key's
+    fill lock. A stale entry (or one due for an early refresh) is rebuilt
+    by the request that takes the fill lock, while the others return it.
+    Cache errors never fail the request; the value is built directly instead.
+
+    Args:
+        key: Cache key from `cache_key` (None bypasses the cache)
+        timeout: Seconds the value stays fresh
+        builder: Callable producing the value; a None result is not cached
+
+    Returns:
+        The cached or freshly built value
+    """
+    if key is None:
+        return builder()
+
+    try:
+        entry = cache_get(key)
+    except Exception:
+        logger.exception('Cache unavailable while reading %s', key)
+        return builder()
+
+    record_cache_access(entry is not None)
+    config = current_app.config
+    if entry is not None:
+        if not needs_refresh(entry, config['CACHE_XFETCH_BETA']):
+            return entry_value(entry)
+        fresh = _refreshed_elsewhere(key, config['CACHE_XFETCH_BETA'])
+        if fresh is not None:
+            return entry_value(fresh)
+        lock = _fill_state()[1]
+        token = _acquire_fill_lock(lock, key)
+        if token is None:
+            return entry_value(entry)
+        try:
+            return _build_and_store(key, timeout, builder)
+        finally:
+            _release_fill_lock(lock, key, token)
+
+    flights = _fill_state()[0]
+    return flights.run(key, lambda: _fill_on_miss(key, timeout, builder), config['CACHE_LOCK_WAIT'])
@@ -0,0 +1,115 @@
+"""
+Flask CLI commands for database maintenance tasks.
+"""
+
+import click
+from sqlalchemy import bindparam, func, or_, update
+from models import db, Post
+from rankings import get_rankings
+from ingest import run_worker
+
+
+def find_aggregate_drift():
+    """
+    Find posts whose denormalized comment aggregates disagree with the
+    comments table.
+    
+    Returns:
+        List of (post_id, stored, actual) tuples where stored and actual are
+        (comment_count, rating_sum, rating_count) tuples
+    """
+    agg = Post.comment_aggregates()
+    actual_count = func.coalesce(agg.c.comment_count, 0)
+    actual_sum = func.coalesce(agg.c.rating_sum, 0)
+    actual_ratings = func.coalesce(agg.c.rating_count, 0)
+    
+    rows = db.session.query(
+        Post.id,
+        Post.comment_count, Post.rating_sum, Post.rating_count,
+        actual_count, actual_sum, actual_ratings
+    ).outerjoin(
+        agg, agg.c.post_id == Post.id
+    ).filter(
+        or_(
+            Post.comment_count != actual_count,
+            Post.rating_sum != actual_sum,
+            Post.rating_count != actual_ratings
+        )
+    ).all()
+    
+    return [(row[0], tuple(row[1:4]), tuple(row[4:7])) for row in rows]
+
+
+def reconcile_post_aggregates(dry_run=False):
+    """
+    Repair drifted comment aggregates on posts.
+    
+    Args:
+        dry_run: Only report drift without writing changes
+        
+    Returns:
+        List of drifted rows as returned by `find_aggregate_drift`
+    """
+    drift = find_aggregate_drift()
+    
+    if not dry_run and drift:
+        posts = Post.__table__
+        db.session.execute(
+            update(posts)
+            .where(posts.c.id == bindparam('post_id'))
+            .values(
+                comment_count=bindparam('actual_count'),
+                rating_sum=bindparam('actual_sum'),
+                rating_count=bindparam('actual_ratings'),
+                updated_at=posts.c.updated_at
+            ),
+            [
+                {
+                    'post_id': post_id,
+                    'actual_count': actual[0],
+                    'actual_sum': actual[1],
+                    'actual_ratings': actual[2]
+                }
+                for post_id, _, actual in drift
+            ]
+        )
+        db.session.commit()
+    
+    return drift
+
+
+def register_commands(app):
+    """Register maintenance commands on the Flask CLI."""
+    
+    @app.cli.command('reconcile-aggregates')
+    @click.option('--dry-run', is_flag=True, help='Report drift without repairing it.')
+    def reconcile_aggregates_command(dry_run):
+        """Find and repair drift in post comment/rating aggregates."""
+        drift = reconcile_post_aggregates(dry_run=dry_run)
+        
+        for post_id, stored, actual in drift:
+            click.echo(f"Post {post_id}: stored={stored} actual={actual}")
+        
+        action = 'Found' if dry_run else 'Repaired'
+        click.echo(f"{action} {len(drift)} post(s) with drifted aggregates")
+    
+    @app.cli.command('rebuild-rankings')
+    def rebuild_rankings_command():
+        """Recompute the trending and top-rated rankings from the database."""
+        counts = get_rankings().rebuild()
+        
+        for name, count in counts.items():
+            click.echo(f"{name}: {count} post(s) ranked")
+    
+    @app.cli.command('ingest-comments')
+    @click.option('--batch-size', type=int, help='Most comments per transaction (default: INGEST_BATCH_SIZE).')
+    @click.option('--max-wait-ms', type=int, help='Most a comment waits for its batch (default: INGEST_MAX_WAIT_MS).')
+    @click.option('--once', is_flag=True, help='Exit once the queue is empty.')
+    def ingest_comments_command(batch_size, max_wait_ms, once):
+        """Insert queued comments in batches (COMMENT_INGEST_MODE=queue)."""
+        batch_size = batch_size or app.config['INGEST_BATCH_SIZE']
+        max_wait_ms = max_wait_ms if max_wait_ms is not None else app.config['INGEST_MAX_WAIT_MS']
+        
+        created, failed = run_worker(batch_size, max_wait_ms / 1000, once=once)
+        
+        click.echo(f"Created {created} comment(s), {failed} failed")
@@ -0,0 +1,231 @@
+"""
+HTTP response compression (zstd, brotli, gzip) for the Flask app.
+
+`init_compression` registers an after-request hook that picks a content
+coding from the request's `Accept-Encoding` and compresses:
+
+- buffered responses of a compressible type (`COMPRESSION_MIMETYPES`) of
+  at least `COMPRESSION_MIN_SIZE` bytes; smaller bodies gain little and
+  still pay for a compressor
+- streamed responses (the NDJSON exports) chunk by chunk, flushing the
+  compressor after every chunk so clients can decode rows as they arrive
+
+zstd and brotli are optional (the `zstandard` and `brotli` packages); gzip
+always works. Among the codings the client accepts with the highest
+quality, the first of `COMPRESSION_ALGORITHMS` wins.
+
+Compressed bodies of cached GET responses are cached as well, under the
+response's cache key plus the coding (`cached_compressed`), so a hot page
+is compressed once per generation rather than on every hit. A compressed
+response gets its own strong ETag (the identity ETag plus '-<coding>').
+"""
+
+import logging
+import zlib
+from flask import current_app, g, request
+from werkzeug.http import parse_accept_header
+from caching import cache_get, cache_set, may_be_stale
+from instrumentation import record_cache_access
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - exercised only without brotli
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - exercised only without zstandard
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Every content coding this module can produce
+CONTENT_CODINGS = ('zstd', 'br', 'gzip')
+
+
+def available_codings(preference):
+    """The codings of `preference` whose library is installed, in order."""
+    installed = {'zstd': zstandard is not None, 'br': brotli is not None, 'gzip': True}
+    return [coding for coding in preference if installed.get(coding)]
+
+
+def negotiate(accept_encoding, codings):
+    """
+    Choose a content coding (RFC 9110 section 12.5.3).
+
+    Args:
+        accept_encoding: `Accept-Encoding` header value (None if absent)
+        codings: Codings the server can produce, most preferred first
+
+    Returns:
+        The accepted coding with the highest quality (ties go to the
+        earlier entry of `codings`), or None to send the identity coding
+    """
+    qualities = {value.lower(): quality for value, quality in parse_accept_header(accept_encoding)}
+    best, best_quality = None, 0
+    for coding in codings:
+        quality = qualities.get(coding, qualities.get('*', 0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(data, coding, level):
+    """Compress a whole body with `coding` at `level`."""
+    if coding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    if coding == 'br':
+        return brotli.compress(data, quality=level)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_stream(chunks, coding, level):
+    """
+    Compress an iterable of byte chunks as one stream.
+
+    The compressor is flushed after every non-empty chunk, so each chunk
+    can be decoded as soon as it arrives. Closing the returned generator
+    closes `chunks`.
+
+    Args:
+        chunks: Iterable of bytes
+        coding: 'zstd', 'br' or 'gzip'
+        level: Compression level
+
+    Yields:
+        Compressed chunks
+    """
+    if coding == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        push = lambda data: compressor.compress(data) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        finish = compressor.flush
+    elif coding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        push = lambda data: compressor.process(data) + compressor.flush()
+        finish = compressor.finish
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        push = lambda data: compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        finish = compressor.flush
+
+    try:
+        for chunk in chunks:
+            if chunk:
+                yield push(chunk)
+        yield finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def _request_coding():
+    """Coding negotiated for the current request."""
+    config = current_app.config
+    return negotiate(request.headers.get('Accept-Encoding'), available_codings(config['COMPRESSION_ALGORITHMS']))
+
+
+def _mark_encoded(response, coding):
+    """Set the headers of a response whose body is encoded with `coding`."""
+    response.headers['Content-Encoding'] = coding
+    response.vary.add('Accept-Encoding')
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{coding}')
+
+
+def cached_compressed(key, timeout):
+    """
+    Serve the compressed body of the response cached under `key`.
+
+    Call after the 304 check of a cached GET endpoint. On a miss, the
+    after-request hook stores the body it compresses for this request.
+
+    Args:
+        key: Cache key from `cache_key` (None bypasses the cache)
+        timeout: Time to live in seconds
+
+    Returns:
+        Response with the compressed JSON body, or None
+    """
+    if key is None or not current_app.config['COMPRESSION_ENABLED']:
+        return None
+    coding = _request_coding()
+    if coding is None:
+        return None
+
+    # The body's bytes depend on the JSON encoder as well
+    compressed_key = f'{key}:{type(current_app.json).__name__}:{coding}'
+    try:
+        body = cache_get(compressed_key)
+    except Exception:
+        logger.exception('Cache unavailable while reading %s', compressed_key)
+        return None
+
+    if body is None:
+        g.compressed_cache_entry = (compressed_key, timeout)
+        return None
+
+    record_cache_access(True)
+    g.precompressed = coding
+    return current_app.response_class(body, mimetype='application/json')
+
+
+def compress_response(response):
+    """After-request hook compressing `response` if worthwhile."""
+    config = current_app.config
+    coding = _request_coding()
+    precompressed = g.pop('precompressed', None)
+    entry = g.pop('compressed_cache_entry', None)
+
+    if precompressed:
+        _mark_encoded(response, precompressed)
+        return response
+
+    if response.status_code == 304:
+        # Keep the ETag of the representation the client validated
+        etag, weak = response.get_etag()
+        if etag and coding and f'"{etag}-{coding}"' in request.headers.get('If-None-Match', ''):
+            response.set_etag(f'{etag}-{coding}')
+        response.vary.add('Accept-Encoding')
+        return response
+
+    if (
+        response.status_code < 200 or response.status_code in (204, 206)
+        or response.mimetype not in config['COMPRESSION_MIMETYPES']
+        or 'Content-Encoding' in response.headers or response.direct_passthrough
+    ):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if coding is None:
+        return response
+    level = config['COMPRESSION_LEVELS'][coding]
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, coding, level)
+        response.headers.pop('Content-Length', None)
+        _mark_encoded(response, coding)
+        return response
+
+    data = response.get_data()
+    if len(data) < config['COMPRESSION_MIN_SIZE']:
+        return response
+
+    body = compress(data, coding, level)
+    if entry and response.status_code == 200 and not may_be_stale():
+        compressed_key, timeout = entry
+        try:
+            cache_set(compressed_key, body, timeout)
+        except Exception:
+            logger.exception('Cache unavailable while writing %s', compressed_key)
+
+    response.set_data(body)
+    _mark_encoded(response, coding)
+    return response
+
+
+def init_compression(app):
+    """Compress the app's responses (if `COMPRESSION_ENABLED`)."""
+    if app.config['COMPRESSION_ENABLED']:
+        app.after_request(compress_response)
@@ -0,0 +1,157 @@
+"""
+HTTP conditional requests (`ETag`/`Last-Modified`, answered with 304).
+
+Cached GET responses are identified by their cache key (see caching.py),
+which embeds the generation of every scope the response depends on and a
+digest of the normalized request parameters. The key changes whenever the
+response can, so it makes a strong validator that is known before the
+cache or the database is read:
+
+- `ETag` is a digest of the key (and of the JSON encoder, which decides
+  the exact bytes of the body)
+- `Last-Modified` is the newest generation, i.e. the time of the last
+  write to any of the scopes
+
+A request whose `If-None-Match` (or, without it, `If-Modified-Since`)
+matches is answered with an empty 304 before the response is read from
+the cache, queried or serialized.
+
+`Cache-Control` is set per endpoint from `HTTP_CACHE_CONTROL` (config.py),
+with `HTTP_CACHE_CONTROL_DEFAULT` for endpoints it does not list.
+"""
+
+import hashlib
+import time
+from datetime import datetime, timezone
+from flask import current_app, request
+from werkzeug.http import http_date, parse_date, parse_etags
+from caching import may_be_stale
+from compression import CONTENT_CODINGS
+
+
+def key_time_ms(key):
+    """Newest scope generation embedded in a cache key from `format_key`."""
+    version = key.rsplit(':', 2)[1]
+    return max(int(generation) for generation in version.split('.'))
+
+
+class Validators:
+    """
+    Validators of a cached response.
+
+    Args:
+        etag: Strong entity tag, without quotes
+        last_modified: Aware UTC datetime, or None if it cannot be sent
+    """
+
+    __slots__ = ('etag', 'last_modified')
+
+    def __init__(self, etag, last_modified):
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @classmethod
+    def for_key(cls, key, encoder, now_ms=None):
+        """
+        Build the validators of the response cached under `key`.
+
+        `Last-Modified` has a resolution of one second, so it is left out
+        while the newest write is within the current second: a second write
+        in that same second would not change it, and a client revalidating
+        with `If-Modified-Since` would keep its outdated copy.
+
+        Args:
+            key: Cache key from `cache_key` (None: the cache is unavailable)
+            encoder: Name of the JSON encoder that renders the body
+            now_ms: Current time in milliseconds (default: the clock)
+
+        Returns:
+            Validators, or None if `key` is None
+        """
+        if key is None:
+            return None
+        etag = hashlib.sha1(f'{encoder}\0{key}'.encode('utf-8')).hexdigest()
+
+        modified_s = key_time_ms(key) // 1000
+        now_s = (now_ms if now_ms is not None else int(time.time() * 1000)) // 1000
+        last_modified = None
+        if modified_s < now_s:
+            last_modified = datetime.fromtimestamp(modified_s, timezone.utc)
+        return cls(etag, last_modified)
+
+    def matches(self, headers):
+        """
+        Whether the client's copy is current (RFC 9110 section 13.2.2).
+
+        `If-None-Match` takes precedence over `If-Modified-Since`; entity
+        tags are compared weakly, as GET allows, and the ETags of the
+        compressed representations (see compression.py) match as well.
+
+        Args:
+            headers: Request headers (any mapping with `get`)
+        """
+        if_none_match = headers.get('If-None-Match')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            return etags.contains_weak(self.etag) or any(
+                etags.contains_weak(f'{self.etag}-{coding}') for coding in CONTENT_CODINGS
+            )
+
+        if_modified_since = parse_date(headers.get('If-Modified-Since'))
+        if if_modified_since is None or self.last_modified is None:
+            return False
+        return self.last_modified <= if_modified_since
+
+    def headers(self):
+        """Response headers carrying the validators."""
+        headers = {'ETag': f'"{self.etag}"'}
+        if self.last_modified is not None:
+            headers['Last-Modified'] = http_date(self.last_modified)
+        return headers
+
+
+def cache_control(config, endpoint):
+    """`Cache-Control` policy of an endpoint (e.g. 'posts.get_post')."""
+    return config['HTTP_CACHE_CONTROL'].get(endpoint, config['HTTP_CACHE_CONTROL_DEFAULT'])
+
+
+def check_not_modified(key):
+    """
+    Validate the current request against the response cached under `key`.
+
+    Call before reading the cache or building the response.
+
+    Args:
+        key: Cache key from `cache_key`
+
+    Returns:
+        Tuple of (validators or None, 304 response or None)
+    """
+    validators = Validators.for_key(key, type(current_app.json).__name__)
+    if validators is None or not validators.matches(request.headers):
+        return validators, None
+
+    response = current_app.response_class(status=304)
+    response.headers.update(validators.headers())
+    response.headers['Cache-Control'] = cache_control(current_app.config, request.endpoint)
+    return validators, response
+
+
+def with_validators(response, validators):
+    """
+    Add validators and the endpoint's `Cache-Control` to a 200 response.
+
+    A body that may miss a recent write (read from a lagging replica) gets
+    no validators, so it cannot be revalidated once the replica catches up.
+
+    Args:
+        response: Flask response
+        validators: Result of `check_not_modified` (None: none are sent)
+
+    Returns:
+        `response`
+    """
+    if validators is not None and not may_be_stale():
+        response.headers.update(validators.headers())
+    response.headers['Cache-Control'] = cache_control(current_app.config, request.endpoint)
+    return response
@@ -24,13 +24,39 @@ class Config:
     POSTGRES_PORT = os.environ.get('POSTGRES_PORT', '5432')
     POSTGRES_DB = os.environ.get('POSTGRES_DB', 'blogsite_db')
     
-    SQLALCHEMY_DATABASE_URI = (
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or (
         f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@"
         f"{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False
     
+    # Connection Pool Settings (per worker process; see database.py)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 5))       # seconds to wait for a connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))      # replace connections older than this
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0))  # PostgreSQL; 0 disables
+    # PgBouncer (transaction pooling) compatible mode: no startup options,
+    # no server-side prepared statements, timeouts set per transaction
+    DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', 'false').lower() == 'true'
+    
+    # Read Replicas (see database.py): comma-separated URIs in DATABASE_REPLICA_URLS
+    SQLALCHEMY_REPLICA_URIS = [uri for uri in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if uri]
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))   # primary reads after a write
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+    REPLICA_CHECK_INTERVAL = float(os.environ.get('REPLICA_CHECK_INTERVAL', 5))  # seconds between health checks
+    REPLICA_RETRY_SECONDS = float(os.environ.get('REPLICA_RETRY_SECONDS', 30))   # skip a failed replica this long
+    
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+    }
+    
     # Redis Settings
     REDIS_HOST = os.environ.get('REDIS_HOST', 'localhost')
     REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
@@ -38,13 +64,130 @@ class Config:
     REDIS_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}"
     
     # Cache Settings
+    CACHE_TYPE = os.environ.get('CACHE_TYPE', 'RedisCache')
     CACHE_DEFAULT_TIMEOUT = 300  # 5 minutes
     CACHE_POSTS_TIMEOUT = 600    # 10 minutes for posts listing
     CACHE_COMMENTS_TIMEOUT = 180 # 3 minutes for recent comments
+    # Stampede protection (see caching.py): entries stay servable this long
+    # past their timeout while one request rebuilds them
+    CACHE_STALE_TTL = int(os.environ.get('CACHE_STALE_TTL', 60))
+    CACHE_XFETCH_BETA = 1.0          # early refreshes (XFetch); higher is earlier, 0 disables
+    CACHE_LOCK_TIMEOUT = 10          # seconds a fill lock is held at most (longer than any build)
+    CACHE_LOCK_WAIT = 5              # seconds to wait for another fill before building anyway
+    CACHE_LOCK_POLL_INTERVAL = 0.02  # seconds between cache reads while another process fills
+    
+    # In-process (L1) cache in front of the shared one (see local_cache.py).
+    # Other processes' writes reach it over Redis pub/sub; generations
+    # expire from it after CACHE_L1_GENERATION_TTL should a message be lost
+    CACHE_L1_ENABLED = os.environ.get('CACHE_L1_ENABLED', 'true').lower() == 'true'
+    CACHE_L1_MAX_ITEMS = int(os.environ.get('CACHE_L1_MAX_ITEMS', 2048))
+    CACHE_L1_MAX_BYTES = int(os.environ.get('CACHE_L1_MAX_BYTES', 64 * 1024 * 1024))
+    CACHE_L1_TTL = 5                 # seconds a value stays in L1
+    CACHE_L1_GENERATION_TTL = 2      # seconds a generation stays in L1 (the staleness bound)
+    CACHE_INVALIDATION_CHANNEL = 'cache:invalidate'
+    
+    # HTTP caching (see conditional.py): Cache-Control of the cached GET
+    # endpoints, by endpoint name (e.g. {'posts.get_post': 'public,
+    # max-age=60'}); endpoints not listed get the default. 'no-cache' lets
+    # browsers and proxies keep responses but revalidate them (a 304 when
+    # nothing changed) before each use.
+    HTTP_CACHE_CONTROL_DEFAULT = os.environ.get('HTTP_CACHE_CONTROL', 'no-cache')
+    HTTP_CACHE_CONTROL = {}
+    
+    # Compression Settings (see compression.py): codings in server
+    # preference order (zstd and br need the zstandard/brotli packages)
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_ALGORITHMS = ('zstd', 'br', 'gzip')
+    COMPRESSION_LEVELS = {'zstd': 3, 'br': 4, 'gzip': 6}
+    COMPRESSION_MIN_SIZE = 1024  # bytes; smaller bodies are sent uncompressed
+    COMPRESSION_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/plain', 'text/html', 'text/csv')
+    
+    # Search Settings: 'auto' picks full-text search for the database
+    # dialect (tsvector on PostgreSQL, FTS5 on SQLite); 'like' forces ILIKE
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'auto')
+    
+    # Rankings (see rankings.py): 'auto' keeps them in Redis sorted sets
+    # with CACHE_TYPE=RedisCache and in process otherwise ('memory')
+    RANKINGS_BACKEND = os.environ.get('RANKINGS_BACKEND', 'auto')
+    RANKINGS_BUILD_LOCK_TIMEOUT = 300  # seconds a first build of the rankings holds its lock at most
+    RANKINGS_RETRY_AFTER = 2           # seconds, sent with 503 while a ranking is first built
+    TRENDING_HALF_LIFE_HOURS = 24     # a comment's trending weight halves this often
+    TRENDING_WINDOW_HOURS = 7 * 24    # comments counted by a full rebuild
+    TOP_RATED_PRIOR_MEAN = 3.0        # Bayesian average: ratings assumed before any arrive
+    TOP_RATED_PRIOR_WEIGHT = 5
+    
+    # JSON Settings: 'auto' encodes responses with orjson when it is
+    # installed, 'json' forces Flask's stdlib provider (see serializers.py)
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'auto')
     
     # Pagination Settings
     POSTS_PER_PAGE = 10
     COMMENTS_PER_PAGE = 20
+    POST_DETAIL_COMMENTS = 20  # comments embedded in GET /api/posts/<id>
+    POST_EXCERPT_LENGTH = 200  # characters in listing excerpts (`excerpt_length`)
+    POST_EXCERPT_MAX_LENGTH = 1000
+    
+    # Batch endpoint settings
+    BATCH_MAX_ITEMS = 1000
+    
+    # Comment ingestion (see ingest.py): 'sync' inserts each new comment in
+    # its request; 'queue' answers 202 and `flask ingest-comments` inserts
+    # queued comments in batches
+    COMMENT_INGEST_MODE = os.environ.get('COMMENT_INGEST_MODE', 'sync')
+    COMMENT_QUEUE_BACKEND = os.environ.get('COMMENT_QUEUE_BACKEND', 'auto')  # 'redis', or 'sqlite' (a local file)
+    COMMENT_QUEUE_PATH = os.environ.get('COMMENT_QUEUE_PATH')   # SQLite queue (default: instance/comment_queue.db)
+    COMMENT_QUEUE_MAX_PENDING = int(os.environ.get('COMMENT_QUEUE_MAX_PENDING', 10000))  # then 503
+    COMMENT_QUEUE_RETRY_AFTER = 2   # seconds, sent with 503 when the queue is full
+    INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 500))
+    INGEST_MAX_WAIT_MS = int(os.environ.get('INGEST_MAX_WAIT_MS', 200))  # most a comment waits for its batch
+    INGEST_CLAIM_TIMEOUT = 60       # seconds before a dead worker's batch is retried
+    INGEST_MAX_ATTEMPTS = 3         # claims of a comment before a failing batch is split up
+    INGEST_STATUS_TTL = 3600        # seconds ticket statuses are kept
+    
+    # Admission control (see admission.py): per route and per client token
+    # buckets (rate in requests/s, burst = bucket size) and a per-process cap
+    # on a route's concurrent requests, waiting at most max_queue_ms for a
+    # slot. Budgets are per cost class; a None rate or cap is unlimited.
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'false').lower() == 'true'
+    ADMISSION_BACKEND = os.environ.get('ADMISSION_BACKEND', 'auto')  # 'redis' (shared) or 'memory'
+    ADMISSION_CLIENT_HEADER = os.environ.get('ADMISSION_CLIENT_HEADER')  # e.g. X-Forwarded-For behind a proxy
+    # Proxies in front of the app that append to ADMISSION_CLIENT_HEADER; the
+    # header is ignored while this is 0, as clients can forge it
+    ADMISSION_TRUSTED_PROXIES = int(os.environ.get('ADMISSION_TRUSTED_PROXIES', 0))
+    ADMISSION_BUDGETS = {
+        'read': {'rate': 500, 'burst': 1000, 'client_rate': 20, 'client_burst': 60,
+                 'max_in_flight': 32, 'max_queue_ms': 50},
+        'expensive': {'rate': 20, 'burst': 40, 'client_rate': 1, 'client_burst': 5,
+                      'max_in_flight': 4, 'max_queue_ms': 200},
+        'write': {'rate': 100, 'burst': 200, 'client_rate': 5, 'client_burst': 20,
+                  'max_in_flight': 8, 'max_queue_ms': 200},
+        'export': {'rate': 1, 'burst': 2, 'client_rate': 0.1, 'client_burst': 1,
+                   'max_in_flight': 2, 'max_queue_ms': 0},
+    }
+    ADMISSION_DEEP_PAGE = 20        # offset pages past this are 'expensive'
+    ADMISSION_LARGE_PAGE = 50       # as are pages of more than this many items
+    ADMISSION_ROUTE_CLASSES = {}    # endpoint -> cost class, e.g. {'posts.get_all_posts': 'expensive'}
+    ADMISSION_EXEMPT = ('index', 'health', 'metrics_endpoint')
+    ADMISSION_RETRY_AFTER = 1       # seconds, sent with 503 for busy routes
+    
+    # Instrumentation Settings (see instrumentation.py)
+    INSTRUMENTATION_ENABLED = True
+    SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'true').lower() == 'true'
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'false').lower() == 'true'
+    # Log a warning when a request runs more SQL statements than this (0 disables)
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 20))
+    
+    # WSGI Server Settings (read by gunicorn.conf.py)
+    WSGI_BIND = os.environ.get('WSGI_BIND', '0.0.0.0:5000')
+    WSGI_WORKERS = int(os.environ.get('WSGI_WORKERS', 2 * (os.cpu_count() or 1) + 1))
+    WSGI_THREADS = int(os.environ.get('WSGI_THREADS', 4))          # >1 uses the gthread worker
+    WSGI_PRELOAD = os.environ.get('WSGI_PRELOAD', 'true').lower() == 'true'
+    WSGI_KEEPALIVE = int(os.environ.get('WSGI_KEEPALIVE', 5))       # seconds idle per connection
+    WSGI_TIMEOUT = int(os.environ.get('WSGI_TIMEOUT', 30))          # kill workers silent this long
+    WSGI_GRACEFUL_TIMEOUT = int(os.environ.get('WSGI_GRACEFUL_TIMEOUT', 30))
+    WSGI_MAX_REQUESTS = int(os.environ.get('WSGI_MAX_REQUESTS', 5000))  # recycle workers (0 disables)
+    WSGI_MAX_REQUESTS_JITTER = int(os.environ.get('WSGI_MAX_REQUESTS_JITTER', 500))
+    WSGI_BACKLOG = int(os.environ.get('WSGI_BACKLOG', 2048))
     
     # CORS Settings
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:3000').split(',')
@@ -54,6 +197,7 @@ class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
     SQLALCHEMY_ECHO = True
+    SQLALCHEMY_ENGINE_OPTIONS = dict(Config.SQLALCHEMY_ENGINE_OPTIONS, pool_size=5)
 
 
 class ProductionConfig(Config):
@@ -66,7 +210,11 @@ class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}  # in-memory SQLite needs its single static connection
+    SQLALCHEMY_REPLICA_URIS = []
     REDIS_URL = 'redis://localhost:6379/1'
+    CACHE_TYPE = 'SimpleCache'
+    ADMISSION_ENABLED = False  # tests/test_admission.py turns it on
 
 
 # Configuration dictionary
@@ -0,0 +1,358 @@
+"""
+Database engine configuration: connection pool options, statement
+timeouts, PgBouncer compatibility, pool health metrics and read replicas.
+
+`configure_engine_options` runs before `db.init_app` and turns the DB_*
+settings of config.py into `SQLALCHEMY_ENGINE_OPTIONS`;
+`init_replica_routing` and `init_pool_instrumentation` run after it.
+
+Read replicas
+-------------
+`RoutingSession` (the session class of `db`) sends the reads of GET and
+HEAD requests to a replica and everything else to the primary:
+
+- writes, flushes and non-GET requests always use the primary
+- after a client's successful write, a short-lived cookie keeps its reads
+  on the primary for `REPLICA_STICKY_SECONDS` (read-your-writes)
+- replicas are health-checked (and, on PostgreSQL, lag-checked) at most
+  every `REPLICA_CHECK_INTERVAL` seconds; one that is down, lagging or
+  raised a connection error is skipped for `REPLICA_RETRY_SECONDS` and
+  reads fall back to the primary
+"""
+
+import itertools
+import logging
+import threading
+import time
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.dml import UpdateBase
+from instrumentation import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# Cookie that pins a client's reads to the primary after it writes
+STICKY_COOKIE = 'db_primary_until'
+
+READ_METHODS = ('GET', 'HEAD')
+
+# Seconds a PostgreSQL standby is behind its primary; 0 when it has
+# replayed everything it received (an idle primary is not lag)
+POSTGRES_LAG_SQL = (
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+# Histogram buckets for pool checkout waits, in seconds
+CHECKOUT_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waited for a connection,
+    and how many checkouts timed out, in the app's metrics.
+
+    The pool's `logging_name` (engine option `pool_logging_name`) labels
+    the metrics, so several engines can be told apart.
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self._record(time.perf_counter() - started, timed_out=True)
+            raise
+        self._record(time.perf_counter() - started)
+        return connection
+
+    def _record(self, waited, timed_out=False):
+        if not has_app_context():
+            return
+        metrics = get_metrics(current_app)
+        pool = self.logging_name or 'default'
+        metrics.observe(
+            'db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection',
+            waited, buckets=CHECKOUT_WAIT_BUCKETS, pool=pool
+        )
+        if timed_out:
+            metrics.inc('db_pool_timeouts_total', 'Checkouts that timed out waiting for a connection', pool=pool)
+
+
+def configure_engine_options(app, name='primary'):
+    """
+    Complete `SQLALCHEMY_ENGINE_OPTIONS` from the DB_* settings.
+
+    Only touches engines configured with a queue pool (`pool_size` set);
+    the in-memory SQLite engine used by tests keeps Flask-SQLAlchemy's
+    defaults.
+
+    Args:
+        app: Flask app, before `db.init_app`
+        name: Label for the pool metrics
+    """
+    # Copied: the dictionaries on the config classes are shared by every app
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    if 'pool_size' in options:
+        options.setdefault('poolclass', InstrumentedQueuePool)
+        options.setdefault('pool_logging_name', name)
+
+    _apply_driver_options(app, options, app.config['SQLALCHEMY_DATABASE_URI'])
+
+
+def _apply_driver_options(app, options, uri):
+    url = make_url(uri)
+    if url.get_backend_name() != 'postgresql':
+        return
+
+    connect_args = options['connect_args'] = dict(options.get('connect_args') or {})
+    timeout_ms = app.config.get('DB_STATEMENT_TIMEOUT_MS', 0)
+
+    if app.config.get('DB_PGBOUNCER'):
+        # PgBouncer in transaction mode hands each transaction to any server
+        # connection: startup options are rejected and prepared statements
+        # would not be found again. psycopg2 never prepares server-side;
+        # the other drivers must be told not to.
+        driver = url.get_driver_name()
+        if driver == 'asyncpg':
+            connect_args.setdefault('statement_cache_size', 0)
+            connect_args.setdefault('prepared_statement_cache_size', 0)
+        elif driver == 'psycopg':
+            connect_args.setdefault('prepare_threshold', None)
+    elif timeout_ms and url.get_driver_name() == 'asyncpg':
+        # asyncpg takes server settings instead of a libpq options string
+        server_settings = connect_args['server_settings'] = dict(connect_args.get('server_settings') or {})
+        server_settings['statement_timeout'] = str(int(timeout_ms))
+    elif timeout_ms:
+        connect_args['options'] = f"{connect_args.get('options', '')} -c statement_timeout={int(timeout_ms)}".strip()
+
+
+def _set_local_statement_timeout(timeout_ms):
+    def begin(conn):
+        conn.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout_ms)}')
+    return begin
+
+
+def _pool_status(pools):
+    """Gauge callbacks over the current pools of several engines."""
+
+    def values(read):
+        result = []
+        for label, engine in pools:
+            pool = engine.pool
+            if isinstance(pool, QueuePool):
+                result.append(({'pool': label}, read(pool)))
+        return result
+
+    def saturation(pool):
+        # _max_overflow is -1 for an unbounded overflow
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        return round(pool.checkedout() / capacity, 3) if capacity else 0
+
+    return {
+        'db_pool_size': ('Configured pool size', lambda: values(lambda pool: pool.size())),
+        'db_pool_checked_out': ('Connections in use', lambda: values(lambda pool: pool.checkedout())),
+        'db_pool_idle': ('Idle connections in the pool', lambda: values(lambda pool: pool.checkedin())),
+        'db_pool_overflow': ('Connections beyond pool_size', lambda: values(lambda pool: max(pool.overflow(), 0))),
+        'db_pool_saturation': ('Checked-out share of size plus max_overflow', lambda: values(saturation)),
+    }
+
+
+def init_pool_instrumentation(app):
+    """
+    Register pool gauges and, in PgBouncer mode, the per-transaction
+    statement timeout. Call after `db.init_app`.
+    """
+    from models import db
+
+    with app.app_context():
+        engines = list(db.engines.items())
+    router = app.extensions.get('replica_router')
+    if router is not None:
+        engines.extend((replica.key, replica.engine) for replica in router.replicas)
+
+    pools = []
+    for key, engine in engines:
+        label = engine.pool.logging_name or (key or 'primary')
+        pools.append((label, engine))
+
+        timeout_ms = app.config.get('DB_STATEMENT_TIMEOUT_MS', 0)
+        if app.config.get('DB_PGBOUNCER') and timeout_ms and engine.dialect.name == 'postgresql':
+            event.listen(engine, 'begin', _set_local_statement_timeout(timeout_ms))
+
+    metrics = get_metrics(app)
+    for name, (help_text, callback) in _pool_status(pools).items():
+        metrics.gauge(name, help_text, callback)
+
+
+class _Replica:
+    """A replica engine and its health state."""
+
+    def __init__(self, key, engine):
+        self.key = key
+        self.engine = engine
+        self.down_until = 0.0
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def mark_down(self, retry_seconds, reason):
+        if time.monotonic() >= self.down_until:
+            logger.warning('Replica %s unavailable (%s); reading from the primary', self.key, reason)
+        self.down_until = time.monotonic() + retry_seconds
+
+
+class ReplicaRouter:
+    """
+    Picks a healthy replica for each read request, round-robin.
+
+    Args:
+        engines: Dictionary of replica engines by name
+        settings: App config
+    """
+
+    def __init__(self, engines, settings):
+        self.replicas = [_Replica(key, engine) for key, engine in engines.items()]
+        self.check_interval = settings['REPLICA_CHECK_INTERVAL']
+        self.retry_seconds = settings['REPLICA_RETRY_SECONDS']
+        self.max_lag = settings['REPLICA_MAX_LAG_SECONDS']
+        self._next = itertools.count()
+
+    def check(self, replica):
+        """Connect to `replica`, measure its lag, and mark it down on failure."""
+        engine = replica.engine
+        try:
+            with engine.connect() as conn:
+                conn.exec_driver_sql('SELECT 1')
+                lag = 0.0
+                if engine.dialect.name == 'postgresql':
+                    lag = float(conn.exec_driver_sql(POSTGRES_LAG_SQL).scalar() or 0)
+        except Exception as e:
+            replica.mark_down(self.retry_seconds, f'health check failed: {e}')
+            return False
+        if lag > self.max_lag:
+            replica.mark_down(self.retry_seconds, f'{lag:.1f}s behind')
+            return False
+        return True
+
+    def _usable(self, replica):
+        now = time.monotonic()
+        if now < replica.down_until:
+            return False
+        if now - replica.checked_at < self.check_interval:
+            return True
+        # One request runs the check; concurrent ones keep using the
+        # replica until it fails
+        if not replica.lock.acquire(blocking=False):
+            return True
+        try:
+            replica.checked_at = now
+            return self.check(replica)
+        finally:
+            replica.lock.release()
+
+    def choose(self):
+        """Engine of a healthy replica, or None to use the primary."""
+        count = len(self.replicas)
+        start = next(self._next)
+        for offset in range(count):
+            replica = self.replicas[(start + offset) % count]
+            if self._usable(replica):
+                return replica.engine
+        return None
+
+    def dispose(self):
+        for replica in self.replicas:
+            replica.engine.dispose()
+
+
+def _reads_pinned_to_primary():
+    until = request.cookies.get(STICKY_COOKIE, type=float)
+    return until is not None and until > time.time()
+
+
+def current_replica():
+    """
+    Replica engine serving the reads of the current request, or None.
+
+    Decided once per request: GET/HEAD requests from clients without a
+    recent write go to a healthy replica.
+    """
+    if not has_request_context():
+        return None
+    if 'db_replica' not in g:
+        router = current_app.extensions.get('replica_router')
+        replica = None
+        if router is not None and request.method in READ_METHODS and not _reads_pinned_to_primary():
+            replica = router.choose()
+        g.db_replica = replica
+    return g.db_replica
+
+
+def served_by_replica():
+    """Whether the current request has read from a replica."""
+    return has_request_context() and g.get('db_replica') is not None
+
+
+class RoutingSession(Session):
+    """Session that sends reads to `current_replica()` when there is one."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not isinstance(clause, UpdateBase):
+            replica = current_replica()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def init_replica_routing(app):
+    """
+    Create the replica engines and route reads to them, if replicas are
+    configured. Call after `configure_engine_options`.
+
+    Replica engines use the primary's pool settings and are owned by the
+    router (`app.extensions['replica_router']`), not by Flask-SQLAlchemy,
+    so `db.create_all()` and migrations only ever touch the primary.
+    """
+    uris = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+    if not uris:
+        return
+
+    engines = {}
+    for index, uri in enumerate(uris):
+        key = f'replica_{index}'
+        options = dict(app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+        options.pop('connect_args', None)
+        if 'pool_size' in options:
+            options['pool_logging_name'] = key
+        _apply_driver_options(app, options, uri)
+        engines[key] = create_engine(uri, **options)
+
+    router = ReplicaRouter(engines, app.config)
+    app.extensions['replica_router'] = router
+
+    for replica in router.replicas:
+
+        @event.listens_for(replica.engine, 'handle_error')
+        def replica_error(context, replica=replica):
+            # Stop routing reads to a replica that lost its connection
+            if context.is_disconnect or context.connection is None:
+                replica.mark_down(router.retry_seconds, str(context.original_exception))
+
+    @app.after_request
+    def pin_reads_after_write(response):
+        if request.method not in READ_METHODS and request.method != 'OPTIONS' and response.status_code < 400:
+            sticky = app.config['REPLICA_STICKY_SECONDS']
+            response.set_cookie(
+                STICKY_COOKIE, f'{time.time() + sticky:.3f}',
+                max_age=sticky, httponly=True, samesite='Lax'
+            )
+        return response
+
+    @app.teardown_request
+    def forget_replica(error=None):
+        g.pop('db_replica', None)
@@ -0,0 +1,70 @@
+"""
+Gunicorn settings, driven by the WSGI_* values in config.py.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Environment variables override the defaults as for any other setting
+(e.g. WSGI_WORKERS=8 WSGI_THREADS=2).
+
+SIGHUP makes the master re-read this file and replace its workers
+gracefully, but with WSGI_PRELOAD the new workers are forked from the
+app already loaded in the master, so they run the old code. To deploy new
+code, send SIGUSR2 (a new master and workers start next to the old ones;
+then send SIGTERM to the old master) or restart gunicorn.
+"""
+
+import gc
+import os
+# Imported under a private name: gunicorn reads every public module
+# attribute as a setting, and `config` is one of its own
+from config import config as _configs
+
+_settings = _configs[os.environ.get('FLASK_ENV', 'production')]
+
+bind = _settings.WSGI_BIND
+backlog = _settings.WSGI_BACKLOG
+
+# Pre-fork workers, each with a thread pool when WSGI_THREADS > 1
+workers = _settings.WSGI_WORKERS
+threads = _settings.WSGI_THREADS
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# Import the app once in the master; workers share the loaded modules and
+# SQLAlchemy metadata copy-on-write
+preload_app = _settings.WSGI_PRELOAD
+
+keepalive = _settings.WSGI_KEEPALIVE
+timeout = _settings.WSGI_TIMEOUT
+graceful_timeout = _settings.WSGI_GRACEFUL_TIMEOUT
+
+# Recycle workers after a number of requests (staggered by the jitter so
+# they do not all restart together) to bound memory growth
+max_requests = _settings.WSGI_MAX_REQUESTS
+max_requests_jitter = _settings.WSGI_MAX_REQUESTS_JITTER
+
+# Heartbeat files on tmpfs: a slow disk must not make workers look hung
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = os.environ.get('WSGI_ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.environ.get('WSGI_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    # Move everything allocated while preloading to a permanent generation,
+    # so the workers' garbage collector never writes to (and copies) the
+    # shared pages
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    # Connections opened while preloading belong to the master; each worker
+    # must open its own instead of sharing the sockets
+    if preload_app:
+        from wsgi import app
+        from models import db
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
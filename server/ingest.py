@@ -0,0 +1,541 @@
+"""
+Write-behind ingestion of new comments (`COMMENT_INGEST_MODE = 'queue'`).
+
+POST /api/comments normally inserts and commits each comment on its own,
+so a burst of comments costs one durable commit (an fsync) per request. In
+queue mode the handler only validates the comment, appends it to a durable
+queue and answers 202 with a ticket; `flask ingest-comments` drains the
+queue and inserts the comments in batches, one transaction per batch
+(group commit):
+
+- a batch is written once `INGEST_BATCH_SIZE` comments are waiting, or
+  once the oldest has waited `INGEST_MAX_WAIT_MS`, which bounds the delay
+  before a comment becomes visible
+- when `COMMENT_QUEUE_MAX_PENDING` comments are waiting, new ones are
+  refused with 503 and a Retry-After header (backpressure)
+- GET /api/comments/ingest/<ticket> reports whether a comment is still
+  pending, was created (with its id) or failed (e.g. its post was deleted)
+
+Two queues are available: a Redis stream with a consumer group (shared by
+every server and worker), or a local SQLite file in WAL mode for single-host
+deployments and tests. Delivery is at least once: a worker that dies
+leaves its batch to be claimed again once `INGEST_CLAIM_TIMEOUT` passes.
+Inserts are idempotent all the same, as each comment is stored with its
+ticket (`Comment.ingest_ticket`, unique), and a ticket already stored is
+reported as created rather than inserted again.
+
+Each claim of a comment counts as an attempt. Once a batch holding a
+comment on its `INGEST_MAX_ATTEMPTS`th attempt fails, its comments are
+inserted one by one, so a comment that can never be inserted is marked
+failed on its own instead of blocking the queue.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from flask import current_app
+from sqlalchemy import select
+from models import db, Comment, Post
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+CREATED = 'created'
+FAILED = 'failed'
+
+# Appends a comment to the stream unless it already holds `max_pending`,
+# in one step so concurrent producers cannot overshoot the limit
+ENQUEUE_SCRIPT = """
+if redis.call('XLEN', KEYS[1]) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('HSET', KEYS[2], 'status', ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+redis.call('XADD', KEYS[1], '*', 'ticket', ARGV[4], 'fields', ARGV[5])
+return 1
+"""
+
+
+class QueuedComment:
+    """
+    A comment claimed from a queue.
+
+    Args:
+        ticket: Ticket returned when it was queued
+        fields: Validated comment fields
+        enqueued_at: Time it was queued, in seconds since the epoch
+        ref: Where it is in its queue (row id or stream entry id)
+        attempts: Times it was claimed, this claim included
+    """
+
+    __slots__ = ('ticket', 'fields', 'enqueued_at', 'ref', 'attempts')
+
+    def __init__(self, ticket, fields, enqueued_at, ref, attempts=1):
+        self.ticket = ticket
+        self.fields = fields
+        self.enqueued_at = enqueued_at
+        self.ref = ref
+        self.attempts = attempts
+
+
+class QueueFull(Exception):
+    """The queue holds `COMMENT_QUEUE_MAX_PENDING` comments already."""
+
+
+class SqliteCommentQueue:
+    """
+    Comment queue in a local SQLite file.
+
+    Rows move from 'pending' to 'claimed' (by a worker) to 'created' or
+    'failed', and are kept for `status_ttl` seconds afterwards so clients
+    can look them up.
+
+    Args:
+        path: Database file
+        max_pending: Backpressure limit
+        claim_timeout: Seconds after which a claimed batch is retried
+        status_ttl: Seconds finished rows are kept
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS comment_queue (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticket TEXT NOT NULL UNIQUE,
+        fields TEXT NOT NULL,
+        state TEXT NOT NULL,
+        comment_id INTEGER,
+        error TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        enqueued_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS ix_comment_queue_state ON comment_queue (state, id);
+    """
+
+    def __init__(self, path, max_pending, claim_timeout, status_ttl):
+        self.path = path
+        self.max_pending = max_pending
+        self.claim_timeout = claim_timeout
+        self.status_ttl = status_ttl
+        self._local = threading.local()
+        connection = self._connect()
+        connection.executescript(self.SCHEMA)
+        # Queue files created before attempts were counted
+        columns = {row[1] for row in connection.execute('PRAGMA table_info(comment_queue)')}
+        if 'attempts' not in columns:
+            connection.execute('ALTER TABLE comment_queue ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0')
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            # WAL appends instead of rewriting pages; NORMAL skips the fsync
+            # per commit and stays durable across process crashes
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def enqueue(self, fields):
+        connection = self._connect()
+        now = time.time()
+        ticket = uuid.uuid4().hex
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            (pending,) = connection.execute(
+                "SELECT count(*) FROM comment_queue WHERE state IN ('pending', 'claimed')"
+            ).fetchone()
+            if pending >= self.max_pending:
+                raise QueueFull()
+            connection.execute(
+                'INSERT INTO comment_queue (ticket, fields, state, enqueued_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                (ticket, json.dumps(fields), PENDING, now, now)
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return ticket
+
+    def claim(self, limit):
+        connection = self._connect()
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            # Batches of a worker that died are handed out again
+            connection.execute(
+                "UPDATE comment_queue SET state = 'pending' WHERE state = 'claimed' AND updated_at < ?",
+                (now - self.claim_timeout,)
+            )
+            rows = connection.execute(
+                "UPDATE comment_queue SET state = 'claimed', attempts = attempts + 1, updated_at = ? WHERE id IN ("
+                "SELECT id FROM comment_queue WHERE state = 'pending' ORDER BY id LIMIT ?"
+                ") RETURNING id, ticket, fields, enqueued_at, attempts",
+                (now, limit)
+            ).fetchall()
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        rows.sort()
+        return [
+            QueuedComment(ticket, json.loads(fields), enqueued_at, row_id, attempts)
+            for row_id, ticket, fields, enqueued_at, attempts in rows
+        ]
+
+    def complete(self, created, failed):
+        """
+        Record the outcome of claimed comments.
+
+        Args:
+            created: Dictionary of QueuedComment to new comment id
+            failed: Dictionary of QueuedComment to error message
+        """
+        connection = self._connect()
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'UPDATE comment_queue SET state = ?, comment_id = ?, updated_at = ? WHERE ticket = ?',
+                [(CREATED, comment_id, now, item.ticket) for item, comment_id in created.items()]
+            )
+            connection.executemany(
+                'UPDATE comment_queue SET state = ?, error = ?, updated_at = ? WHERE ticket = ?',
+                [(FAILED, error, now, item.ticket) for item, error in failed.items()]
+            )
+            connection.execute(
+                "DELETE FROM comment_queue WHERE state IN ('created', 'failed') AND updated_at < ?",
+                (now - self.status_ttl,)
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def release(self, items):
+        self._connect().executemany(
+            "UPDATE comment_queue SET state = 'pending' WHERE ticket = ? AND state = 'claimed'",
+            [(item.ticket,) for item in items]
+        )
+
+    def status(self, ticket):
+        row = self._connect().execute(
+            'SELECT state, comment_id, error FROM comment_queue WHERE ticket = ?', (ticket,)
+        ).fetchone()
+        if row is None:
+            return None
+        state, comment_id, error = row
+        return {'status': PENDING if state == 'claimed' else state, 'comment_id': comment_id, 'error': error}
+
+    def pending(self):
+        (count,) = self._connect().execute(
+            "SELECT count(*) FROM comment_queue WHERE state IN ('pending', 'claimed')"
+        ).fetchone()
+        return count
+
+
+class RedisCommentQueue:
+    """
+    Comment queue in a Redis stream read through a consumer group.
+
+    Entries are deleted from the stream once their batch is committed, so
+    its length is the number of comments waiting. Released entries are
+    added again at the end of the stream, with the attempts made so far,
+    so they are delivered again at once. Statuses are hashes that expire
+    `status_ttl` seconds after the last change.
+
+    Args:
+        client: redis.Redis client
+        max_pending: Backpressure limit
+        claim_timeout: Seconds after which a claimed batch is retried
+        status_ttl: Seconds statuses are kept
+        prefix: Key prefix
+    """
+
+    GROUP = 'ingest'
+
+    def __init__(self, client, max_pending, claim_timeout, status_ttl, prefix='ingest:comments'):
+        self.client = client
+        self.max_pending = max_pending
+        self.claim_timeout = claim_timeout
+        self.status_ttl = status_ttl
+        self.stream = prefix
+        self.consumer = f'{os.uname().nodename}:{os.getpid()}'
+        self._group_ready = False
+        self._enqueue = client.register_script(ENQUEUE_SCRIPT)
+
+    def _status_key(self, ticket):
+        return f'{self.stream}:status:{ticket}'
+
+    def _ensure_group(self):
+        if self._group_ready:
+            return
+        try:
+            self.client.xgroup_create(self.stream, self.GROUP, id='0', mkstream=True)
+        except Exception as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        self._group_ready = True
+
+    def enqueue(self, fields):
+        ticket = uuid.uuid4().hex
+        added = self._enqueue(
+            keys=[self.stream, self._status_key(ticket)],
+            args=[self.max_pending, PENDING, self.status_ttl, ticket, json.dumps(fields)]
+        )
+        if not added:
+            raise QueueFull()
+        return ticket
+
+    def _items(self, entries):
+        items = []
+        for entry_id, values in entries:
+            entry_id = entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+            values = {key.decode(): value.decode() for key, value in values.items()}
+            if 'enqueued_at' in values:
+                enqueued_at = float(values['enqueued_at'])
+            else:
+                enqueued_at = int(entry_id.split('-')[0]) / 1000
+            attempts = int(values.get('attempts', 0)) + 1
+            items.append(QueuedComment(values['ticket'], json.loads(values['fields']), enqueued_at, entry_id, attempts))
+        return items
+
+    def claim(self, limit):
+        self._ensure_group()
+        # Batches of a worker that died are handed out again
+        _, entries, *_ = self.client.xautoclaim(
+            self.stream, self.GROUP, self.consumer, int(self.claim_timeout * 1000), count=limit
+        )
+        items = self._items(entry for entry in entries if entry and entry[1])
+        if items:
+            # Claimed again, so delivered more than once
+            pipe = self.client.pipeline(transaction=False)
+            for item in items:
+                pipe.xpending_range(self.stream, self.GROUP, item.ref, item.ref, 1)
+            for item, pending in zip(items, pipe.execute()):
+                if pending:
+                    item.attempts += pending[0]['times_delivered'] - 1
+        if len(items) < limit:
+            for _, stream_entries in self.client.xreadgroup(
+                self.GROUP, self.consumer, {self.stream: '>'}, count=limit - len(items)
+            ) or []:
+                items.extend(self._items(stream_entries))
+        return items
+
+    def complete(self, created, failed):
+        pipe = self.client.pipeline(transaction=True)
+        for item, comment_id in created.items():
+            pipe.hset(self._status_key(item.ticket), mapping={'status': CREATED, 'comment_id': comment_id})
+            pipe.expire(self._status_key(item.ticket), self.status_ttl)
+        for item, error in failed.items():
+            pipe.hset(self._status_key(item.ticket), mapping={'status': FAILED, 'error': error})
+            pipe.expire(self._status_key(item.ticket), self.status_ttl)
+        refs = [item.ref for item in (*created, *failed)]
+        if refs:
+            pipe.xack(self.stream, self.GROUP, *refs)
+            pipe.xdel(self.stream, *refs)
+        pipe.execute()
+
+    def release(self, items):
+        if not items:
+            return
+        pipe = self.client.pipeline(transaction=True)
+        for item in items:
+            pipe.xadd(self.stream, {
+                'ticket': item.ticket,
+                'fields': json.dumps(item.fields),
+                'enqueued_at': repr(item.enqueued_at),
+                'attempts': item.attempts,
+            })
+        refs = [item.ref for item in items]
+        pipe.xack(self.stream, self.GROUP, *refs)
+        pipe.xdel(self.stream, *refs)
+        pipe.execute()
+
+    def status(self, ticket):
+        values = self.client.hgetall(self._status_key(ticket))
+        if not values:
+            return None
+        values = {key.decode(): value.decode() for key, value in values.items()}
+        comment_id = values.get('comment_id')
+        return {
+            'status': values['status'],
+            'comment_id': int(comment_id) if comment_id else None,
+            'error': values.get('error')
+        }
+
+    def pending(self):
+        return self.client.xlen(self.stream)
+
+
+def get_comment_queue():
+    """
+    Get the comment queue of the current app.
+
+    Returns:
+        SqliteCommentQueue or RedisCommentQueue, created once per app
+    """
+    queue = current_app.extensions.get('comment_queue')
+    if queue is None:
+        config = current_app.config
+        options = dict(
+            max_pending=config['COMMENT_QUEUE_MAX_PENDING'],
+            claim_timeout=config['INGEST_CLAIM_TIMEOUT'],
+            status_ttl=config['INGEST_STATUS_TTL'],
+        )
+        name = config['COMMENT_QUEUE_BACKEND']
+        if name == 'auto':
+            name = 'redis' if config['CACHE_TYPE'] == 'RedisCache' else 'sqlite'
+        if name == 'redis':
+            import redis
+            queue = RedisCommentQueue(redis.from_url(config['REDIS_URL']), **options)
+        else:
+            path = config['COMMENT_QUEUE_PATH'] or os.path.join(current_app.instance_path, 'comment_queue.db')
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            queue = SqliteCommentQueue(path, **options)
+        current_app.extensions['comment_queue'] = queue
+    return queue
+
+
+def next_batch(queue, batch_size, max_wait, poll_interval=0.05):
+    """
+    Claim the next batch, waiting for it to fill for at most `max_wait`
+    seconds after its oldest comment was queued.
+
+    Returns:
+        List of QueuedComment (empty if the queue is empty)
+    """
+    items = queue.claim(batch_size)
+    while items and len(items) < batch_size:
+        remaining = items[0].enqueued_at + max_wait - time.time()
+        if remaining <= 0:
+            break
+        time.sleep(min(remaining, poll_interval))
+        items.extend(queue.claim(batch_size - len(items)))
+    return items
+
+
+def ingest_batch(queue, items):
+    """
+    Insert a batch of queued comments in one transaction and record the
+    outcome of each.
+
+    Comments whose post no longer exists fail; if the transaction fails,
+    the batch is released to be retried, unless one of its comments is on
+    its `INGEST_MAX_ATTEMPTS`th attempt (see `ingest_one_by_one`).
+
+    Returns:
+        Tuple of (created, failed) counts
+    """
+    from routes.comments import insert_comments
+
+    # Inserted by a worker that died before recording it
+    stored = dict(db.session.execute(
+        select(Comment.ingest_ticket, Comment.id).where(Comment.ingest_ticket.in_([item.ticket for item in items]))
+    ).all())
+    created = {item: stored[item.ticket] for item in items if item.ticket in stored}
+    items_left = [item for item in items if item.ticket not in stored]
+
+    post_ids = set(db.session.scalars(
+        select(Post.id).where(Post.id.in_({item.fields['post_id'] for item in items_left}))
+    ))
+    accepted = [item for item in items_left if item.fields['post_id'] in post_ids]
+    failed = {item: 'Post not found' for item in items_left if item.fields['post_id'] not in post_ids}
+
+    try:
+        comment_ids = insert_comments([_row(item) for item in accepted])
+    except Exception:
+        db.session.rollback()
+        max_attempts = current_app.config['INGEST_MAX_ATTEMPTS']
+        if any(item.attempts >= max_attempts for item in accepted):
+            logger.exception('Batch of %d comments failed again, inserting them one by one', len(items))
+            return ingest_one_by_one(queue, accepted, created, failed, max_attempts)
+        queue.release(items)
+        raise
+
+    created.update(zip(accepted, comment_ids))
+    queue.complete(created, failed)
+    return len(created), len(failed)
+
+
+def _row(item):
+    """Comment row of a queued comment, tagged with its ticket."""
+    return dict(item.fields, ingest_ticket=item.ticket)
+
+
+def ingest_one_by_one(queue, items, created, failed, max_attempts):
+    """
+    Insert queued comments in a transaction each, so one that cannot be
+    inserted does not hold back the others.
+
+    Args:
+        queue: Queue the comments were claimed from
+        items: QueuedComment list
+        created: Dictionary of QueuedComment to comment id, already
+            created; the comments inserted are added
+        failed: Dictionary of QueuedComment to error message, already
+            failed; the comments failing on their `max_attempts`th attempt
+            are added, the others failing are released to be retried
+        max_attempts: Attempts after which a comment fails
+
+    Returns:
+        Tuple of (created, failed) counts
+    """
+    from routes.comments import insert_comments
+
+    retry = []
+    for item in items:
+        try:
+            (created[item],) = insert_comments([_row(item)])
+        except Exception as e:
+            db.session.rollback()
+            if item.attempts >= max_attempts:
+                logger.warning('Giving up on queued comment %s after %d attempts: %s', item.ticket, item.attempts, e)
+                failed[item] = str(e)
+            else:
+                retry.append(item)
+    queue.release(retry)
+    queue.complete(created, failed)
+    return len(created), len(failed)
+
+
+def run_worker(batch_size, max_wait, stop=None, idle_sleep=0.1, once=False):
+    """
+    Drain the comment queue of the current app.
+
+    Args:
+        batch_size: Most comments per transaction
+        max_wait: Seconds a comment may wait for its batch to fill
+        stop: threading.Event ending the loop (optional)
+        idle_sleep: Seconds to sleep while the queue is empty
+        once: Return as soon as the queue is empty (or a batch fails)
+
+    Returns:
+        Tuple of (created, failed) totals
+    """
+    queue = get_comment_queue()
+    totals = [0, 0]
+    while stop is None or not stop.is_set():
+        items = next_batch(queue, batch_size, max_wait)
+        if not items:
+            if once:
+                break
+            time.sleep(idle_sleep)
+            continue
+        try:
+            created, failed = ingest_batch(queue, items)
+        except Exception:
+            logger.exception('Failed to ingest a batch of %d comments', len(items))
+            if once:
+                break
+            time.sleep(idle_sleep)
+            continue
+        finally:
+            db.session.remove()
+        totals[0] += created
+        totals[1] += failed
+    return tuple(totals)
@@ -0,0 +1,305 @@
+"""
+Per-request instrumentation: SQL query counts and timing, cache hits and
+misses, and request latency.
+
+SQLAlchemy engine events and Flask request hooks collect a `RequestStats`
+for every request. The stats are reported three ways:
+
+- a `Server-Timing` response header (visible in browser dev tools)
+- one structured (JSON) log line per request on the `blogsite.requests`
+  logger, plus a warning when a request exceeds `N_PLUS_ONE_THRESHOLD`
+  queries
+- Prometheus text metrics at `/metrics` when `METRICS_ENABLED` is set
+
+Metrics are kept per process; with several worker processes each one
+reports its own counters.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger('blogsite.requests')
+
+# Histogram buckets for request latency, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Longest statement text included in log lines
+MAX_STATEMENT_LENGTH = 500
+
+
+class RequestStats:
+    """Counters collected while one request is handled."""
+
+    __slots__ = (
+        'started', 'queries', 'db_time', 'slowest_time', 'slowest_statement',
+        'cache_hits', 'cache_misses', 'statements'
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.statements = Counter()
+
+    def record_query(self, statement, duration):
+        self.queries += 1
+        self.db_time += duration
+        self.statements[statement] += 1
+        if duration > self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_statement = statement
+
+    def most_repeated(self):
+        """(statement, count) of the statement run most often."""
+        return self.statements.most_common(1)[0] if self.statements else (None, 0)
+
+
+def current_stats():
+    """Stats of the request being handled, or None outside a request."""
+    if has_request_context():
+        return g.get('request_stats')
+    return None
+
+
+def record_cache_access(hit):
+    """Count a response cache lookup against the current request."""
+    stats = current_stats()
+    if stats is not None:
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in labels
+    )
+    return '{' + pairs + '}'
+
+
+class Metrics:
+    """
+    Minimal in-process registry rendered in the Prometheus text format.
+
+    Supports counters, histograms and gauges read from a callback at
+    scrape time, all keyed by sorted label tuples.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._counters = {}
+        self._histograms = {}
+        self._buckets = {}
+        self._gauges = {}
+
+    def _declare(self, name, kind, help_text):
+        self._types.setdefault(name, kind)
+        self._help.setdefault(name, help_text)
+
+    def inc(self, name, help_text, value=1, **labels):
+        """Add `value` to a counter."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._declare(name, 'counter', help_text)
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, help_text, value, buckets=LATENCY_BUCKETS, **labels):
+        """Record `value` in a histogram."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._declare(name, 'histogram', help_text)
+            self._buckets.setdefault(name, buckets)
+            series = self._histograms.setdefault(name, {})
+            entry = series.get(key)
+            if entry is None:
+                entry = series[key] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(self._buckets[name]):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def gauge(self, name, help_text, callback):
+        """
+        Register a gauge read at scrape time.
+
+        Args:
+            name: Metric name
+            help_text: Description
+            callback: Returns a number, or a list of (labels dict, value)
+        """
+        with self._lock:
+            self._declare(name, 'gauge', help_text)
+            self._gauges[name] = callback
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {
+                name: {key: (list(entry[0]), entry[1], entry[2]) for key, entry in series.items()}
+                for name, series in self._histograms.items()
+            }
+            gauges = dict(self._gauges)
+            types = dict(self._types)
+            help_texts = dict(self._help)
+
+        for name in sorted(types):
+            lines.append(f'# HELP {name} {help_texts[name]}')
+            lines.append(f'# TYPE {name} {types[name]}')
+            if name in counters:
+                for key, value in sorted(counters[name].items()):
+                    lines.append(f'{name}{_format_labels(key)} {value}')
+            elif name in histograms:
+                buckets = self._buckets[name]
+                for key, (counts, total, count) in sorted(histograms[name].items()):
+                    for bound, bucket_count in zip(buckets, counts):
+                        lines.append(f'{name}_bucket{_format_labels(key + (("le", bound),))} {bucket_count}')
+                    lines.append(f'{name}_bucket{_format_labels(key + (("le", "+Inf"),))} {count}')
+                    lines.append(f'{name}_sum{_format_labels(key)} {total}')
+                    lines.append(f'{name}_count{_format_labels(key)} {count}')
+            elif name in gauges:
+                try:
+                    values = gauges[name]()
+                except Exception:
+                    logger.exception('Gauge %s failed', name)
+                    continue
+                if not isinstance(values, list):
+                    values = [({}, values)]
+                for labels, value in values:
+                    lines.append(f'{name}{_format_labels(tuple(sorted(labels.items())))} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def get_metrics(app=None):
+    """Metrics registry of the app (created on first use)."""
+    app = app or current_app
+    return app.extensions.setdefault('metrics', Metrics())
+
+
+def instrument_engine(engine):
+    """Time every statement executed on `engine` against the current request."""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_started'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('query_started', None)
+        stats = current_stats()
+        if stats is not None and started is not None:
+            stats.record_query(statement, time.perf_counter() - started)
+
+
+def _server_timing(stats, total):
+    parts = [
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"',
+        f'app;dur={total * 1000:.1f}',
+    ]
+    if stats.cache_hits or stats.cache_misses:
+        parts.append(f'cache;desc="{stats.cache_hits} hits {stats.cache_misses} misses"')
+    return ', '.join(parts)
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def init_instrumentation(app):
+    """Register the engine listeners, request hooks and `/metrics` route."""
+    if not app.config.get('INSTRUMENTATION_ENABLED', True):
+        return
+
+    with app.app_context():
+        from models import db
+        for engine in db.engines.values():
+            instrument_engine(engine)
+    router = app.extensions.get('replica_router')
+    if router is not None:
+        for replica in router.replicas:
+            instrument_engine(replica.engine)
+
+    metrics = get_metrics(app)
+
+    @app.before_request
+    def start_request_stats():
+        g.request_stats = RequestStats()
+
+    @app.after_request
+    def report_request_stats(response):
+        stats = g.get('request_stats')
+        if stats is None or request.path == '/metrics':
+            return response
+
+        total = time.perf_counter() - stats.started
+        if app.config['SERVER_TIMING_ENABLED']:
+            response.headers['Server-Timing'] = _server_timing(stats, total)
+
+        route = _route()
+        labels = {'method': request.method, 'route': route, 'status': response.status_code}
+        metrics.observe('http_request_duration_seconds', 'Request latency', total, **labels)
+        metrics.inc('db_queries_total', 'SQL statements executed', stats.queries, route=route)
+        metrics.inc('db_time_seconds_total', 'Time spent in SQL statements', stats.db_time, route=route)
+        if stats.cache_hits:
+            metrics.inc('cache_hits_total', 'Response cache hits', stats.cache_hits, route=route)
+        if stats.cache_misses:
+            metrics.inc('cache_misses_total', 'Response cache misses', stats.cache_misses, route=route)
+
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'route': route,
+            'status': response.status_code,
+            'duration_ms': round(total * 1000, 2),
+            'queries': stats.queries,
+            'db_ms': round(stats.db_time * 1000, 2),
+            'slowest_query_ms': round(stats.slowest_time * 1000, 2),
+            'slowest_query': (stats.slowest_statement or '')[:MAX_STATEMENT_LENGTH] or None,
+            'cache_hits': stats.cache_hits,
+            'cache_misses': stats.cache_misses,
+        }
+        logger.info(json.dumps(record))
+
+        threshold = app.config['N_PLUS_ONE_THRESHOLD']
+        if threshold and stats.queries > threshold:
+            statement, repeats = stats.most_repeated()
+            metrics.inc('n_plus_one_alerts_total', 'Requests over the query threshold', route=route)
+            logger.warning(json.dumps({
+                'alert': 'n_plus_one',
+                'method': request.method,
+                'path': request.path,
+                'route': route,
+                'queries': stats.queries,
+                'threshold': threshold,
+                'most_repeated_query': statement[:MAX_STATEMENT_LENGTH],
+                'repeats': repeats,
+            }))
+        return response
+
+    @app.teardown_request
+    def clear_request_stats(error=None):
+        g.pop('request_stats', None)
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        if not app.config['METRICS_ENABLED']:
+            return {'error': 'Resource not found'}, 404
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,278 @@
+"""
+In-process (L1) cache in front of the shared (L2) response cache.
+
+Even a Redis hit costs a network round trip and unpickling, on every
+request for the hottest keys. With `CACHE_L1_ENABLED`, caching.py looks
+keys up in a `LocalCache` first: a per-process LRU bounded by entry count
+(`CACHE_L1_MAX_ITEMS`) and approximate size (`CACHE_L1_MAX_BYTES`), whose
+entries expire after `CACHE_L1_TTL` seconds.
+
+Response keys embed write generations, so a cached response never goes
+stale; only generations do. `invalidate` drops the process's own L1
+generations at once and publishes them on Redis pub/sub
+(`CACHE_INVALIDATION_CHANNEL`), and a subscriber thread in every other
+process drops them on receipt. L1 generations also expire after
+`CACHE_L1_GENERATION_TTL` seconds, which bounds how long a process can
+miss a write if a message is lost.
+
+Values are shared by the requests of a process, not copied: treat what
+the cache returns as read-only.
+
+Lookups are counted per tier ('l1', 'l2') and reported on /metrics as
+`cache_tier_hits_total`, `cache_tier_misses_total` and
+`cache_tier_hit_ratio`.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from itertools import islice
+from flask import current_app
+from instrumentation import get_metrics
+
+logger = logging.getLogger(__name__)
+
+TIERS = ('l1', 'l2')
+
+# Serializes the creation of tiers, so a process never starts two subscribers
+_tier_lock = threading.Lock()
+
+
+# Items of a container looked at by `size_of`; the rest are assumed alike
+SIZE_SAMPLE = 8
+
+
+def size_of(value, depth=4):
+    """
+    Approximate memory cost of a value, cheap enough for every L2 hit.
+
+    Bytes and strings count their length. Containers count a sample of
+    their items (`SIZE_SAMPLE`, down to `depth` levels), scaled to their
+    length, as cached payloads are lists of similar rows; anything else
+    counts `sys.getsizeof`.
+    """
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if depth == 0 or not isinstance(value, (dict, list, tuple)) or not value:
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        sample = [size_of(k, depth - 1) + size_of(v, depth - 1) for k, v in islice(value.items(), SIZE_SAMPLE)]
+    else:
+        sample = [size_of(item, depth - 1) for item in islice(value, SIZE_SAMPLE)]
+    return sys.getsizeof(value) + sum(sample) * len(value) // len(sample)
+
+
+class LocalCache:
+    """
+    Thread-safe LRU cache with per-entry expiry, bounded by entry count and
+    total size.
+
+    Args:
+        max_items: Most entries kept
+        max_bytes: Most total size (see `size_of`) kept; larger values
+            are not cached at all
+    """
+
+    def __init__(self, max_items, max_bytes):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def get(self, key):
+        """Value of `key`, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl):
+        """Cache `value` under `key` for `ttl` seconds, evicting the least recently used entries."""
+        size = size_of(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (value, time.monotonic() + ttl, size)
+            self.bytes += size
+            while len(self._entries) > self.max_items or self.bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+
+class TierStats:
+    """Hits and misses of each cache tier."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = dict.fromkeys(TIERS, 0)
+        self.misses = dict.fromkeys(TIERS, 0)
+
+    def record(self, tier, hit):
+        with self._lock:
+            if hit:
+                self.hits[tier] += 1
+            else:
+                self.misses[tier] += 1
+
+    def hit_ratio(self, tier):
+        """Share of the tier's lookups that hit (0 before any lookup)."""
+        lookups = self.hits[tier] + self.misses[tier]
+        return self.hits[tier] / lookups if lookups else 0.0
+
+
+class InvalidationBus:
+    """
+    Broadcasts dropped keys to every process over Redis pub/sub.
+
+    Args:
+        client: redis.Redis client
+        channel: Pub/sub channel
+        local: LocalCache dropping the keys received
+        reconnect_delay: Seconds between subscription attempts
+    """
+
+    def __init__(self, client, channel, local, reconnect_delay=1.0):
+        self.client = client
+        self.channel = channel
+        self.local = local
+        self.reconnect_delay = reconnect_delay
+        # Tells this process's own messages apart, as it has applied them
+        self.origin = uuid.uuid4().hex
+        self._thread = None
+
+    def message(self, keys):
+        """Payload announcing that `keys` were dropped by this process."""
+        return json.dumps({'origin': self.origin, 'keys': list(keys)})
+
+    def publish(self, keys):
+        self.client.publish(self.channel, self.message(keys))
+
+    def handle(self, data):
+        """Apply a received payload."""
+        message = json.loads(data)
+        if message['origin'] != self.origin:
+            self.local.delete(*message['keys'])
+
+    def start(self):
+        """Subscribe from a daemon thread."""
+        self._thread = threading.Thread(target=self._listen, name='cache-invalidation', daemon=True)
+        self._thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Messages published while unsubscribed are lost
+                self.local.clear()
+                for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        self.handle(message['data'])
+            except Exception:
+                logger.exception('Cache invalidation channel lost, resubscribing')
+                time.sleep(self.reconnect_delay)
+
+
+class LocalTier:
+    """The L1 cache of a process, its tier statistics and its invalidation bus."""
+
+    def __init__(self, config, bus_client=None):
+        self.cache = LocalCache(config['CACHE_L1_MAX_ITEMS'], config['CACHE_L1_MAX_BYTES'])
+        self.ttl = config['CACHE_L1_TTL']
+        self.generation_ttl = config['CACHE_L1_GENERATION_TTL']
+        self.stats = TierStats()
+        self.pid = os.getpid()
+        self.bus = None
+        if bus_client is not None:
+            self.bus = InvalidationBus(bus_client, config['CACHE_INVALIDATION_CHANNEL'], self.cache)
+            self.bus.start()
+
+    def invalidated(self, keys):
+        """Drop `keys` here and in every other process."""
+        self.cache.delete(*keys)
+        if self.bus is not None:
+            try:
+                self.bus.publish(keys)
+            except Exception:
+                logger.exception('Cache invalidation channel unavailable while publishing')
+
+
+def _enabled(config):
+    # With caching off (NullCache) there is nothing to keep in front of
+    return config['CACHE_L1_ENABLED'] and config['CACHE_TYPE'] != 'NullCache'
+
+
+def get_local_tier(app=None):
+    """
+    Get the L1 tier of the app in this process.
+
+    Created on first use in each process, so worker processes forked from
+    a preloaded app each start their own subscriber.
+
+    Returns:
+        LocalTier, or None if `CACHE_L1_ENABLED` is off
+    """
+    app = app or current_app
+    if not _enabled(app.config):
+        return None
+    tier = app.extensions.get('local_cache')
+    if tier is None or tier.pid != os.getpid():
+        with _tier_lock:
+            tier = app.extensions.get('local_cache')
+            if tier is None or tier.pid != os.getpid():
+                client = None
+                if app.config['CACHE_TYPE'] == 'RedisCache':
+                    import redis
+                    client = redis.from_url(app.config['REDIS_URL'])
+                tier = LocalTier(app.config, client)
+                app.extensions['local_cache'] = tier
+    return tier
+
+
+def init_local_cache(app):
+    """Report the tier statistics on /metrics (if `CACHE_L1_ENABLED`)."""
+    if not _enabled(app.config):
+        return
+
+    def per_tier(read):
+        return lambda: [({'tier': tier}, read(get_local_tier(app).stats, tier)) for tier in TIERS]
+
+    metrics = get_metrics(app)
+    metrics.gauge('cache_tier_hits_total', 'Response cache hits per tier',
+                  per_tier(lambda stats, tier: stats.hits[tier]))
+    metrics.gauge('cache_tier_misses_total', 'Response cache misses per tier',
+                  per_tier(lambda stats, tier: stats.misses[tier]))
+    metrics.gauge('cache_tier_hit_ratio', 'Share of lookups that hit, per tier',
+                  per_tier(lambda stats, tier: stats.hit_ratio(tier)))
+    metrics.gauge('cache_l1_entries', 'Entries in the in-process cache', lambda: len(get_local_tier(app).cache))
+    metrics.gauge('cache_l1_bytes', 'Approximate size of the in-process cache', lambda: get_local_tier(app).cache.bytes)
@@ -0,0 +1,44 @@
+"""Add denormalized comment/rating aggregates to posts
+
+Revision ID: 8a4e6d2c51f3
+Revises: 3f1c2a9b7d10
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e6d2c51f3'
+down_revision = '3f1c2a9b7d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from the existing comments
+    op.execute("""
+        UPDATE posts SET
+            comment_count = (
+                SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id
+            ),
+            rating_sum = (
+                SELECT COALESCE(SUM(rating), 0) FROM comments WHERE comments.post_id = posts.id
+            ),
+            rating_count = (
+                SELECT COUNT(rating) FROM comments WHERE comments.post_id = posts.id
+            )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.drop_column('rating_count')
+        batch_op.drop_column('rating_sum')
+        batch_op.drop_column('comment_count')
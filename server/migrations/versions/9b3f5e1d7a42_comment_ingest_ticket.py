@@ -0,0 +1,28 @@
+"""Add the ingestion ticket of queued comments
+
+Revision ID: 9b3f5e1d7a42
+Revises: 5d0a7c3e9f28
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3f5e1d7a42'
+down_revision = '5d0a7c3e9f28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('comments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('ingest_ticket', sa.String(length=32), nullable=True))
+        batch_op.create_unique_constraint('uq_comments_ingest_ticket', ['ingest_ticket'])
+
+
+def downgrade():
+    with op.batch_alter_table('comments', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_comments_ingest_ticket', type_='unique')
+        batch_op.drop_column('ingest_ticket')
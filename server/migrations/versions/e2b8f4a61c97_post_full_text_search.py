@@ -0,0 +1,79 @@
+"""Add full-text search structures for posts
+
+PostgreSQL gets a generated tsvector column with a GIN index; SQLite gets
+an external-content FTS5 table maintained by triggers.
+
+Revision ID: e2b8f4a61c97
+Revises: c7d93e0a2b64
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b8f4a61c97'
+down_revision = 'c7d93e0a2b64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.execute("""
+            ALTER TABLE posts ADD COLUMN search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(author, '')), 'B') ||
+                setweight(to_tsvector('english', coalesce(content, '')), 'D')
+            ) STORED
+        """)
+        op.execute("CREATE INDEX ix_posts_search_vector ON posts USING GIN (search_vector)")
+
+    elif dialect == 'sqlite':
+        op.execute("""
+            CREATE VIRTUAL TABLE posts_fts USING fts5(
+                title, content, author,
+                content='posts', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+        op.execute("""
+            CREATE TRIGGER posts_fts_insert AFTER INSERT ON posts BEGIN
+                INSERT INTO posts_fts(rowid, title, content, author)
+                VALUES (new.id, new.title, new.content, new.author);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER posts_fts_delete AFTER DELETE ON posts BEGIN
+                INSERT INTO posts_fts(posts_fts, rowid, title, content, author)
+                VALUES ('delete', old.id, old.title, old.content, old.author);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER posts_fts_update AFTER UPDATE OF title, content, author ON posts BEGIN
+                INSERT INTO posts_fts(posts_fts, rowid, title, content, author)
+                VALUES ('delete', old.id, old.title, old.content, old.author);
+                INSERT INTO posts_fts(rowid, title, content, author)
+                VALUES (new.id, new.title, new.content, new.author);
+            END
+        """)
+        # Index the existing posts
+        op.execute("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_posts_search_vector")
+        op.execute("ALTER TABLE posts DROP COLUMN IF EXISTS search_vector")
+
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS posts_fts_update")
+        op.execute("DROP TRIGGER IF EXISTS posts_fts_delete")
+        op.execute("DROP TRIGGER IF EXISTS posts_fts_insert")
+        op.execute("DROP TABLE IF EXISTS posts_fts")
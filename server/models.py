@@ -3,11 +3,15 @@ Database models for the Blogsite application.
 Includes Post and Comment models with One-to-Many relationship.
 """
 
-from datetime import datetime, timezone
+from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import bindparam, func, update
+from database import RoutingSession
+from serializers import average_rating, comment_dict, post_dict
 
-# Create db instance here - will be used by both models and app
-db = SQLAlchemy()
+# Create db instance here - will be used by both models and app. The
+# routing session sends reads to replicas when they are configured.
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 class Post(db.Model):
@@ -21,9 +25,18 @@ class Post(db.Model):
         author: Author name (required, max 100 chars)
         created_at: Timestamp when post was created
         updated_at: Timestamp when post was last updated
+        comment_count: Number of comments (denormalized)
+        rating_sum: Sum of comment ratings (denormalized)
+        rating_count: Number of rated comments (denormalized)
         comments: Relationship to Comment model (One-to-Many)
     """
     __tablename__ = 'posts'
+    __table_args__ = (
+        # Serves keyset pagination on (created_at, id)
+        db.Index('ix_posts_created_at_id', 'created_at', 'id'),
+        # Serves incremental exports on (updated_at, id)
+        db.Index('ix_posts_updated_at_id', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     title = db.Column(db.String(200), nullable=False, index=True)
@@ -32,6 +45,12 @@ class Post(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
+    # Comment aggregates, maintained by the comment write handlers so that
+    # reads never have to count or join the comments table
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # Relationship: One Post has Many Comments
     comments = db.relationship(
         'Comment',
@@ -40,6 +59,90 @@ class Post(db.Model):
         lazy='dynamic'
     )
     
+    @staticmethod
+    def apply_comment_delta(post_id, comments=0, rating_sum=0, ratings=0):
+        """
+        Atomically adjust the denormalized comment aggregates of a post.
+        
+        The update runs in the current transaction, so it commits or rolls
+        back together with the comment write that caused it.
+        
+        Args:
+            post_id: ID of the post to update
+            comments: Change in number of comments
+            rating_sum: Change in the sum of ratings
+            ratings: Change in number of rated comments
+        """
+        Post.apply_comment_deltas({post_id: (comments, rating_sum, ratings)})
+    
+    @staticmethod
+    def apply_comment_deltas(deltas):
+        """
+        Adjust the comment aggregates of many posts in one executemany UPDATE.
+        
+        Args:
+            deltas: Dictionary mapping post_id to a
+                (comments, rating_sum, ratings) tuple of changes
+        """
+        statement = Post.comment_deltas_statement(deltas)
+        if statement is not None:
+            db.session.execute(*statement)
+    
+    @staticmethod
+    def comment_deltas_statement(deltas):
+        """
+        Build the executemany UPDATE behind `apply_comment_deltas`, for
+        sessions other than `db.session` (e.g. the async API's).
+        
+        Args:
+            deltas: Dictionary mapping post_id to a
+                (comments, rating_sum, ratings) tuple of changes
+        
+        Returns:
+            Tuple of (statement, parameter list), or None if nothing changes
+        """
+        params = [
+            {'_post_id': post_id, '_comments': delta[0], '_rating_sum': delta[1], '_ratings': delta[2]}
+            for post_id, delta in deltas.items()
+            if any(delta)
+        ]
+        if not params:
+            return None
+        
+        posts = Post.__table__
+        statement = (
+            update(posts)
+            .where(posts.c.id == bindparam('_post_id'))
+            .values(
+                comment_count=posts.c.comment_count + bindparam('_comments'),
+                rating_sum=posts.c.rating_sum + bindparam('_rating_sum'),
+                rating_count=posts.c.rating_count + bindparam('_ratings'),
+                # Keep updated_at: aggregates changing is not a post edit
+                updated_at=posts.c.updated_at
+            )
+        )
+        return statement, params
+    
+    @staticmethod
+    def comment_aggregates():
+        """
+        Build a subquery computing comment aggregates from the comments table.
+        
+        Returns:
+            Subquery with post_id, comment_count, rating_sum and rating_count
+        """
+        return db.session.query(
+            Comment.post_id.label('post_id'),
+            func.count(Comment.id).label('comment_count'),
+            func.coalesce(func.sum(Comment.rating), 0).label('rating_sum'),
+            func.count(Comment.rating).label('rating_count')
+        ).group_by(Comment.post_id).subquery()
+    
+    @property
+    def average_rating(self):
+        """Average comment rating rounded to 2 decimals, or None if unrated."""
+        return average_rating(self.rating_sum, self.rating_count)
+    
     def to_dict(self, include_comments=False):
         """
         Convert Post object to dictionary for JSON serialization.
@@ -50,20 +153,15 @@ class Post(db.Model):
         Returns:
             Dictionary representation of Post
         """
-        post_dict = {
-            'id': self.id,
-            'title': self.title,
-            'content': self.content,
-            'author': self.author,
-            'created_at': self.created_at.replace(tzinfo=timezone.utc).isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.replace(tzinfo=timezone.utc).isoformat() if self.updated_at else None,
-            'comment_count': self.comments.count()
-        }
+        data = post_dict((
+            self.id, self.title, self.content, self.author, self.created_at, self.updated_at,
+            self.comment_count, self.rating_sum, self.rating_count
+        ))
         
         if include_comments:
-            post_dict['comments'] = [comment.to_dict() for comment in self.comments.all()]
+            data['comments'] = [comment.to_dict() for comment in self.comments.all()]
         
-        return post_dict
+        return data
     
     def __repr__(self):
         return f"<Post(id={self.id}, title='{self.title}', author='{self.author}')>"
@@ -81,9 +179,19 @@ class Comment(db.Model):
         rating: Rating from 1-5 stars (optional)
         created_at: Timestamp when comment was created
         updated_at: Timestamp when comment was last updated
+        ingest_ticket: Ticket of a comment created from the ingestion
+            queue (see ingest.py), so it is never inserted twice
         post: Relationship to Post model (Many-to-One)
     """
     __tablename__ = 'comments'
+    __table_args__ = (
+        # Serve keyset pagination, globally and per post
+        db.Index('ix_comments_created_at_id', 'created_at', 'id'),
+        db.Index('ix_comments_post_id_created_at_id', 'post_id', 'created_at', 'id'),
+        # Serves incremental exports on (updated_at, id)
+        db.Index('ix_comments_updated_at_id', 'updated_at', 'id'),
+        db.UniqueConstraint('ingest_ticket', name='uq_comments_ingest_ticket'),
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), nullable=False, index=True)
@@ -92,10 +200,22 @@ class Comment(db.Model):
     rating = db.Column(db.Integer, nullable=True)  # 1-5 stars, optional
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    ingest_ticket = db.Column(db.String(32), nullable=True)
     
     # Relationship: Many Comments belong to One Post
     post = db.relationship('Post', back_populates='comments')
     
+    @staticmethod
+    def rating_delta(old_rating, new_rating):
+        """
+        Change in a post's (rating_sum, rating_count) when a comment's
+        rating goes from `old_rating` to `new_rating` (either may be None).
+        """
+        return (
+            (new_rating or 0) - (old_rating or 0),
+            (new_rating is not None) - (old_rating is not None)
+        )
+    
     def to_dict(self, include_post=False):
         """
         Convert Comment object to dictionary for JSON serialization.
@@ -106,24 +226,30 @@ class Comment(db.Model):
         Returns:
             Dictionary representation of Comment
         """
-        comment_dict = {
-            'id': self.id,
-            'post_id': self.post_id,
-            'author': self.author,
-            'content': self.content,
-            'rating': self.rating,
-            'created_at': self.created_at.replace(tzinfo=timezone.utc).isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.replace(tzinfo=timezone.utc).isoformat() if self.updated_at else None
-        }
+        data = comment_dict((
+            self.id, self.post_id, self.author, self.content, self.rating, self.created_at, self.updated_at
+        ))
         
         if include_post:
-            comment_dict['post'] = {
+            data['post'] = {
                 'id': self.post.id,
                 'title': self.post.title,
                 'author': self.post.author
             }
         
-        return comment_dict
+        return data
     
     def __repr__(self):
         return f"<Comment(id={self.id}, post_id={self.post_id}, author='{self.author}', rating={self.rating})>"
+
+
+# Columns selected by list endpoints, in the order `post_dict` and
+# `comment_dict` (serializers.py) expect them
+POST_COLUMNS = (
+    Post.id, Post.title, Post.content, Post.author, Post.created_at, Post.updated_at,
+    Post.comment_count, Post.rating_sum, Post.rating_count
+)
+COMMENT_COLUMNS = (
+    Comment.id, Comment.post_id, Comment.author, Comment.content, Comment.rating,
+    Comment.created_at, Comment.updated_at
+)
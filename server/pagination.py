@@ -0,0 +1,240 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Pages are ordered newest first on ``(created_at, id)`` and addressed by an
+opaque cursor token instead of an OFFSET, so deep pages cost the same as
+the first one. Tokens are signed with the app's SECRET_KEY so clients
+cannot forge positions.
+
+`keyset_window` and `keyset_page` work on ORM queries and 2.0-style
+`select()` statements alike, so the async API (async_api.py) pages the
+same way; it passes the secret explicitly as it runs outside Flask.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import tuple_
+
+# Cursor directions
+NEXT = 'n'
+PREV = 'p'
+
+_SIGNATURE_BYTES = 16
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor token is malformed or has been tampered with."""
+
+
+class Cursor:
+    """Decoded position in a keyset-paginated listing."""
+
+    __slots__ = ('created_at', 'id', 'direction')
+
+    def __init__(self, created_at, id, direction=NEXT):
+        self.created_at = created_at
+        self.id = id
+        self.direction = direction
+
+    def key(self):
+        """Stable representation used in cache keys."""
+        return (self.created_at.isoformat(), self.id, self.direction)
+
+
+def _sign(payload, secret=None):
+    if secret is None:
+        secret = current_app.config['SECRET_KEY']
+    return hmac.new(secret.encode('utf-8'), payload, hashlib.sha256).digest()[:_SIGNATURE_BYTES]
+
+
+def encode_cursor(created_at, row_id, direction=NEXT, secret=None):
+    """
+    Encode a position as an opaque, signed cursor token.
+
+    Args:
+        created_at: created_at of the boundary row
+        row_id: id of the boundary row
+        direction: NEXT for rows after the boundary, PREV for rows before it
+        secret: Signing key (default: the current app's SECRET_KEY)
+
+    Returns:
+        URL-safe token string
+    """
+    payload = json.dumps(
+        [created_at.isoformat(), row_id, direction], separators=(',', ':')
+    ).encode('utf-8')
+    token = base64.urlsafe_b64encode(payload + _sign(payload, secret))
+    return token.decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, secret=None):
+    """
+    Decode and verify a cursor token.
+
+    Args:
+        token: Token from a previous response; an empty token means the
+            first page
+        secret: Signing key (default: the current app's SECRET_KEY)
+
+    Returns:
+        Cursor, or None for the first page
+
+    Raises:
+        InvalidCursor: If the token is malformed or its signature is wrong
+    """
+    if not token:
+        return None
+
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+
+    payload, signature = raw[:-_SIGNATURE_BYTES], raw[-_SIGNATURE_BYTES:]
+    if not payload or not hmac.compare_digest(signature, _sign(payload, secret)):
+        raise InvalidCursor('Invalid cursor')
+
+    try:
+        created_at, row_id, direction = json.loads(payload)
+        if direction not in (NEXT, PREV) or not isinstance(row_id, int):
+            raise ValueError(direction)
+        return Cursor(datetime.fromisoformat(created_at), row_id, direction)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def parse_cursor_args(args, secret=None):
+    """
+    Read the keyset pagination query parameters.
+
+    Keyset mode is opt-in: it is enabled by the presence of `cursor`
+    (empty for the first page). `include_total=true` adds a total count.
+
+    Args:
+        args: Request query arguments
+        secret: Signing key (default: the current app's SECRET_KEY)
+
+    Returns:
+        Tuple of (enabled, cursor, include_total)
+
+    Raises:
+        InvalidCursor: If the cursor token is invalid
+    """
+    token = args.get('cursor')
+    include_total = args.get('include_total', '').lower() in ('1', 'true', 'yes')
+    return token is not None, decode_cursor(token, secret), include_total
+
+
+class KeysetPage:
+    """
+    One page of a keyset-paginated query.
+
+    Attributes:
+        items: Rows on this page, newest first
+        has_next: Whether older rows exist
+        has_prev: Whether newer rows exist
+        total: Total row count, or None when it was not requested
+    """
+
+    def __init__(self, items, has_next, has_prev, total=None):
+        self.items = items
+        self.has_next = has_next
+        self.has_prev = has_prev
+        self.total = total
+
+    def pagination_dict(self, per_page, secret=None):
+        """Pagination metadata for the JSON response."""
+        first, last = (self.items[0], self.items[-1]) if self.items else (None, None)
+        pagination = {
+            'per_page': per_page,
+            'next_cursor': encode_cursor(last.created_at, last.id, NEXT, secret) if self.has_next and last else None,
+            'prev_cursor': encode_cursor(first.created_at, first.id, PREV, secret) if self.has_prev and first else None,
+            'has_next': self.has_next,
+            'has_prev': self.has_prev
+        }
+        if self.total is not None:
+            pagination['total'] = self.total
+        return pagination
+
+
+def keyset_window(query, model, cursor, per_page):
+    """
+    Restrict `query` to the rows of one page, plus one to detect the next.
+
+    Args:
+        query: Unordered Query or select() over `model`
+        model: Mapped class with `created_at` and `id` columns
+        cursor: Decoded Cursor, or None for the first page
+        per_page: Page size
+
+    Returns:
+        Filtered, ordered and limited query of the same kind
+    """
+    position = tuple_(model.created_at, model.id)
+
+    if cursor is None or cursor.direction == NEXT:
+        if cursor is not None:
+            query = query.filter(position < tuple_(cursor.created_at, cursor.id))
+        return query.order_by(model.created_at.desc(), model.id.desc()).limit(per_page + 1)
+
+    # Walking backwards: read ascending from the cursor, flipped by keyset_page
+    return query.filter(
+        position > tuple_(cursor.created_at, cursor.id)
+    ).order_by(
+        model.created_at.asc(), model.id.asc()
+    ).limit(per_page + 1)
+
+
+def keyset_page(rows, cursor, per_page, total=None):
+    """
+    Build the KeysetPage from the rows fetched with `keyset_window`.
+
+    Args:
+        rows: Rows in the order `keyset_window` returned them
+        cursor: Cursor the window was built with
+        per_page: Page size
+        total: Total row count, if it was requested
+
+    Returns:
+        KeysetPage
+    """
+    if cursor is None or cursor.direction == NEXT:
+        return KeysetPage(
+            rows[:per_page],
+            has_next=len(rows) > per_page,
+            has_prev=cursor is not None,
+            total=total
+        )
+
+    return KeysetPage(
+        list(reversed(rows[:per_page])),
+        has_next=True,
+        has_prev=len(rows) > per_page,
+        total=total
+    )
+
+
+def keyset_paginate(query, model, cursor, per_page, include_total=False):
+    """
+    Fetch one page of `query` ordered by (created_at, id) descending.
+
+    Fetches one extra row to detect whether another page exists, so no
+    COUNT(*) is needed unless `include_total` is set.
+
+    Args:
+        query: Unordered query over `model`
+        model: Mapped class with `created_at` and `id` columns
+        cursor: Decoded Cursor, or None for the first page
+        per_page: Page size
+        include_total: Also count all rows matching `query`
+
+    Returns:
+        KeysetPage
+    """
+    total = query.order_by(None).count() if include_total else None
+    rows = keyset_window(query, model, cursor, per_page).all()
+    return keyset_page(rows, cursor, per_page, total)
@@ -0,0 +1,77 @@
+"""
+Column projection for post listings.
+
+A listing only selects the columns of the fields it returns (see
+`parse_post_fields` in serializers.py). The default 'summary' field set
+replaces the full `content` with an `excerpt` computed by the database
+(`substr`), so neither the database nor the response carries the full
+text of long posts.
+"""
+
+from operator import attrgetter
+from sqlalchemy import func
+from models import Post, POST_COLUMNS
+from serializers import POST_FIELD_SETS, average_rating, excerpt, iso_utc, post_dict
+
+# Always selected: keyset cursors are built from them
+_CURSOR_COLUMNS = (Post.id, Post.created_at)
+
+_TIMESTAMP_FIELDS = ('created_at', 'updated_at')
+
+
+class PostProjection:
+    """
+    Columns to select for a set of post fields, and the conversion of the
+    resulting rows to JSON dictionaries.
+
+    Args:
+        fields: Field names from `parse_post_fields`
+        excerpt_length: Characters kept in `excerpt`
+
+    Attributes:
+        columns: Columns and expressions to select
+    """
+
+    def __init__(self, fields, excerpt_length):
+        self.fields = fields
+        self.excerpt_length = excerpt_length
+
+        if fields == POST_FIELD_SETS['full']:
+            # The common full projection has a dedicated tuple converter
+            self.columns = POST_COLUMNS
+            self.to_dict = post_dict
+            return
+
+        columns = list(_CURSOR_COLUMNS)
+        for field in fields:
+            if field == 'excerpt':
+                # One extra character tells `excerpt` whether the text was cut
+                columns.append(func.substr(Post.content, 1, excerpt_length + 1).label('excerpt'))
+            elif field == 'average_rating':
+                columns.extend((Post.rating_sum, Post.rating_count))
+            elif field not in ('id', 'created_at'):
+                columns.append(getattr(Post, field))
+        self.columns = tuple(columns)
+        self._converters = [(field, self._converter(field)) for field in fields]
+
+    def _converter(self, field):
+        if field == 'excerpt':
+            length = self.excerpt_length
+            return lambda row: excerpt(row.excerpt, length)
+        if field == 'average_rating':
+            return lambda row: average_rating(row.rating_sum, row.rating_count)
+        get = attrgetter(field)
+        if field in _TIMESTAMP_FIELDS:
+            return lambda row: iso_utc(get(row))
+        return get
+
+    def to_dict(self, row):
+        """JSON dictionary of a row selected with `columns`."""
+        return {field: convert(row) for field, convert in self._converters}
+
+    def cache_params(self):
+        """Parameters distinguishing this projection in cache keys."""
+        return {
+            'fields': ','.join(self.fields),
+            'excerpt_length': self.excerpt_length if 'excerpt' in self.fields else 0
+        }
@@ -0,0 +1,347 @@
+"""
+Post rankings ("trending" and "top rated") kept in sorted sets.
+
+Each ranking maps post ids to scores in a sorted set, so a page of it is a
+range read (O(log n + page size)) and the database is only asked for the
+posts on that page. The comment write handlers keep the sets up to date
+incrementally; `rebuild` recomputes them from the database to correct any
+drift (run `flask rebuild-rankings` periodically, e.g. hourly). A ranking
+that was never built is built by the first request for it; requests
+arriving meanwhile are answered 503 rather than start a build of their own.
+
+- trending: comment activity with exponential time decay. A comment
+  written at time t adds 2 ** ((t - epoch) / half_life) to its post's
+  score. Every score shrinks by the same factor as time passes, so instead
+  of decaying all of them, new comments are weighted up; the order is the
+  same. `rebuild` counts the comments of the last `TRENDING_WINDOW_HOURS`
+  and moves the epoch to the present, keeping the weights finite.
+- top_rated: Bayesian average rating, which pulls posts with few ratings
+  towards `TOP_RATED_PRIOR_MEAN`, from the denormalized rating aggregates
+  of posts. Unrated posts are left out.
+
+Rankings live in Redis sorted sets (shared by all processes) or, with
+`RANKINGS_BACKEND = 'memory'`, in per-process structures meant for tests
+and single-process deployments. Like the response cache, a ranking error
+never fails a write.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import select
+from models import db, Comment, Post
+from singleflight import RELEASE_SCRIPT
+
+logger = logging.getLogger(__name__)
+
+TRENDING = 'trending'
+TOP_RATED = 'top_rated'
+
+
+class RankingNotReady(Exception):
+    """The ranking is being built by another request."""
+
+
+def _timestamp(value):
+    """Seconds since the epoch of a naive UTC datetime."""
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class MemoryRankingStore:
+    """
+    In-process sorted sets: a score per member plus a list of
+    (-score, member) pairs kept sorted with bisect.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._scores = {}
+        self._order = {}
+        self._epochs = {}
+
+    def _set(self, name, member, score):
+        scores = self._scores.setdefault(name, {})
+        order = self._order.setdefault(name, [])
+        old = scores.get(member)
+        if old is not None:
+            del order[bisect_left(order, (-old, member))]
+        if score is None:
+            scores.pop(member, None)
+        else:
+            scores[member] = score
+            insort(order, (-score, member))
+
+    def increment(self, name, deltas):
+        with self._lock:
+            for member, delta in deltas.items():
+                self._set(name, member, self._scores.get(name, {}).get(member, 0) + delta)
+
+    def set_scores(self, name, scores):
+        with self._lock:
+            for member, score in scores.items():
+                self._set(name, member, score)
+
+    def remove(self, name, members):
+        with self._lock:
+            for member in members:
+                self._set(name, member, None)
+
+    def range(self, name, start, count):
+        with self._lock:
+            return [member for _, member in self._order.get(name, [])[start:start + count]]
+
+    def size(self, name):
+        return len(self._scores.get(name, {}))
+
+    def epoch(self, name):
+        return self._epochs.get(name)
+
+    def replace(self, name, scores, epoch):
+        order = sorted((-score, member) for member, score in scores.items())
+        with self._lock:
+            self._scores[name] = dict(scores)
+            self._order[name] = order
+            self._epochs[name] = epoch
+
+    def acquire_build_lock(self, ttl):
+        """Take the lock on building the rankings without waiting; returns a token, or None if it is held."""
+        return True if self._build_lock.acquire(blocking=False) else None
+
+    def release_build_lock(self, token):
+        self._build_lock.release()
+
+
+class RedisRankingStore:
+    """
+    Redis sorted sets under `prefix`; each ranking has a `<name>:epoch`
+    key next to its set, which also marks the ranking as built.
+
+    Args:
+        client: redis.Redis client
+        prefix: Key prefix
+    """
+
+    def __init__(self, client, prefix='rankings:'):
+        self.client = client
+        self.prefix = prefix
+        self._release = client.register_script(RELEASE_SCRIPT)
+
+    def _key(self, name):
+        return self.prefix + name
+
+    def increment(self, name, deltas):
+        pipe = self.client.pipeline(transaction=False)
+        for member, delta in deltas.items():
+            pipe.zincrby(self._key(name), delta, member)
+        pipe.execute()
+
+    def set_scores(self, name, scores):
+        if scores:
+            self.client.zadd(self._key(name), scores)
+
+    def remove(self, name, members):
+        if members:
+            self.client.zrem(self._key(name), *members)
+
+    def range(self, name, start, count):
+        return [int(member) for member in self.client.zrevrange(self._key(name), start, start + count - 1)]
+
+    def size(self, name):
+        return self.client.zcard(self._key(name))
+
+    def epoch(self, name):
+        value = self.client.get(self._key(name) + ':epoch')
+        return float(value) if value is not None else None
+
+    def replace(self, name, scores, epoch):
+        # Built under a temporary key and renamed, so readers never see a
+        # partial ranking. The key is unique to this rebuild, so concurrent
+        # rebuilds never add to each other's sets, and expires in case the
+        # rebuild dies before the rename.
+        key = self._key(name)
+        staging = f'{key}:rebuild:{uuid.uuid4().hex}'
+        pipe = self.client.pipeline(transaction=False)
+        items = list(scores.items())
+        for start in range(0, len(items), 1000):
+            pipe.zadd(staging, dict(items[start:start + 1000]))
+        pipe.expire(staging, 3600)
+        pipe.execute()
+
+        pipe = self.client.pipeline(transaction=True)
+        if items:
+            pipe.rename(staging, key)
+            pipe.persist(key)
+        else:
+            pipe.delete(key)
+        pipe.set(key + ':epoch', repr(epoch))
+        pipe.execute()
+
+    def acquire_build_lock(self, ttl):
+        """Take the lock on building the rankings without waiting (see MemoryRankingStore)."""
+        token = uuid.uuid4().hex
+        if self.client.set(self.prefix + 'build-lock', token, nx=True, px=int(ttl * 1000)):
+            return token
+        return None
+
+    def release_build_lock(self, token):
+        self._release(keys=[self.prefix + 'build-lock'], args=[token])
+
+
+class Rankings:
+    """
+    The trending and top-rated rankings of posts.
+
+    Args:
+        store: MemoryRankingStore or RedisRankingStore
+        config: App config (`TRENDING_*` and `TOP_RATED_*` settings)
+    """
+
+    def __init__(self, store, config):
+        self.store = store
+        self.half_life = config['TRENDING_HALF_LIFE_HOURS'] * 3600
+        self.window = timedelta(hours=config['TRENDING_WINDOW_HOURS'])
+        self.prior_mean = config['TOP_RATED_PRIOR_MEAN']
+        self.prior_weight = config['TOP_RATED_PRIOR_WEIGHT']
+        self.build_lock_timeout = config['RANKINGS_BUILD_LOCK_TIMEOUT']
+
+    def comment_weight(self, created_at, epoch):
+        """Trending score added by a comment written at `created_at` (seconds)."""
+        return 2 ** ((created_at - epoch) / self.half_life)
+
+    def rating_score(self, rating_sum, rating_count):
+        """Top-rated score of a post, or None if it has no ratings."""
+        if not rating_count:
+            return None
+        return (self.prior_mean * self.prior_weight + rating_sum) / (self.prior_weight + rating_count)
+
+    def page(self, name, page, per_page):
+        """
+        Get a page of a ranking, building it first if needed.
+
+        Only one request (across processes, with Redis) builds a missing
+        ranking; while it does, the others raise RankingNotReady.
+
+        Args:
+            name: TRENDING or TOP_RATED
+            page: Page number (from 1)
+            per_page: Posts per page
+
+        Returns:
+            Tuple of (post ids in rank order, number of ranked posts)
+        """
+        if self.store.epoch(name) is None:
+            token = self.store.acquire_build_lock(self.build_lock_timeout)
+            if token is None:
+                raise RankingNotReady()
+            try:
+                # Another request may have built it before we took the lock
+                if self.store.epoch(name) is None:
+                    self.rebuild()
+            finally:
+                self.store.release_build_lock(token)
+        return self.store.range(name, (page - 1) * per_page, per_page), self.store.size(name)
+
+    def comments_changed(self, added=(), removed=(), rated=()):
+        """
+        Apply comment writes to the rankings.
+
+        Args:
+            added: (post_id, created_at) pairs of new comments; created_at
+                is a naive UTC datetime, or None for now
+            removed: (post_id, created_at) pairs of deleted comments
+            rated: Ids of posts whose rating aggregates changed
+        """
+        try:
+            epoch = self.store.epoch(TRENDING)
+            if epoch is not None and (added or removed):
+                deltas = {}
+                now = time.time()
+                # Comments from before the window of the last rebuild were
+                # never counted, so deleting them takes nothing away
+                counted_since = epoch - self.window.total_seconds()
+                for sign, comments in ((1, added), (-1, removed)):
+                    for post_id, created_at in comments:
+                        moment = _timestamp(created_at) if created_at else now
+                        if sign < 0 and moment < counted_since:
+                            continue
+                        deltas[post_id] = deltas.get(post_id, 0) + sign * self.comment_weight(moment, epoch)
+                if deltas:
+                    self.store.increment(TRENDING, deltas)
+
+            if rated and self.store.epoch(TOP_RATED) is not None:
+                self._rescore(set(rated))
+        except Exception:
+            logger.exception('Rankings unavailable while applying comment writes')
+
+    def _rescore(self, post_ids):
+        rows = db.session.execute(
+            select(Post.id, Post.rating_sum, Post.rating_count).where(Post.id.in_(post_ids))
+        )
+        scores = {}
+        for post_id, rating_sum, rating_count in rows:
+            scores[post_id] = self.rating_score(rating_sum, rating_count)
+        self.store.set_scores(TOP_RATED, {post_id: score for post_id, score in scores.items() if score is not None})
+        self.store.remove(TOP_RATED, [post_id for post_id in post_ids if scores.get(post_id) is None])
+
+    def posts_deleted(self, post_ids):
+        """Drop deleted posts from every ranking."""
+        try:
+            for name in (TRENDING, TOP_RATED):
+                self.store.remove(name, list(post_ids))
+        except Exception:
+            logger.exception('Rankings unavailable while removing posts')
+
+    def rebuild(self):
+        """
+        Recompute both rankings from the database.
+
+        Returns:
+            Dictionary of ranking name to number of ranked posts
+        """
+        now = datetime.utcnow()
+        epoch = _timestamp(now)
+        trending = {}
+        rows = db.session.execute(
+            select(Comment.post_id, Comment.created_at)
+            .where(Comment.created_at >= now - self.window)
+            .execution_options(yield_per=10000)
+        )
+        for post_id, created_at in rows:
+            trending[post_id] = trending.get(post_id, 0) + self.comment_weight(_timestamp(created_at), epoch)
+        self.store.replace(TRENDING, trending, epoch)
+
+        top_rated = {
+            post_id: self.rating_score(rating_sum, rating_count)
+            for post_id, rating_sum, rating_count in db.session.execute(
+                select(Post.id, Post.rating_sum, Post.rating_count).where(Post.rating_count > 0)
+            )
+        }
+        self.store.replace(TOP_RATED, top_rated, epoch)
+        return {TRENDING: len(trending), TOP_RATED: len(top_rated)}
+
+
+def get_rankings():
+    """
+    Get the rankings of the current app.
+
+    Returns:
+        Rankings instance, created once per app
+    """
+    rankings = current_app.extensions.get('rankings')
+    if rankings is None:
+        name = current_app.config['RANKINGS_BACKEND']
+        if name == 'auto':
+            name = 'redis' if current_app.config['CACHE_TYPE'] == 'RedisCache' else 'memory'
+        if name == 'redis':
+            import redis
+            store = RedisRankingStore(redis.from_url(current_app.config['REDIS_URL']))
+        else:
+            store = MemoryRankingStore()
+        rankings = Rankings(store, current_app.config)
+        current_app.extensions['rankings'] = rankings
+    return rankings
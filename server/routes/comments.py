@@ -3,13 +3,83 @@ API routes for Comment operations.
 Handles CRUD operations, ratings, and caching.
 """
 
-from flask import Blueprint, request, jsonify
-from sqlalchemy import and_
-from models import db, Comment, Post
+from flask import Blueprint, request, jsonify, current_app, url_for
+from sqlalchemy import and_, delete, insert, select
+from models import db, Comment, Post, COMMENT_COLUMNS
+from serializers import comment_dict
+from pagination import InvalidCursor, parse_cursor_args, keyset_paginate
+from validation import ValidationError, validate_id, validate_new_comment, validate_comment_changes
+from batch import BatchResults, existing_ids, read_batch, update_many
+from caching import (
+    POSTS_SCOPE, COMMENTS_SCOPE, post_scope, cache_key, read_through,
+    invalidate, invalidate_post_comments
+)
+from conditional import check_not_modified, with_validators
+from compression import cached_compressed
+from rankings import get_rankings
+from ingest import PENDING, QueueFull, get_comment_queue
 
 comments_bp = Blueprint('comments', __name__)
 
 
+def _comment_ratings(comment_ids):
+    """
+    Map comment id to (post_id, rating, created_at) for existing comments,
+    in one query.
+    """
+    if not comment_ids:
+        return {}
+    rows = db.session.execute(
+        select(Comment.id, Comment.post_id, Comment.rating, Comment.created_at)
+        .where(Comment.id.in_(set(comment_ids)))
+    )
+    return {comment_id: (post_id, rating, created_at) for comment_id, post_id, rating, created_at in rows}
+
+
+def _rated_posts(deltas):
+    """Ids of the posts whose rating aggregates change with `deltas`."""
+    return [post_id for post_id, (_, rating_sum, ratings) in deltas.items() if rating_sum or ratings]
+
+
+def invalidate_posts_comments(post_ids):
+    """Invalidate cached data affected by comment writes on many posts."""
+    invalidate(POSTS_SCOPE, COMMENTS_SCOPE, *(post_scope(post_id) for post_id in post_ids))
+
+
+def insert_comments(rows):
+    """
+    Insert comments on existing posts with one INSERT and commit them with
+    the posts' aggregates, in one transaction.
+    
+    Args:
+        rows: Validated comment fields (from `validate_new_comment`)
+    
+    Returns:
+        List of the new comment ids, in the order of `rows`
+    """
+    if not rows:
+        return []
+    
+    comment_ids = db.session.scalars(
+        insert(Comment).returning(Comment.id, sort_by_parameter_order=True), rows
+    ).all()
+    
+    deltas = {}
+    for fields in rows:
+        count, rating_sum, ratings = deltas.get(fields['post_id'], (0, 0, 0))
+        rating_delta = Comment.rating_delta(None, fields['rating'])
+        deltas[fields['post_id']] = (count + 1, rating_sum + rating_delta[0], ratings + rating_delta[1])
+    Post.apply_comment_deltas(deltas)
+    db.session.commit()
+    
+    invalidate_posts_comments(deltas)
+    get_rankings().comments_changed(
+        added=[(fields['post_id'], None) for fields in rows],
+        rated=_rated_posts(deltas)
+    )
+    return comment_ids
+
+
 @comments_bp.route('', methods=['GET'])
 def get_all_comments():
     """
@@ -19,6 +89,8 @@ def get_all_comments():
         - post_id: Filter comments by post (optional)
         - page: Page number (default: 1)
         - per_page: Comments per page (default: 20)
+        - cursor: Opt-in keyset pagination (see GET /api/posts)
+        - include_total: Include the total count in cursor mode (default: false)
     
     Returns:
         JSON with comments list and pagination info
@@ -34,37 +106,70 @@ def get_all_comments():
         if per_page < 1 or per_page > 100:
             per_page = 20
         
-        # Build query
-        query = Comment.query
+        try:
+            cursor_mode, cursor, include_total = parse_cursor_args(request.args)
+        except InvalidCursor as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        def build_page():
+            # Build query; plain rows serialize faster than ORM instances
+            query = db.session.query(*COMMENT_COLUMNS)
+            
+            # Filter by post_id if provided
+            if post_id:
+                # Verify post exists
+                post = Post.query.get(post_id)
+                if not post:
+                    return None
+                query = query.filter(Comment.post_id == post_id)
+            
+            if cursor_mode:
+                result = keyset_paginate(query, Comment, cursor, per_page, include_total)
+                return {
+                    'success': True,
+                    'data': [comment_dict(row) for row in result.items],
+                    'pagination': result.pagination_dict(per_page)
+                }
+            
+            # Order by created_at descending (newest first)
+            query = query.order_by(Comment.created_at.desc())
+            
+            # Paginate
+            pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+            
+            return {
+                'success': True,
+                'data': [comment_dict(row) for row in pagination.items],
+                'pagination': {
+                    'page': page,
+                    'per_page': per_page,
+                    'total': pagination.total,
+                    'pages': pagination.pages,
+                    'has_next': pagination.has_next,
+                    'has_prev': pagination.has_prev
+                }
+            }
         
-        # Filter by post_id if provided
-        if post_id:
-            # Verify post exists
-            post = Post.query.get(post_id)
-            if not post:
-                return jsonify({'success': False, 'error': 'Post not found'}), 404
-            query = query.filter(Comment.post_id == post_id)
+        key = cache_key(
+            'comments:list', [COMMENTS_SCOPE],
+            page=page, per_page=per_page, post_id=post_id,
+            cursor=cursor.key() if cursor else cursor_mode,
+            include_total=include_total
+        )
+        validators, not_modified = check_not_modified(key)
+        if not_modified:
+            return not_modified
         
-        # Order by created_at descending (newest first)
-        query = query.order_by(Comment.created_at.desc())
+        compressed = cached_compressed(key, current_app.config['CACHE_COMMENTS_TIMEOUT'])
+        if compressed:
+            return with_validators(compressed, validators), 200
         
-        # Paginate
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        payload = read_through(key, current_app.config['CACHE_COMMENTS_TIMEOUT'], build_page)
         
-        comments = [comment.to_dict() for comment in pagination.items]
+        if payload is None:
+            return jsonify({'success': False, 'error': 'Post not found'}), 404
         
-        return jsonify({
-            'success': True,
-            'data': comments,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
-        }), 200
+        return with_validators(jsonify(payload), validators), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -80,16 +185,13 @@ def get_comments_for_post(post_id):
     Query Parameters:
         - page: Page number (default: 1)
         - per_page: Comments per page (default: 20)
+        - cursor: Opt-in keyset pagination (see GET /api/posts)
+        - include_total: Include the total count in cursor mode (default: false)
     
     Returns:
         JSON with comments for the post
     """
     try:
-        # Verify post exists
-        post = Post.query.get(post_id)
-        if not post:
-            return jsonify({'success': False, 'error': 'Post not found'}), 404
-        
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         
@@ -99,31 +201,87 @@ def get_comments_for_post(post_id):
         if per_page < 1 or per_page > 100:
             per_page = 20
         
-        # Get comments for post
-        pagination = Comment.query.filter(
-            Comment.post_id == post_id
-        ).order_by(Comment.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
+        try:
+            cursor_mode, cursor, include_total = parse_cursor_args(request.args)
+        except InvalidCursor as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        def build_page():
+            # Verify post exists
+            post = Post.query.get(post_id)
+            if not post:
+                return None
+            
+            query = db.session.query(*COMMENT_COLUMNS).filter(Comment.post_id == post_id)
+            
+            if cursor_mode:
+                result = keyset_paginate(query, Comment, cursor, per_page, include_total)
+                return {
+                    'success': True,
+                    'data': [comment_dict(row) for row in result.items],
+                    'pagination': result.pagination_dict(per_page)
+                }
+            
+            # Get comments for post
+            pagination = query.order_by(Comment.created_at.desc()).paginate(
+                page=page, per_page=per_page, error_out=False
+            )
+            
+            return {
+                'success': True,
+                'data': [comment_dict(row) for row in pagination.items],
+                'pagination': {
+                    'page': page,
+                    'per_page': per_page,
+                    'total': pagination.total,
+                    'pages': pagination.pages,
+                    'has_next': pagination.has_next,
+                    'has_prev': pagination.has_prev
+                }
+            }
+        
+        key = cache_key(
+            'comments:post', [post_scope(post_id)],
+            post_id=post_id, page=page, per_page=per_page,
+            cursor=cursor.key() if cursor else cursor_mode,
+            include_total=include_total
         )
+        validators, not_modified = check_not_modified(key)
+        if not_modified:
+            return not_modified
         
-        comments = [comment.to_dict() for comment in pagination.items]
+        compressed = cached_compressed(key, current_app.config['CACHE_COMMENTS_TIMEOUT'])
+        if compressed:
+            return with_validators(compressed, validators), 200
         
-        return jsonify({
-            'success': True,
-            'data': comments,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
-            }
-        }), 200
+        payload = read_through(key, current_app.config['CACHE_COMMENTS_TIMEOUT'], build_page)
+        
+        if payload is None:
+            return jsonify({'success': False, 'error': 'Post not found'}), 404
+        
+        return with_validators(jsonify(payload), validators), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def _enqueue_comment(fields):
+    """Queue a validated comment for the ingest worker (see ingest.py)."""
+    try:
+        ticket = get_comment_queue().enqueue(fields)
+    except QueueFull:
+        response = jsonify({'success': False, 'error': 'Too many comments are waiting, retry later'})
+        response.headers['Retry-After'] = str(current_app.config['COMMENT_QUEUE_RETRY_AFTER'])
+        return response, 503
+    
+    response = jsonify({
+        'success': True,
+        'message': 'Comment accepted',
+        'data': {'ticket': ticket, 'status': PENDING}
+    })
+    response.headers['Location'] = url_for('comments.get_ingest_status', ticket=ticket)
+    return response, 202
+
+
 @comments_bp.route('', methods=['POST'])
 def create_comment():
     """
@@ -135,6 +293,10 @@ def create_comment():
         - content: Comment content (required)
         - rating: Rating from 1-5 stars (optional)
     
+    With COMMENT_INGEST_MODE = 'queue', the comment is queued instead and
+    the response is a 202 with a ticket for GET /api/comments/ingest/<ticket>
+    (503 with Retry-After while the queue is full).
+    
     Returns:
         JSON with created comment
     """
@@ -145,25 +307,16 @@ def create_comment():
         if not data:
             return jsonify({'success': False, 'error': 'Request body is required'}), 400
         
-        post_id = data.get('post_id')
-        author = data.get('author', '').strip()
-        content = data.get('content', '').strip()
-        rating = data.get('rating')
-        
-        # Validate required fields
-        if not post_id or not isinstance(post_id, int):
-            return jsonify({'success': False, 'error': 'post_id is required and must be an integer'}), 400
+        try:
+            fields = validate_new_comment(data)
+        except ValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        if not author or not content:
-            return jsonify({'success': False, 'error': 'Author and content are required'}), 400
+        if current_app.config['COMMENT_INGEST_MODE'] == 'queue':
+            return _enqueue_comment(fields)
         
-        if len(author) > 100:
-            return jsonify({'success': False, 'error': 'Author must be max 100 characters'}), 400
-        
-        # Validate rating if provided
-        if rating is not None:
-            if not isinstance(rating, int) or rating < 1 or rating > 5:
-                return jsonify({'success': False, 'error': 'Rating must be an integer between 1 and 5'}), 400
+        post_id = fields['post_id']
+        rating = fields['rating']
         
         # Verify post exists
         post = Post.query.get(post_id)
@@ -171,16 +324,15 @@ def create_comment():
             return jsonify({'success': False, 'error': 'Post not found'}), 404
         
         # Create comment
-        comment = Comment(
-            post_id=post_id,
-            author=author,
-            content=content,
-            rating=rating
-        )
+        comment = Comment(**fields)
         
         db.session.add(comment)
+        Post.apply_comment_delta(post_id, 1, *Comment.rating_delta(None, rating))
         db.session.commit()
         
+        invalidate_post_comments(post_id)
+        get_rankings().comments_changed(added=[(post_id, None)], rated=[post_id] if rating else ())
+        
         return jsonify({
             'success': True,
             'message': 'Comment created successfully',
@@ -191,6 +343,35 @@ def create_comment():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@comments_bp.route('/ingest/<ticket>', methods=['GET'])
+def get_ingest_status(ticket):
+    """
+    Get the status of a queued comment.
+    
+    Args:
+        ticket: Ticket from the 202 response of POST /api/comments
+    
+    Returns:
+        JSON with the status ('pending', 'created' or 'failed'), plus the
+        comment id once created or the error if it failed
+    """
+    try:
+        status = get_comment_queue().status(ticket)
+        
+        if status is None:
+            return jsonify({'success': False, 'error': 'Ticket not found'}), 404
+        
+        data = {'ticket': ticket, 'status': status['status']}
+        if status['comment_id'] is not None:
+            data['comment_id'] = status['comment_id']
+        if status['error']:
+            data['error'] = status['error']
+        
+        return jsonify({'success': True, 'data': data}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @comments_bp.route('/<int:comment_id>', methods=['PUT'])
 def update_comment(comment_id):
     """
@@ -218,30 +399,26 @@ def update_comment(comment_id):
         if not data:
             return jsonify({'success': False, 'error': 'Request body is required'}), 400
         
+        old_rating = comment.rating
+        
         # Update fields if provided
-        if 'author' in data:
-            author = data['author'].strip()
-            if not author:
-                return jsonify({'success': False, 'error': 'Author cannot be empty'}), 400
-            if len(author) > 100:
-                return jsonify({'success': False, 'error': 'Author must be max 100 characters'}), 400
-            comment.author = author
-        
-        if 'content' in data:
-            content = data['content'].strip()
-            if not content:
-                return jsonify({'success': False, 'error': 'Content cannot be empty'}), 400
-            comment.content = content
-        
-        if 'rating' in data:
-            rating = data['rating']
-            if rating is not None:
-                if not isinstance(rating, int) or rating < 1 or rating > 5:
-                    return jsonify({'success': False, 'error': 'Rating must be an integer between 1 and 5'}), 400
-            comment.rating = rating
+        try:
+            changes = validate_comment_changes(data)
+        except ValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        for field, value in changes.items():
+            setattr(comment, field, value)
+        
+        # Keep the post's rating aggregates in step with a rating change
+        Post.apply_comment_delta(comment.post_id, 0, *Comment.rating_delta(old_rating, comment.rating))
         
         db.session.commit()
         
+        invalidate_post_comments(comment.post_id)
+        if comment.rating != old_rating:
+            get_rankings().comments_changed(rated=[comment.post_id])
+        
         return jsonify({
             'success': True,
             'message': 'Comment updated successfully',
@@ -270,10 +447,16 @@ def delete_comment(comment_id):
             return jsonify({'success': False, 'error': 'Comment not found'}), 404
         
         post_id = comment.post_id
+        rating = comment.rating
+        created_at = comment.created_at
         
         db.session.delete(comment)
+        Post.apply_comment_delta(post_id, -1, *Comment.rating_delta(rating, None))
         db.session.commit()
         
+        invalidate_post_comments(post_id)
+        get_rankings().comments_changed(removed=[(post_id, created_at)], rated=[post_id] if rating else ())
+        
         return jsonify({
             'success': True,
             'message': 'Comment deleted successfully'
@@ -281,3 +464,180 @@ def delete_comment(comment_id):
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@comments_bp.route('/batch', methods=['POST'])
+def create_comments_batch():
+    """
+    Create many comments in one request and one INSERT.
+    
+    Request JSON:
+        - items: List of comment objects (same fields as POST /api/comments)
+        - atomic: Reject the whole batch if any item fails (default: true)
+    
+    Returns:
+        JSON with a result per item (the new id, or an error)
+    """
+    try:
+        try:
+            items, atomic = read_batch(request.get_json(silent=True))
+        except ValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        # Validate the whole payload up front
+        results = BatchResults(len(items))
+        valid = []
+        for index, item in enumerate(items):
+            try:
+                if not isinstance(item, dict):
+                    raise ValidationError('Item must be an object')
+                valid.append((index, validate_new_comment(item)))
+            except ValidationError as e:
+                results.fail(index, str(e))
+        
+        # Check that the posts exist with a single IN query
+        found = existing_ids(Post.id, [fields['post_id'] for _, fields in valid])
+        rows = []
+        for index, fields in valid:
+            if fields['post_id'] in found:
+                rows.append((index, fields))
+            else:
+                results.fail(index, 'Post not found')
+        
+        if results.failed and atomic:
+            return results.rejected()
+        
+        if rows:
+            comment_ids = insert_comments([fields for _, fields in rows])
+            
+            for (index, fields), comment_id in zip(rows, comment_ids):
+                results.succeed(index, id=comment_id, post_id=fields['post_id'])
+        
+        return results.response('Comments created', 201)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@comments_bp.route('/batch', methods=['PUT'])
+def update_comments_batch():
+    """
+    Update many comments in one request.
+    
+    Request JSON:
+        - items: List of objects with `id` and the fields to change
+        - atomic: Reject the whole batch if any item fails (default: true)
+    
+    Returns:
+        JSON with a result per item
+    """
+    try:
+        try:
+            items, atomic = read_batch(request.get_json(silent=True))
+        except ValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        # Validate the whole payload up front
+        results = BatchResults(len(items))
+        updates = []
+        for index, item in enumerate(items):
+            try:
+                if not isinstance(item, dict):
+                    raise ValidationError('Item must be an object')
+                comment_id = validate_id(item.get('id'))
+                changes = validate_comment_changes(item)
+                if not changes:
+                    raise ValidationError('No fields to update')
+                updates.append((index, comment_id, changes))
+            except ValidationError as e:
+                results.fail(index, str(e))
+        
+        # Load the current post and rating of every comment in one query
+        current = _comment_ratings([comment_id for _, comment_id, _ in updates])
+        changes_by_id = {}
+        deltas = {}
+        for index, comment_id, changes in updates:
+            if comment_id not in current:
+                results.fail(index, 'Comment not found')
+            elif comment_id in changes_by_id:
+                results.fail(index, 'Duplicate id in batch')
+            else:
+                changes_by_id[comment_id] = changes
+                post_id, old_rating, _ = current[comment_id]
+                rating_delta = Comment.rating_delta(old_rating, changes.get('rating', old_rating))
+                count, rating_sum, ratings = deltas.get(post_id, (0, 0, 0))
+                deltas[post_id] = (count, rating_sum + rating_delta[0], ratings + rating_delta[1])
+                results.succeed(index, id=comment_id)
+        
+        if results.failed and atomic:
+            return results.rejected()
+        
+        if changes_by_id:
+            update_many(Comment.__table__, changes_by_id)
+            Post.apply_comment_deltas(deltas)
+            db.session.commit()
+            
+            invalidate_posts_comments(deltas)
+            get_rankings().comments_changed(rated=_rated_posts(deltas))
+        
+        return results.response('Comments updated')
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@comments_bp.route('/batch', methods=['DELETE'])
+def delete_comments_batch():
+    """
+    Delete many comments in one request.
+    
+    Request JSON:
+        - ids: List of comment IDs
+        - atomic: Reject the whole batch if any id fails (default: true)
+    
+    Returns:
+        JSON with a result per id
+    """
+    try:
+        try:
+            ids, atomic = read_batch(request.get_json(silent=True), 'ids')
+        except ValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        results = BatchResults(len(ids))
+        current = _comment_ratings([comment_id for comment_id in ids if isinstance(comment_id, int)])
+        to_delete = set()
+        removed = []
+        deltas = {}
+        for index, comment_id in enumerate(ids):
+            try:
+                validate_id(comment_id)
+                if comment_id not in current:
+                    raise ValidationError('Comment not found')
+                if comment_id in to_delete:
+                    raise ValidationError('Duplicate id in batch')
+                to_delete.add(comment_id)
+                post_id, rating, created_at = current[comment_id]
+                removed.append((post_id, created_at))
+                rating_delta = Comment.rating_delta(rating, None)
+                count, rating_sum, ratings = deltas.get(post_id, (0, 0, 0))
+                deltas[post_id] = (count - 1, rating_sum + rating_delta[0], ratings + rating_delta[1])
+                results.succeed(index, id=comment_id)
+            except ValidationError as e:
+                results.fail(index, str(e))
+        
+        if results.failed and atomic:
+            return results.rejected()
+        
+        if to_delete:
+            db.session.execute(delete(Comment).where(Comment.id.in_(to_delete)))
+            Post.apply_comment_deltas(deltas)
+            db.session.commit()
+            
+            invalidate_posts_comments(deltas)
+            get_rankings().comments_changed(removed=removed, rated=_rated_posts(deltas))
+        
+        return results.response('Comments deleted')
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
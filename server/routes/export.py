@@ -0,0 +1,117 @@
+"""
+API routes for bulk data export.
+Streams posts and comments as newline-delimited JSON (NDJSON).
+"""
+
+from datetime import datetime, timezone
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from sqlalchemy import select
+from models import db, Post, Comment, POST_COLUMNS, COMMENT_COLUMNS
+from serializers import dumps_bytes, iso_utc
+from compression import compress_stream
+
+export_bp = Blueprint('export', __name__)
+
+# Rows fetched from the server-side cursor per round trip
+EXPORT_BATCH_SIZE = 1000
+
+# Bytes buffered before a chunk is sent to the client
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+
+def _parse_since(value):
+    """Parse the `since` parameter as a naive UTC datetime (None if absent)."""
+    if not value:
+        return None
+    since = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since
+
+
+def _stream_rows(model, columns, since):
+    """
+    Stream rows of `model` as NDJSON, oldest update first.
+
+    Rows are read through a server-side cursor in batches and encoded one
+    by one, so memory stays flat regardless of the table size.
+    """
+    names = [column.key for column in columns]
+    stmt = select(*columns).order_by(model.updated_at, model.id)
+    if since is not None:
+        stmt = stmt.where(model.updated_at >= since)
+
+    result = db.session.execute(
+        stmt.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE)
+    )
+
+    buffer = []
+    size = 0
+    for row in result:
+        record = dict(zip(names, row))
+        record['created_at'] = iso_utc(record['created_at'])
+        record['updated_at'] = iso_utc(record['updated_at'])
+        line = dumps_bytes(record) + b'\n'
+        buffer.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _export(model, columns):
+    try:
+        since = _parse_since(request.args.get('since', '', type=str).strip())
+    except ValueError:
+        return jsonify({'success': False, 'error': 'since must be an ISO 8601 timestamp'}), 400
+
+    rows = stream_with_context(_stream_rows(model, columns, since))
+    if request.args.get('gzip', '').lower() not in ('1', 'true', 'yes'):
+        # Compressed as negotiated by the after-request hook (compression.py)
+        return Response(rows, mimetype='application/x-ndjson')
+
+    response = Response(compress_stream(rows, 'gzip', 6), mimetype='application/x-ndjson')
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+@export_bp.route('/posts', methods=['GET'])
+def export_posts():
+    """
+    Stream all posts as NDJSON, ordered by updated_at.
+
+    Query Parameters:
+        - since: Only posts updated at or after this ISO 8601 timestamp;
+          pass the last `updated_at` of a previous export to continue it
+        - gzip: Gzip-compress the stream whatever the Accept-Encoding
+          (default: false)
+
+    Deleted posts are simply absent: an incremental (`since`) export has
+    no record of deletions, so a consumer kept in sync with it must
+    reconcile with a full export from time to time to drop them.
+
+    Returns:
+        NDJSON stream, one post per line
+    """
+    return _export(Post, POST_COLUMNS)
+
+
+@export_bp.route('/comments', methods=['GET'])
+def export_comments():
+    """
+    Stream all comments as NDJSON, ordered by updated_at.
+
+    Query Parameters:
+        - since: Only comments updated at or after this ISO 8601 timestamp
+        - gzip: Gzip-compress the stream whatever the Accept-Encoding
+          (default: false)
+
+    As for posts, deletions are not reported by incremental exports.
+
+    Returns:
+        NDJSON stream, one comment per line
+    """
+    return _export(Comment, COMMENT_COLUMNS)
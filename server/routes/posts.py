@@ -3,13 +3,35 @@ API routes for Post operations.
 Handles CRUD operations, pagination, search, and caching.
 """
 
-from flask import Blueprint, request, jsonify
-from sqlalchemy import or_
-from models import db, Post
+import math
+from flask import Blueprint, request, jsonify, current_app
+from sqlalchemy import delete, insert
+from models import db, Post, Comment, POST_COLUMNS, COMMENT_COLUMNS
+from serializers import comment_dict, parse_post_fields, post_dict
+from projection import PostProjection
+from rankings import TOP_RATED, TRENDING, RankingNotReady, get_rankings
+from search import get_search_backend
+from validation import ValidationError, validate_id, validate_new_post, validate_post_changes
+from batch import BatchResults, existing_ids, read_batch, update_many
+from pagination import InvalidCursor, parse_cursor_args, keyset_paginate
+from caching import (
+    POSTS_SCOPE, COMMENTS_SCOPE, post_scope, cache_key, read_through,
+    invalidate, invalidate_post
+)
+from conditional import check_not_modified, with_validators
+from compression import cached_compressed
 
 posts_bp = Blueprint('posts', __name__)
 
 
+def _posts_by_ids(ids, columns=POST_COLUMNS):
+    """Load post rows (of `columns`) by id, keeping the order of `ids`."""
+    if not ids:
+        return []
+    posts = {row.id: row for row in db.session.query(*columns).filter(Post.id.in_(ids))}
+    return [posts[post_id] for post_id in ids if post_id in posts]
+
+
 @posts_bp.route('', methods=['GET'])
 def get_all_posts():
     """
@@ -18,7 +40,22 @@ def get_all_posts():
     Query Parameters:
         - page: Page number (default: 1)
         - search: Search term for title/content/author (optional)
+        - sort: 'newest' (default) or 'relevance' (with search, offset mode)
         - per_page: Posts per page (default: 10)
+        - cursor: Opt-in keyset pagination; empty for the first page, then
+          a `next_cursor`/`prev_cursor` from a previous response (`page` is
+          ignored)
+        - include_total: Include the total count in cursor mode (default: false)
+        - fields: Comma-separated post fields and/or field sets to return
+          (default: 'summary', which has an `excerpt` instead of `content`;
+          'full' has the full `content`)
+        - excerpt_length: Characters in `excerpt` (default:
+          POST_EXCERPT_LENGTH)
+
+    Only the columns of the requested fields are selected. Pages are cached
+    per normalized query until a post or comment write invalidates them;
+    responses carry an ETag and Last-Modified, and a matching
+    If-None-Match/If-Modified-Since gets a 304 (conditional.py).
     
     Returns:
         JSON with posts list and pagination info
@@ -26,6 +63,7 @@ def get_all_posts():
     try:
         page = request.args.get('page', 1, type=int)
         search = request.args.get('search', '', type=str).strip()
+        sort = request.args.get('sort', 'newest', type=str)
         per_page = request.args.get('per_page', 10, type=int)
         
         # Validate pagination inputs
@@ -33,65 +71,248 @@ def get_all_posts():
             page = 1
         if per_page < 1 or per_page > 100:
             per_page = 10
+        if sort not in ('newest', 'relevance'):
+            sort = 'newest'
+        
+        excerpt_length = request.args.get('excerpt_length', current_app.config['POST_EXCERPT_LENGTH'], type=int)
+        if excerpt_length < 1 or excerpt_length > current_app.config['POST_EXCERPT_MAX_LENGTH']:
+            excerpt_length = current_app.config['POST_EXCERPT_LENGTH']
         
-        # Build query
-        query = Post.query
+        try:
+            projection = PostProjection(parse_post_fields(request.args.get('fields', '', type=str)), excerpt_length)
+            cursor_mode, cursor, include_total = parse_cursor_args(request.args)
+        except (InvalidCursor, ValidationError) as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        # Apply search filter if provided
-        if search:
-            query = query.filter(
-                or_(
-                    Post.title.ilike(f'%{search}%'),
-                    Post.content.ilike(f'%{search}%'),
-                    Post.author.ilike(f'%{search}%')
+        if cursor_mode and sort == 'relevance':
+            return jsonify({'success': False, 'error': 'sort=relevance is not supported with cursor pagination'}), 400
+        
+        def build_page():
+            backend = get_search_backend()
+            
+            # Backends that rank ids themselves let us load only this page
+            if search and not cursor_mode and backend.ranks_ids:
+                ids = backend.ranked_ids(search, sort)
+                page_ids = ids[(page - 1) * per_page:page * per_page]
+                return {
+                    'success': True,
+                    'data': [projection.to_dict(row) for row in _posts_by_ids(page_ids, projection.columns)],
+                    'pagination': {
+                        'page': page,
+                        'per_page': per_page,
+                        'total': len(ids),
+                        'pages': math.ceil(len(ids) / per_page),
+                        'has_next': page * per_page < len(ids),
+                        'has_prev': page > 1
+                    }
+                }
+            
+            # Build query; plain rows serialize faster than ORM instances
+            query = db.session.query(*projection.columns)
+            
+            # Apply search filter if provided
+            if search:
+                query = backend.search(
+                    query, search, by_relevance=(sort == 'relevance')
                 )
-            )
+            
+            if cursor_mode:
+                result = keyset_paginate(query, Post, cursor, per_page, include_total)
+                return {
+                    'success': True,
+                    'data': [projection.to_dict(row) for row in result.items],
+                    'pagination': result.pagination_dict(per_page)
+                }
+            
+            # Order by created_at descending (newest first), after relevance
+            query = query.order_by(Post.created_at.desc())
+            
+            # Paginate
+            pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+            
+            return {
+                'success': True,
+                'data': [projection.to_dict(row) for row in pagination.items],
+                'pagination': {
+                    'page': page,
+                    'per_page': per_page,
+                    'total': pagination.total,
+                    'pages': pagination.pages,
+                    'has_next': pagination.has_next,
+                    'has_prev': pagination.has_prev
+                }
+            }
+        
+        # Search is case-insensitive, so normalize it for the cache key
+        key = cache_key(
+            'posts:list', [POSTS_SCOPE],
+            page=page, per_page=per_page, search=search.lower(), sort=sort,
+            cursor=cursor.key() if cursor else cursor_mode,
+            include_total=include_total, **projection.cache_params()
+        )
+        validators, not_modified = check_not_modified(key)
+        if not_modified:
+            return not_modified
+        
+        compressed = cached_compressed(key, current_app.config['CACHE_POSTS_TIMEOUT'])
+        if compressed:
+            return with_validators(compressed, validators), 200
+        
+        payload = read_through(key, current_app.config['CACHE_POSTS_TIMEOUT'], build_page)
+        
+        return with_validators(jsonify(payload), validators), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def _ranked_posts(name):
+    """
+    Serve a page of a ranking (see rankings.py).
+    
+    Query Parameters:
+        - page: Page number (default: 1)
+        - per_page: Posts per page (default: 10, max 100)
+        - fields, excerpt_length: As for GET /api/posts
+    
+    Returns:
+        JSON with the ranked posts, best first, and pagination info
+    """
+    try:
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 10, type=int)
+        
+        # Validate pagination inputs
+        if page < 1:
+            page = 1
+        if per_page < 1 or per_page > 100:
+            per_page = 10
         
-        # Order by created_at descending (newest first)
-        query = query.order_by(Post.created_at.desc())
+        excerpt_length = request.args.get('excerpt_length', current_app.config['POST_EXCERPT_LENGTH'], type=int)
+        if excerpt_length < 1 or excerpt_length > current_app.config['POST_EXCERPT_MAX_LENGTH']:
+            excerpt_length = current_app.config['POST_EXCERPT_LENGTH']
         
-        # Paginate
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        try:
+            projection = PostProjection(parse_post_fields(request.args.get('fields', '', type=str)), excerpt_length)
+        except ValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        posts = [post.to_dict() for post in pagination.items]
+        # The ranking is a range read; only the page's posts are loaded
+        try:
+            ids, total = get_rankings().page(name, page, per_page)
+        except RankingNotReady:
+            response = jsonify({'success': False, 'error': 'Ranking is being built, retry later'})
+            response.headers['Retry-After'] = str(current_app.config['RANKINGS_RETRY_AFTER'])
+            return response, 503
         
         return jsonify({
             'success': True,
-            'data': posts,
+            'data': [projection.to_dict(row) for row in _posts_by_ids(ids, projection.columns)],
             'pagination': {
                 'page': page,
                 'per_page': per_page,
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev
+                'total': total,
+                'pages': math.ceil(total / per_page),
+                'has_next': page * per_page < total,
+                'has_prev': page > 1
             }
         }), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@posts_bp.route('/trending', methods=['GET'])
+def get_trending_posts():
+    """
+    Get the posts with the most recent comment activity.
+    
+    Every comment counts, with a weight that halves every
+    TRENDING_HALF_LIFE_HOURS. Same parameters as `_ranked_posts`.
+    
+    Returns:
+        JSON with posts list and pagination info
+    """
+    return _ranked_posts(TRENDING)
+
+
+@posts_bp.route('/top-rated', methods=['GET'])
+def get_top_rated_posts():
+    """
+    Get the posts with the best ratings.
+    
+    Posts are ordered by a Bayesian average rating, so a single 5-star
+    rating does not outrank many good ones. Same parameters as
+    `_ranked_posts`.
+    
+    Returns:
+        JSON with posts list and pagination info
+    """
+    return _ranked_posts(TOP_RATED)
+
+
 @posts_bp.route('/<int:post_id>', methods=['GET'])
 def get_post(post_id):
     """
-    Get a single post with all its comments.
+    Get a single post with its most recent comments.
     
     Args:
         post_id: ID of the post
     
+    Query Parameters:
+        - comments: Number of newest comments to embed (default:
+          POST_DETAIL_COMMENTS, max 100); fetch the rest from
+          /api/comments/post/<id> with `comments_pagination.next_cursor`
+        - include_comments: Set to false to leave comments out entirely
+    
     Returns:
-        JSON with post and all comments
+        JSON with post and its first page of comments
     """
     try:
-        post = Post.query.get(post_id)
+        default_comments = current_app.config['POST_DETAIL_COMMENTS']
+        comments_limit = request.args.get('comments', default_comments, type=int)
+        include_comments = request.args.get('include_comments', 'true').lower() not in ('0', 'false', 'no')
         
-        if not post:
+        # Validate inputs
+        if comments_limit < 1 or comments_limit > 100:
+            comments_limit = default_comments
+        
+        def build_post():
+            row = db.session.query(*POST_COLUMNS).filter(Post.id == post_id).first()
+            if not row:
+                return None
+            
+            data = post_dict(row)
+            if include_comments:
+                # Only one page of comments is loaded, however many exist
+                result = keyset_paginate(
+                    db.session.query(*COMMENT_COLUMNS).filter(Comment.post_id == post_id),
+                    Comment, None, comments_limit
+                )
+                data['comments'] = [comment_dict(row) for row in result.items]
+                data['comments_pagination'] = result.pagination_dict(comments_limit)
+            
+            return {
+                'success': True,
+                'data': data
+            }
+        
+        key = cache_key(
+            'posts:detail', [post_scope(post_id)],
+            post_id=post_id, comments=comments_limit if include_comments else 0
+        )
+        validators, not_modified = check_not_modified(key)
+        if not_modified:
+            return not_modified
+        
+        compressed = cached_compressed(key, current_app.config['CACHE_POSTS_TIMEOUT'])
+        if compressed:
+            return with_validators(compressed, validators), 200
+        
+        payload = read_through(key, current_app.config['CACHE_POSTS_TIMEOUT'], build_post)
+        
+        if payload is None:
             return jsonify({'success': False, 'error': 'Post not found'}), 404
         
-        return jsonify({
-            'success': True,
-            'data': post.to_dict(include_comments=True)
-        }), 200
+        return with_validators(jsonify(payload), validators), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -116,29 +337,20 @@ def create_post():
         if not data:
             return jsonify({'success': False, 'error': 'Request body is required'}), 400
         
-        title = data.get('title', '').strip()
-        content = data.get('content', '').strip()
-        author = data.get('author', '').strip()
-        
-        if not title or not content or not author:
-            return jsonify({'success': False, 'error': 'Title, content, and author are required'}), 400
-        
-        if len(title) > 200:
-            return jsonify({'success': False, 'error': 'Title must be max 200 characters'}), 400
-        
-        if len(author) > 100:
-            return jsonify({'success': False, 'error': 'Author must be max 100 characters'}), 400
+        try:
+            fields = validate_new_post(data)
+        except ValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
         # Create post
-        post = Post(
-            title=title,
-            content=content,
-            author=author
-        )
+        post = Post(**fields)
         
         db.session.add(post)
         db.session.commit()
         
+        invalidate_post(post.id)
+        get_search_backend().post_saved(post)
+        
         return jsonify({
             'success': True,
             'message': 'Post created successfully',
@@ -177,30 +389,19 @@ def update_post(post_id):
             return jsonify({'success': False, 'error': 'Request body is required'}), 400
         
         # Update fields if provided
-        if 'title' in data:
-            title = data['title'].strip()
-            if not title:
-                return jsonify({'success': False, 'error': 'Title cannot be empty'}), 400
-            if len(title) > 200:
-                return jsonify({'success': False, 'error': 'Title must be max 200 characters'}), 400
-            post.title = title
-        
-        if 'content' in data:
-            content = data['content'].strip()
-            if not content:
-                return jsonify({'success': False, 'error': 'Content cannot be empty'}), 400
-            post.content = content
-        
-        if 'author' in data:
-            author = data['author'].strip()
-            if not author:
-                return jsonify({'success': False, 'error': 'Author cannot be empty'}), 400
-            if len(author) > 100:
-                return jsonify({'success': False, 'error': 'Author must be max 100 characters'}), 400
-            post.author = author
+        try:
+            changes = validate_post_changes(data)
+        except ValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        for field, value in changes.items():
+            setattr(post, field, value)
         
         db.session.commit()
         
+        invalidate_post(post_id)
+        get_search_backend().post_saved(post)
+        
         return jsonify({
             'success': True,
             'message': 'Post updated successfully',
@@ -231,6 +432,11 @@ def delete_post(post_id):
         db.session.delete(post)
         db.session.commit()
         
+        # The post's comments were removed with it
+        invalidate(POSTS_SCOPE, COMMENTS_SCOPE, post_scope(post_id))
+        get_search_backend().post_deleted(post_id)
+        get_rankings().posts_deleted([post_id])
+        
         return jsonify({
             'success': True,
             'message': 'Post deleted successfully'
@@ -238,3 +444,169 @@ def delete_post(post_id):
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@posts_bp.route('/batch', methods=['POST'])
+def create_posts_batch():
+    """
+    Create many posts in one request and one INSERT.
+    
+    Request JSON:
+        - items: List of post objects (same fields as POST /api/posts)
+        - atomic: Reject the whole batch if any item is invalid (default: true)
+    
+    Returns:
+        JSON with a result per item (the new id, or an error)
+    """
+    try:
+        try:
+            items, atomic = read_batch(request.get_json(silent=True))
+        except ValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        # Validate the whole payload up front
+        results = BatchResults(len(items))
+        rows = []
+        for index, item in enumerate(items):
+            try:
+                if not isinstance(item, dict):
+                    raise ValidationError('Item must be an object')
+                rows.append((index, validate_new_post(item)))
+            except ValidationError as e:
+                results.fail(index, str(e))
+        
+        if results.failed and atomic:
+            return results.rejected()
+        
+        if rows:
+            post_ids = db.session.scalars(
+                insert(Post).returning(Post.id, sort_by_parameter_order=True),
+                [fields for _, fields in rows]
+            ).all()
+            db.session.commit()
+            
+            for (index, _), post_id in zip(rows, post_ids):
+                results.succeed(index, id=post_id)
+            
+            invalidate(POSTS_SCOPE, *(post_scope(post_id) for post_id in post_ids))
+            get_search_backend().posts_saved(post_ids)
+        
+        return results.response('Posts created', 201)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@posts_bp.route('/batch', methods=['PUT'])
+def update_posts_batch():
+    """
+    Update many posts in one request.
+    
+    Request JSON:
+        - items: List of objects with `id` and the fields to change
+        - atomic: Reject the whole batch if any item fails (default: true)
+    
+    Returns:
+        JSON with a result per item
+    """
+    try:
+        try:
+            items, atomic = read_batch(request.get_json(silent=True))
+        except ValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        # Validate the whole payload up front
+        results = BatchResults(len(items))
+        updates = []
+        for index, item in enumerate(items):
+            try:
+                if not isinstance(item, dict):
+                    raise ValidationError('Item must be an object')
+                post_id = validate_id(item.get('id'))
+                changes = validate_post_changes(item)
+                if not changes:
+                    raise ValidationError('No fields to update')
+                updates.append((index, post_id, changes))
+            except ValidationError as e:
+                results.fail(index, str(e))
+        
+        # Check existence with a single IN query
+        found = existing_ids(Post.id, [post_id for _, post_id, _ in updates])
+        changes_by_id = {}
+        for index, post_id, changes in updates:
+            if post_id not in found:
+                results.fail(index, 'Post not found')
+            elif post_id in changes_by_id:
+                results.fail(index, 'Duplicate id in batch')
+            else:
+                changes_by_id[post_id] = changes
+                results.succeed(index, id=post_id)
+        
+        if results.failed and atomic:
+            return results.rejected()
+        
+        if changes_by_id:
+            update_many(Post.__table__, changes_by_id)
+            db.session.commit()
+            
+            invalidate(POSTS_SCOPE, *(post_scope(post_id) for post_id in changes_by_id))
+            get_search_backend().posts_saved(list(changes_by_id))
+        
+        return results.response('Posts updated')
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@posts_bp.route('/batch', methods=['DELETE'])
+def delete_posts_batch():
+    """
+    Delete many posts (and their comments) in one request.
+    
+    Request JSON:
+        - ids: List of post IDs
+        - atomic: Reject the whole batch if any id fails (default: true)
+    
+    Returns:
+        JSON with a result per id
+    """
+    try:
+        try:
+            ids, atomic = read_batch(request.get_json(silent=True), 'ids')
+        except ValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        results = BatchResults(len(ids))
+        found = existing_ids(Post.id, [post_id for post_id in ids if isinstance(post_id, int)])
+        to_delete = set()
+        for index, post_id in enumerate(ids):
+            try:
+                validate_id(post_id)
+                if post_id not in found:
+                    raise ValidationError('Post not found')
+                if post_id in to_delete:
+                    raise ValidationError('Duplicate id in batch')
+                to_delete.add(post_id)
+                results.succeed(index, id=post_id)
+            except ValidationError as e:
+                results.fail(index, str(e))
+        
+        if results.failed and atomic:
+            return results.rejected()
+        
+        if to_delete:
+            # Bulk deletes bypass the ORM cascade, so remove comments first
+            db.session.execute(delete(Comment).where(Comment.post_id.in_(to_delete)))
+            db.session.execute(delete(Post).where(Post.id.in_(to_delete)))
+            db.session.commit()
+            
+            invalidate(POSTS_SCOPE, COMMENTS_SCOPE, *(post_scope(post_id) for post_id in to_delete))
+            backend = get_search_backend()
+            for post_id in to_delete:
+                backend.post_deleted(post_id)
+            get_rankings().posts_deleted(to_delete)
+        
+        return results.response('Posts deleted')
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -0,0 +1,300 @@
+"""
+Full-text search backends for posts.
+
+The backend is picked from the database dialect (see `SEARCH_BACKEND` in
+config.py):
+
+- PostgreSQL: a generated, stored `tsvector` column with a GIN index,
+  ranked with `ts_rank`
+- SQLite: an external-content FTS5 table kept in sync by triggers, ranked
+  with `bm25`
+- Anything else: the original ILIKE scan over title, content and author
+
+Setting it to 'memory' uses an in-process inverted index instead (see
+search_index.py), for deployments where the schema cannot be changed.
+
+Search terms are split into words and every word must match, as a prefix,
+in the title, content or author. `search=` used to match substrings with
+ILIKE, so when a full-text query finds nothing (e.g. `ell` for "Hello", or
+only stopwords on PostgreSQL) the database backends fall back to it.
+"""
+
+import re
+import threading
+from datetime import timezone
+from flask import current_app
+from sqlalchemy import DDL, Float, Integer, case, event, func, literal_column, or_, text
+from models import db, Post
+from search_index import InvertedIndex
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# Text search configuration used by the generated tsvector column
+TS_CONFIG = 'english'
+
+POSTGRES_DDL = [
+    f"""
+    ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('{TS_CONFIG}', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('{TS_CONFIG}', coalesce(author, '')), 'B') ||
+        setweight(to_tsvector('{TS_CONFIG}', coalesce(content, '')), 'D')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_posts_search_vector ON posts USING GIN (search_vector)",
+]
+
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+        title, content, author,
+        content='posts', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_fts(rowid, title, content, author)
+        VALUES (new.id, new.title, new.content, new.author);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, content, author)
+        VALUES ('delete', old.id, old.title, old.content, old.author);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF title, content, author ON posts BEGIN
+        INSERT INTO posts_fts(posts_fts, rowid, title, content, author)
+        VALUES ('delete', old.id, old.title, old.content, old.author);
+        INSERT INTO posts_fts(rowid, title, content, author)
+        VALUES (new.id, new.title, new.content, new.author);
+    END
+    """,
+]
+
+# Create the search structures whenever the posts table is created with
+# `db.create_all()` (tests, benchmarks); migrations do the same for
+# deployed databases.
+for _statement in POSTGRES_DDL:
+    event.listen(Post.__table__, 'after_create', DDL(_statement).execute_if(dialect='postgresql'))
+for _statement in SQLITE_DDL:
+    event.listen(Post.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+
+
+def tokenize(term):
+    """Split a search term into lowercase words."""
+    return _WORD_RE.findall(term.lower())
+
+
+def _or_substring(query, matched, term):
+    """
+    `matched`, the full-text search of `term` over `query`, or the ILIKE
+    search if that finds nothing.
+    """
+    if db.session.query(matched.exists()).scalar():
+        return matched
+    return LikeSearchBackend().search(query, term)
+
+
+class SearchBackend:
+    """
+    Base class for search backends.
+
+    Backends filter a Post query with `search`. Backends that rank matches
+    themselves set `ranks_ids` and implement `ranked_ids`, so listings can
+    fetch just the posts on the requested page.
+    """
+
+    name = None
+    ranks_ids = False
+
+    def search(self, query, term, by_relevance=False):
+        raise NotImplementedError
+
+    def post_saved(self, post):
+        """Called after a post is created or updated."""
+
+    def post_deleted(self, post_id):
+        """Called after a post is deleted."""
+
+    def posts_saved(self, post_ids):
+        """Called after a batch of posts is created or updated."""
+
+
+class LikeSearchBackend(SearchBackend):
+    """Substring search with ILIKE; needs no schema support."""
+
+    name = 'like'
+
+    def search(self, query, term, by_relevance=False):
+        """
+        Filter `query` to posts matching `term`.
+
+        Args:
+            query: Query over Post
+            term: Raw search term
+            by_relevance: Order by relevance (unsupported, ignored)
+
+        Returns:
+            Filtered query
+        """
+        return query.filter(
+            or_(
+                Post.title.ilike(f'%{term}%'),
+                Post.content.ilike(f'%{term}%'),
+                Post.author.ilike(f'%{term}%')
+            )
+        )
+
+
+class PostgresSearchBackend(SearchBackend):
+    """Search over the generated `posts.search_vector` column."""
+
+    name = 'postgres'
+
+    def search(self, query, term, by_relevance=False):
+        words = tokenize(term)
+        if not words:
+            return LikeSearchBackend().search(query, term)
+
+        vector = literal_column('posts.search_vector')
+        ts_query = func.to_tsquery(
+            literal_column(f"'{TS_CONFIG}'::regconfig"),
+            ' & '.join(f'{word}:*' for word in words)
+        )
+        matched = query.filter(vector.op('@@')(ts_query))
+        if by_relevance:
+            matched = matched.order_by(func.ts_rank(vector, ts_query).desc())
+        return _or_substring(query, matched, term)
+
+
+class SqliteSearchBackend(SearchBackend):
+    """Search over the `posts_fts` FTS5 table."""
+
+    name = 'sqlite'
+
+    # bm25 weights for the title, content and author columns
+    WEIGHTS = (10.0, 1.0, 5.0)
+
+    def search(self, query, term, by_relevance=False):
+        words = tokenize(term)
+        if not words:
+            return LikeSearchBackend().search(query, term)
+
+        match = ' '.join(f'"{word}"*' for word in words)
+        weights = ', '.join(str(weight) for weight in self.WEIGHTS)
+        matches = text(
+            f"SELECT rowid AS post_id, bm25(posts_fts, {weights}) AS rank "
+            "FROM posts_fts WHERE posts_fts MATCH :match"
+        ).bindparams(match=match).columns(post_id=Integer, rank=Float).subquery('fts')
+
+        matched = query.join(matches, matches.c.post_id == Post.id)
+        if by_relevance:
+            # bm25() is lower for better matches
+            matched = matched.order_by(matches.c.rank.asc())
+        return _or_substring(query, matched, term)
+
+
+def _timestamp(value):
+    return value.replace(tzinfo=timezone.utc).timestamp() if value else 0.0
+
+
+class MemorySearchBackend(SearchBackend):
+    """
+    Search through an in-process `InvertedIndex`.
+
+    The index is built from the posts table on first use and kept current
+    by the write handlers of this process; posts written by other
+    processes appear after a restart.
+    """
+
+    name = 'memory'
+    ranks_ids = True
+
+    # Rows fetched per round trip while building the index
+    BUILD_BATCH_SIZE = 1000
+
+    def __init__(self):
+        self.index = InvertedIndex()
+        self._built = False
+        self._build_lock = threading.Lock()
+
+    def ensure_built(self):
+        """Build the index from the database unless already done."""
+        if self._built:
+            return
+        with self._build_lock:
+            if self._built:
+                return
+            rows = db.session.query(
+                Post.id, Post.title, Post.content, Post.author, Post.created_at
+            ).execution_options(yield_per=self.BUILD_BATCH_SIZE)
+            for post_id, title, content, author, created_at in rows:
+                self.index.add(post_id, title, content, author, _timestamp(created_at))
+            self._built = True
+
+    def ranked_ids(self, term, sort='newest'):
+        """
+        IDs of posts matching `term`.
+
+        Args:
+            term: Raw search term
+            sort: 'relevance' or 'newest'
+
+        Returns:
+            List of post IDs in result order
+        """
+        self.ensure_built()
+        return self.index.ranked_ids(term, sort=sort)
+
+    def search(self, query, term, by_relevance=False):
+        ids = self.ranked_ids(term, 'relevance' if by_relevance else 'newest')
+        query = query.filter(Post.id.in_(ids))
+        if by_relevance and ids:
+            query = query.order_by(case({post_id: rank for rank, post_id in enumerate(ids)}, value=Post.id))
+        return query
+
+    def post_saved(self, post):
+        if self._built:
+            self.index.add(post.id, post.title, post.content, post.author, _timestamp(post.created_at))
+
+    def post_deleted(self, post_id):
+        if self._built:
+            self.index.remove(post_id)
+
+    def posts_saved(self, post_ids):
+        if self._built and post_ids:
+            for post in Post.query.filter(Post.id.in_(post_ids)):
+                self.post_saved(post)
+
+
+_BACKENDS = {
+    'like': LikeSearchBackend,
+    'memory': MemorySearchBackend,
+    'postgres': PostgresSearchBackend,
+    'sqlite': SqliteSearchBackend,
+}
+
+_DIALECT_BACKENDS = {
+    'postgresql': 'postgres',
+    'sqlite': 'sqlite',
+}
+
+
+def get_search_backend():
+    """
+    Get the search backend for the current app.
+
+    Returns:
+        Backend instance, created once per app
+    """
+    backend = current_app.extensions.get('search_backend')
+    if backend is None:
+        name = current_app.config.get('SEARCH_BACKEND', 'auto')
+        if name == 'auto':
+            name = _DIALECT_BACKENDS.get(db.engine.dialect.name, 'like')
+        backend = _BACKENDS[name]()
+        current_app.extensions['search_backend'] = backend
+    return backend
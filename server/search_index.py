@@ -0,0 +1,292 @@
+"""
+In-process inverted index over posts.
+
+Used by the 'memory' search backend for deployments that cannot add
+full-text structures to the database schema. Each process holds its own
+index: it is built from the posts table on first use and updated by the
+post write handlers of that process.
+
+Postings are stored in compact `array` buffers. Every indexed post gets an
+internal document number; updates and deletes tombstone the old number and
+the postings are compacted once enough of them are dead.
+"""
+
+import math
+import re
+import threading
+from array import array
+from bisect import bisect_left, insort
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+# Position gap between fields so phrases never span two fields
+_FIELD_GAP = 1000
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+class _Postings:
+    """Postings list of one term: documents, frequencies and positions."""
+
+    __slots__ = ('docs', 'freqs', 'starts', 'positions')
+
+    def __init__(self):
+        self.docs = array('I')
+        self.freqs = array('I')
+        self.starts = array('I')
+        self.positions = array('I')
+
+    def append(self, doc, positions):
+        self.docs.append(doc)
+        self.freqs.append(len(positions))
+        self.starts.append(len(self.positions))
+        self.positions.extend(positions)
+
+    def positions_at(self, i):
+        start = self.starts[i]
+        return self.positions[start:start + self.freqs[i]]
+
+    def compacted(self, renumbered):
+        """Copy of these postings with only the documents in `renumbered`, under their new numbers."""
+        kept = _Postings()
+        for i, doc in enumerate(self.docs):
+            new = renumbered.get(doc)
+            if new is not None:
+                kept.append(new, self.positions_at(i))
+        return kept
+
+
+class InvertedIndex:
+    """
+    Positional inverted index with BM25 ranking.
+
+    Queries are whitespace-separated clauses, all of which must match:
+    `word` matches words starting with `word`, `word*` does the same
+    explicitly, and `"two words"` matches the exact phrase.
+    """
+
+    def __init__(self, compact_ratio=0.25):
+        self.compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._sorted_terms = []
+        self._doc_post_ids = array('I')
+        self._doc_lengths = array('I')
+        self._doc_created = array('d')
+        self._post_docs = {}
+        self._dead = set()
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._post_docs)
+
+    def add(self, post_id, title, content, author, created_at=0.0):
+        """
+        Index a post, replacing any previous version of it.
+
+        Args:
+            post_id: ID of the post
+            title, content, author: Indexed text fields
+            created_at: Creation time as a POSIX timestamp (for newest-first
+                ordering)
+        """
+        term_positions = {}
+        length = 0
+        offset = 0
+        for field in (title, author, content):
+            tokens = tokenize(field or '')
+            for position, token in enumerate(tokens):
+                term_positions.setdefault(token, []).append(offset + position)
+            length += len(tokens)
+            offset += len(tokens) + _FIELD_GAP
+
+        with self._lock:
+            self._remove(post_id)
+
+            doc = len(self._doc_post_ids)
+            self._doc_post_ids.append(post_id)
+            self._doc_lengths.append(length)
+            self._doc_created.append(created_at)
+            self._post_docs[post_id] = doc
+            self._total_length += length
+
+            for term, positions in term_positions.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = _Postings()
+                    insort(self._sorted_terms, term)
+                postings.append(doc, positions)
+            self._compact_if_needed()
+
+    def remove(self, post_id):
+        """Remove a post from the index (no-op if it is not indexed)."""
+        with self._lock:
+            self._remove(post_id)
+            self._compact_if_needed()
+
+    def _remove(self, post_id):
+        doc = self._post_docs.pop(post_id, None)
+        if doc is not None:
+            self._dead.add(doc)
+            self._total_length -= self._doc_lengths[doc]
+
+    def _compact_if_needed(self):
+        # Measured against live documents, so a post updated over and over
+        # cannot pile up dead versions of itself
+        if len(self._dead) > self.compact_ratio * max(len(self._post_docs), 1):
+            self._compact()
+
+    def _compact(self):
+        """Drop dead documents and renumber the live ones from 0, keeping their order."""
+        renumbered = {}
+        doc_post_ids = array('I')
+        doc_lengths = array('I')
+        doc_created = array('d')
+        for doc, post_id in enumerate(self._doc_post_ids):
+            if doc in self._dead:
+                continue
+            renumbered[doc] = len(doc_post_ids)
+            doc_post_ids.append(post_id)
+            doc_lengths.append(self._doc_lengths[doc])
+            doc_created.append(self._doc_created[doc])
+
+        for term in list(self._postings):
+            postings = self._postings[term].compacted(renumbered)
+            if postings.docs:
+                self._postings[term] = postings
+            else:
+                del self._postings[term]
+        self._sorted_terms = sorted(self._postings)
+        self._doc_post_ids = doc_post_ids
+        self._doc_lengths = doc_lengths
+        self._doc_created = doc_created
+        self._post_docs = {post_id: renumbered[doc] for post_id, doc in self._post_docs.items()}
+        self._dead = set()
+
+    def _expand(self, prefix):
+        """All indexed terms starting with `prefix`."""
+        start = bisect_left(self._sorted_terms, prefix)
+        terms = []
+        for term in self._sorted_terms[start:]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def _idf(self, postings):
+        df = len(postings.docs)
+        return math.log(1 + (len(self._post_docs) - df + 0.5) / (df + 0.5))
+
+    def _score_terms(self, terms):
+        """BM25 scores of live documents containing any of `terms`."""
+        scores = {}
+        average = self._total_length / max(len(self._post_docs), 1)
+        for term in terms:
+            postings = self._postings[term]
+            idf = self._idf(postings)
+            for doc, freq in zip(postings.docs, postings.freqs):
+                if doc in self._dead:
+                    continue
+                norm = K1 * (1 - B + B * self._doc_lengths[doc] / average)
+                scores[doc] = scores.get(doc, 0.0) + idf * freq * (K1 + 1) / (freq + norm)
+        return scores
+
+    def _score_phrase(self, words):
+        """BM25-like scores of live documents containing the phrase."""
+        if any(word not in self._postings for word in words):
+            return {}
+
+        lists = [self._postings[word] for word in words]
+        rarest = min(lists, key=lambda postings: len(postings.docs))
+        idf = sum(self._idf(postings) for postings in lists)
+
+        scores = {}
+        for doc in rarest.docs:
+            if doc in self._dead:
+                continue
+            # Document numbers are appended in increasing order, so each
+            # postings list can be searched with bisect
+            indexes = []
+            for postings in lists:
+                i = bisect_left(postings.docs, doc)
+                if i == len(postings.docs) or postings.docs[i] != doc:
+                    break
+                indexes.append(i)
+            else:
+                starts = set(lists[0].positions_at(indexes[0]))
+                for offset in range(1, len(lists)):
+                    starts &= {p - offset for p in lists[offset].positions_at(indexes[offset])}
+                    if not starts:
+                        break
+                if starts:
+                    freq = len(starts)
+                    scores[doc] = idf * freq * (K1 + 1) / (freq + K1)
+        return scores
+
+    def search(self, query):
+        """
+        Find posts matching every clause of `query`.
+
+        Args:
+            query: Query string (see class docstring)
+
+        Returns:
+            Dictionary mapping post_id to BM25 score
+        """
+        clauses = []
+        for phrase, word in _QUERY_RE.findall(query):
+            if phrase:
+                words = tokenize(phrase)
+                if words:
+                    clauses.append(('phrase', words))
+            else:
+                for token in tokenize(word):
+                    clauses.append(('prefix', token))
+        if not clauses:
+            return {}
+
+        with self._lock:
+            total = None
+            for kind, value in clauses:
+                if kind == 'phrase' and len(value) > 1:
+                    scores = self._score_phrase(value)
+                else:
+                    prefix = value[0] if kind == 'phrase' else value
+                    terms = [prefix] if kind == 'phrase' else self._expand(prefix)
+                    scores = self._score_terms(t for t in terms if t in self._postings)
+
+                if total is None:
+                    total = scores
+                else:
+                    total = {doc: score + scores[doc] for doc, score in total.items() if doc in scores}
+                if not total:
+                    return {}
+
+            return {self._doc_post_ids[doc]: score for doc, score in total.items()}
+
+    def ranked_ids(self, query, sort='relevance'):
+        """
+        Post IDs matching `query`, best match or newest first.
+
+        Args:
+            query: Query string
+            sort: 'relevance' or 'newest'
+
+        Returns:
+            List of post IDs
+        """
+        with self._lock:
+            scores = self.search(query)
+            if sort == 'relevance':
+                key = lambda post_id: (-scores[post_id], -self._doc_created[self._post_docs[post_id]], -post_id)
+            else:
+                key = lambda post_id: (-self._doc_created[self._post_docs[post_id]], -post_id)
+            return sorted(scores, key=key)
@@ -1,154 +1,458 @@
 """
-Database seeding script to populate initial data for development/testing.
+Database seeding script and synthetic load-data generator.
+
+With no arguments it creates a small development dataset (50 posts,
+100 comments). Pass larger counts to reproduce production scale:
+
+    python seed.py --posts 1000000 --comments 10000000 --skew 1.1
+
+Rows are generated lazily and written in chunks with Core bulk INSERTs
+(or `COPY` on PostgreSQL), so memory use does not grow with the row
+count. The same `--seed` (and `--now`) always produces the same data.
 """
 
-import sys
+import argparse
+import csv
+import io
+import math
 import random
-from datetime import datetime, timedelta
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from sqlalchemy import func, insert, select, text, update
 from app import create_app, db
+from caching import cache
 from models import Post, Comment
 
-
-def _sample_title(topic, i):
-    templates = [
-        "A {topic} Story #{i}",
-        "Reflections on {topic} — Part {i}",
-        "Remembering {topic}: Tale {i}",
-        "Lessons from {topic} #{i}",
+TOPICS = {
+    "life": [
+        "I still remember the small moments that changed everything.",
+        "Life has a way of teaching us lessons when we least expect them.",
+        "This story is about choices, mistakes, and quiet victories.",
+        "Growing up taught me to value time over things."
+    ],
+    "travel": [
+        "The road taught me more than any book could.",
+        "I found friends in strangers and stories in every corner.",
+        "A single journey can reshape how you see the world.",
+        "Maps only show places; memories show meaning."
+    ],
+    "environment": [
+        "I learned to listen to the rivers and watch the forests breathe.",
+        "The smallest acts of care can help fragile ecosystems recover.",
+        "Our town rallied to protect a wetland that once seemed forgotten.",
+        "Nature's patience is a lesson for modern life."
+    ],
+    "world": [
+        "Across borders I found shared laughter and similar fears.",
+        "A market in a foreign city felt like home for a moment.",
+        "Stories around the world often rhyme even when words differ.",
+        "Travel teaches humility in the best ways."
+    ],
+    "personal": [
+        "This is a small, honest account of a day that mattered.",
+        "I write this to remember who I used to be and who I am becoming.",
+        "A personal mistake became an unexpected gift in hindsight.",
+        "Living openly changed the way I relate to others."
     ]
-    return random.choice(templates).format(topic=topic.title(), i=i)
-
-
-def _sample_content(topic):
-    sentences = {
-        "life": [
-            "I still remember the small moments that changed everything.",
-            "Life has a way of teaching us lessons when we least expect them.",
-            "This story is about choices, mistakes, and quiet victories.",
-            "Growing up taught me to value time over things."
-        ],
-        "travel": [
-            "The road taught me more than any book could.",
-            "I found friends in strangers and stories in every corner.",
-            "A single journey can reshape how you see the world.",
-            "Maps only show places; memories show meaning."
-        ],
-        "environment": [
-            "I learned to listen to the rivers and watch the forests breathe.",
-            "The smallest acts of care can help fragile ecosystems recover.",
-            "Our town rallied to protect a wetland that once seemed forgotten.",
-            "Nature's patience is a lesson for modern life."
-        ],
-        "world": [
-            "Across borders I found shared laughter and similar fears.",
-            "A market in a foreign city felt like home for a moment.",
-            "Stories around the world often rhyme even when words differ.",
-            "Travel teaches humility in the best ways."
-        ],
-        "personal": [
-            "This is a small, honest account of a day that mattered.",
-            "I write this to remember who I used to be and who I am becoming.",
-            "A personal mistake became an unexpected gift in hindsight.",
-            "Living openly changed the way I relate to others."
-        ]
-    }
-    chunk = sentences.get(topic, sentences["life"])
-    return "\n\n".join(random.sample(chunk, k=min(len(chunk), random.randint(3, 4))))
-
-
-def seed_data():
+}
+
+TITLE_TEMPLATES = [
+    "A {topic} Story #{i}",
+    "Reflections on {topic} — Part {i}",
+    "Remembering {topic}: Tale {i}",
+    "Lessons from {topic} #{i}",
+]
+
+AUTHORS = [
+    "Ava", "Liam", "Noah", "Olivia", "Emma", "Mason", "Sophia", "Lucas",
+    "Isabella", "Mia", "Ethan", "Amelia", "Harper", "James", "Charlotte"
+]
+AUTHOR_SURNAMES = ["Smith", "Lee", "Garcia", "Brown", "Patel", "Nguyen"]
+
+COMMENTERS = [
+    "Alex", "Sam", "Jordan", "Taylor", "Jamie", "Morgan", "Riley", "Casey",
+    "Drew", "Quinn", "Reese", "Skyler", "Bailey", "Sydney", "Parker"
+]
+COMMENTER_SURNAMES = ["Hill", "Wong", "Khan", "Flores"]
+
+# (weight, comment pool, rating range): 60% positive, 20% negative, 20% neutral
+SENTIMENTS = [
+    (0.6, [
+        "Wonderful story — this warmed my heart.",
+        "Thank you for sharing this uplifting experience!",
+        "This is inspiring; love the perspective.",
+        "Such a positive read — made my day!",
+        "Beautifully written and thoughtful."
+    ], (4, 5)),
+    (0.2, [
+        "I disagree with parts of this and found it frustrating.",
+        "This felt a bit dismissive of the issues raised.",
+        "Not convinced — the argument feels shallow.",
+        "I expected more nuance; this missed the mark for me."
+    ], (1, 2)),
+    (0.2, [
+        "Interesting read, thanks for posting.",
+        "I appreciate the info — neutral thoughts.",
+        "Good to know; I have mixed feelings.",
+        "A factual account; nothing more to add."
+    ], (3, 3)),
+]
+
+# Spread of created_at values, back from the reference time
+HISTORY = timedelta(days=365)
+
+# Default reference time, fixed so that a seed always yields the same rows
+DEFAULT_NOW = datetime(2025, 1, 1)
+
+POST_COLUMNS = ('id', 'title', 'content', 'author', 'created_at', 'updated_at')
+COMMENT_COLUMNS = ('post_id', 'author', 'content', 'rating', 'created_at', 'updated_at')
+
+
+class ZipfSampler:
+    """
+    Draws ranks 0..n-1 with probability roughly proportional to
+    1 / (rank + 1) ** s, in constant memory.
+
+    Uses the inverse CDF of the continuous power law on [1, n + 1), so
+    sampling is O(1) per draw even for millions of ranks. `s = 0` gives a
+    uniform distribution; larger values concentrate draws on low ranks.
+    """
+
+    def __init__(self, n, s):
+        self.n = n
+        self.s = s
+        if s != 1:
+            self._top = (n + 1) ** (1 - s) - 1
+
+    def sample(self, rng):
+        u = rng.random()
+        if self.s == 1:
+            value = (self.n + 1) ** u
+        else:
+            value = (self._top * u + 1) ** (1 / (1 - self.s))
+        return min(int(value) - 1, self.n - 1)
+
+
+class DataGenerator:
+    """
+    Reproducible generator of post and comment rows.
+
+    Args:
+        seed: Random seed; the same seed yields the same rows
+        content_length: Average length of post content in characters
+        now: Reference time that created_at values count back from
+            (default: DEFAULT_NOW)
+    """
+
+    def __init__(self, seed=0, content_length=250, now=None):
+        self.rng = random.Random(seed)
+        self.content_length = content_length
+        self.now = now or DEFAULT_NOW
+        self._history_seconds = int(HISTORY.total_seconds())
+        self._sentiment_weights = [weight for weight, _, _ in SENTIMENTS]
+
+    def _timestamp(self):
+        return self.now - timedelta(seconds=self.rng.randrange(self._history_seconds))
+
+    def _content(self, topic):
+        """Topic sentences joined into roughly `content_length` characters."""
+        rng = self.rng
+        sentences = TOPICS[topic]
+        target = max(1, int(self.content_length * rng.uniform(0.5, 1.5)))
+        paragraphs = []
+        length = 0
+        while length < target:
+            paragraph = ' '.join(rng.sample(sentences, k=rng.randint(1, len(sentences))))
+            paragraphs.append(paragraph)
+            length += len(paragraph) + 2
+        return "\n\n".join(paragraphs)
+
+    def posts(self, first_id, count):
+        """
+        Yield `count` post rows with ids starting at `first_id`.
+
+        Returns:
+            Iterator of dictionaries keyed by POST_COLUMNS
+        """
+        rng = self.rng
+        topics = list(TOPICS)
+        for i in range(count):
+            post_id = first_id + i
+            topic = topics[i % len(topics)]
+            created_at = self._timestamp()
+            yield {
+                'id': post_id,
+                'title': rng.choice(TITLE_TEMPLATES).format(topic=topic.title(), i=post_id),
+                'content': self._content(topic),
+                'author': f"{rng.choice(AUTHORS)} {rng.choice(AUTHOR_SURNAMES)}",
+                'created_at': created_at,
+                'updated_at': created_at,
+            }
+
+    def comments(self, first_post_id, post_count, count, skew=0.0):
+        """
+        Yield `count` comment rows spread over posts
+        first_post_id..first_post_id + post_count - 1.
+
+        Args:
+            first_post_id: Lowest post id to comment on
+            post_count: Number of posts to comment on
+            count: Number of comments
+            skew: Zipf exponent of comments per post; 0 spreads comments
+                uniformly, around 1 gives a few viral posts and a long tail
+
+        Returns:
+            Iterator of dictionaries keyed by COMMENT_COLUMNS
+        """
+        rng = self.rng
+        sampler = ZipfSampler(post_count, skew)
+
+        # Popularity rank -> post through a fixed permutation of the ids,
+        # so the most commented posts are spread over the table
+        stride = rng.randrange(1, post_count + 1)
+        while math.gcd(stride, post_count) != 1:
+            stride += 1
+        offset = rng.randrange(post_count)
+
+        for _ in range(count):
+            rank = sampler.sample(rng)
+            _, pool, ratings = rng.choices(SENTIMENTS, weights=self._sentiment_weights)[0]
+            created_at = self._timestamp()
+            yield {
+                'post_id': first_post_id + (rank * stride + offset) % post_count,
+                'author': f"{rng.choice(COMMENTERS)} {rng.choice(COMMENTER_SURNAMES)}",
+                'content': rng.choice(pool),
+                'rating': rng.randint(*ratings),
+                'created_at': created_at,
+                'updated_at': created_at,
+            }
+
+
+def chunks(rows, size):
+    """Split an iterator into lists of at most `size` items."""
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _insert_chunk(table, columns, rows):
+    db.session.execute(insert(table), rows)
+    db.session.commit()
+
+
+def _copy_chunk(table, columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[column] for column in columns])
+    buffer.seek(0)
+
+    connection = db.session.connection().connection
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    db.session.commit()
+
+
+WRITERS = {
+    'insert': _insert_chunk,
+    'copy': _copy_chunk,
+}
+
+
+def write_rows(table, columns, rows, method, chunk_size, label):
+    """
+    Write generated rows in chunks, reporting progress.
+
+    Returns:
+        Number of rows written
+    """
+    writer = WRITERS[method]
+    started = time.perf_counter()
+    written = 0
+    for chunk in chunks(rows, chunk_size):
+        writer(table, columns, chunk)
+        written += len(chunk)
+        elapsed = time.perf_counter() - started
+        print(f"\r   {label}: {written:,} ({written / max(elapsed, 1e-9):,.0f} rows/s)", end='', flush=True)
+    print()
+    return written
+
+
+def clear_tables():
+    """Remove all posts and comments."""
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text("TRUNCATE comments, posts RESTART IDENTITY"))
+    else:
+        db.session.execute(Comment.__table__.delete())
+        db.session.execute(Post.__table__.delete())
+    db.session.commit()
+
+
+def refresh_post_aggregates(first_post_id):
+    """
+    Compute the comment aggregates of posts from `first_post_id` on with
+    one set-based UPDATE.
+    """
+    comments = Comment.__table__
+    posts = Post.__table__
+
+    def aggregate(expression):
+        return select(func.coalesce(expression, 0)).where(
+            comments.c.post_id == posts.c.id
+        ).scalar_subquery()
+
+    db.session.execute(
+        update(posts)
+        .where(posts.c.id >= first_post_id)
+        .values(
+            comment_count=aggregate(func.count(comments.c.id)),
+            rating_sum=aggregate(func.sum(comments.c.rating)),
+            rating_count=aggregate(func.count(comments.c.rating)),
+            updated_at=posts.c.updated_at
+        )
+    )
+    db.session.commit()
+
+
+def _sync_post_sequence():
+    """Move the posts id sequence past explicitly inserted ids (PostgreSQL)."""
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text(
+            "SELECT setval(pg_get_serial_sequence('posts', 'id'), "
+            "(SELECT coalesce(max(id), 1) FROM posts))"
+        ))
+        db.session.commit()
+
+
+def populate(posts=50, comments=100, skew=0.0, content_length=250, seed=0,
+             chunk_size=10000, method='auto', clear=True, now=None):
+    """
+    Generate and write posts and comments in the current app context.
+
+    Args:
+        posts: Number of posts
+        comments: Number of comments
+        skew: Zipf exponent of comments per post (0 = uniform)
+        content_length: Average post content length in characters
+        seed: Random seed
+        chunk_size: Rows per INSERT/COPY
+        method: 'insert', 'copy' (PostgreSQL only) or 'auto'
+        clear: Remove existing posts and comments first
+        now: Reference time that created_at values count back from
+            (default: DEFAULT_NOW)
+
+    Returns:
+        Tuple of (posts written, comments written)
+    """
+    dialect = db.engine.dialect.name
+    if method == 'auto':
+        method = 'copy' if dialect == 'postgresql' else 'insert'
+    if method == 'copy' and dialect != 'postgresql':
+        raise ValueError('COPY is only supported on PostgreSQL')
+    if comments and not posts:
+        raise ValueError('Comments need at least one post')
+
+    if clear:
+        print("Clearing existing data...")
+        clear_tables()
+
+    first_post_id = (db.session.scalar(select(func.max(Post.id))) or 0) + 1
+    generator = DataGenerator(seed=seed, content_length=content_length, now=now)
+
+    print(f"Creating {posts:,} posts and {comments:,} comments ({method}, skew={skew})...")
+    written_posts = write_rows(
+        Post.__table__, POST_COLUMNS,
+        generator.posts(first_post_id, posts),
+        method, chunk_size, 'Posts'
+    )
+    _sync_post_sequence()
+
+    written_comments = 0
+    if comments:
+        written_comments = write_rows(
+            Comment.__table__, COMMENT_COLUMNS,
+            generator.comments(first_post_id, posts, comments, skew),
+            method, chunk_size, 'Comments'
+        )
+
+    print("Computing post aggregates...")
+    refresh_post_aggregates(first_post_id)
+
+    return written_posts, written_comments
+
+
+def parse_now(value):
+    """`--now` value: an ISO 8601 time (UTC), or 'now' for the current time."""
+    if value == 'now':
+        return datetime.utcnow()
+    try:
+        now = datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid time: {value!r}')
+    # Stored timestamps are naive UTC
+    if now.tzinfo is not None:
+        now = now.astimezone(timezone.utc).replace(tzinfo=None)
+    return now
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--posts', type=int, default=50, help='number of posts (default: 50)')
+    parser.add_argument('--comments', type=int, default=100, help='number of comments (default: 100)')
+    parser.add_argument('--skew', type=float, default=0.0,
+                        help='Zipf exponent of comments per post; 0 is uniform, ~1 mimics viral posts (default: 0)')
+    parser.add_argument('--content-length', type=int, default=250,
+                        help='average post content length in characters (default: 250)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='rows per INSERT/COPY (default: 10000)')
+    parser.add_argument('--method', choices=['auto', 'insert', 'copy'], default='auto',
+                        help='write method; auto uses COPY on PostgreSQL (default: auto)')
+    parser.add_argument('--no-clear', dest='clear', action='store_false',
+                        help='append to existing data instead of replacing it')
+    parser.add_argument('--now', type=parse_now, default=DEFAULT_NOW,
+                        help='time created_at values count back from, ISO 8601 or "now" '
+                             f'(default: {DEFAULT_NOW.date().isoformat()})')
+    args = parser.parse_args(argv)
+
+    if args.posts < 0 or args.comments < 0 or args.chunk_size < 1 or args.skew < 0:
+        parser.error('counts, chunk size and skew must not be negative')
+    return args
+
+
+def seed_data(argv=None):
+    args = parse_args(argv)
     app = create_app()
 
     with app.app_context():
-        print("Clearing existing data...")
-        Comment.query.delete()
-        Post.query.delete()
-        db.session.commit()
+        started = time.perf_counter()
+        populate(
+            posts=args.posts,
+            comments=args.comments,
+            skew=args.skew,
+            content_length=args.content_length,
+            seed=args.seed,
+            chunk_size=args.chunk_size,
+            method=args.method,
+            clear=args.clear,
+            now=args.now
+        )
 
-        random.seed(0)
-        topics = ["life", "travel", "environment", "world", "personal"]
-        authors = [
-            "Ava", "Liam", "Noah", "Olivia", "Emma", "Mason", "Sophia", "Lucas",
-            "Isabella", "Mia", "Ethan", "Amelia", "Harper", "James", "Charlotte"
-        ]
-
-        print("Creating 50 posts...")
-        posts = []
-        now = datetime.utcnow()
-        for i in range(1, 51):
-            topic = topics[(i - 1) % len(topics)]
-            title = _sample_title(topic, i)
-            content = _sample_content(topic)
-            author = random.choice(authors) + " " + random.choice(["Smith", "Lee", "Garcia", "Brown", "Patel", "Nguyen"]) 
-            created_at = now - timedelta(days=random.randint(0, 365), hours=random.randint(0, 23))
-            post = Post(title=title, content=content, author=author, created_at=created_at)
-            posts.append(post)
-
-        db.session.add_all(posts)
-        db.session.commit()
-        print(f"Created {len(posts)} posts")
-
-        positive = [
-            "Wonderful story — this warmed my heart.",
-            "Thank you for sharing this uplifting experience!",
-            "This is inspiring; love the perspective.",
-            "Such a positive read — made my day!",
-            "Beautifully written and thoughtful."
-        ]
-        negative = [
-            "I disagree with parts of this and found it frustrating.",
-            "This felt a bit dismissive of the issues raised.",
-            "Not convinced — the argument feels shallow.",
-            "I expected more nuance; this missed the mark for me."
-        ]
-        neutral = [
-            "Interesting read, thanks for posting.",
-            "I appreciate the info — neutral thoughts.",
-            "Good to know; I have mixed feelings.",
-            "A factual account; nothing more to add."
-        ]
-
-        total_comments = 100
-        pos_count = int(total_comments * 0.6)
-        neg_count = int(total_comments * 0.2)
-        neu_count = total_comments - pos_count - neg_count
-
-        print(f"Creating {total_comments} comments ({pos_count} pos, {neg_count} neg, {neu_count} neu)...")
-
-        comments = []
-        names = [
-            "Alex", "Sam", "Jordan", "Taylor", "Jamie", "Morgan", "Riley", "Casey",
-            "Drew", "Quinn", "Reese", "Skyler", "Bailey", "Sydney", "Parker"
-        ]
-
-        def make_comment(post_id, sentiment_pool, rating_range):
-            return Comment(
-                post_id=post_id,
-                author=random.choice(names) + " " + random.choice(["Hill", "Wong", "Khan", "Flores"]),
-                content=random.choice(sentiment_pool),
-                rating=random.randint(*rating_range),
-                created_at=now - timedelta(days=random.randint(0, 365), hours=random.randint(0, 23))
-            )
-
-        for _ in range(pos_count):
-            post = random.choice(posts)
-            comments.append(make_comment(post.id, positive, (4, 5)))
-
-        for _ in range(neg_count):
-            post = random.choice(posts)
-            comments.append(make_comment(post.id, negative, (1, 2)))
-
-        for _ in range(neu_count):
-            post = random.choice(posts)
-            comments.append(make_comment(post.id, neutral, (3, 3)))
-
-        db.session.add_all(comments)
-        db.session.commit()
-        print(f"Created {len(comments)} comments")
+        # Cached pages describe the old data
+        try:
+            cache.clear()
+        except Exception as e:
+            print(f"Warning: could not clear the cache: {e}")
 
-        print("\n✅ Database seeded successfully!")
-        print(f"   Posts: {Post.query.count()}")
-        print(f"   Comments: {Comment.query.count()}")
+        print(f"\n✅ Database seeded successfully in {time.perf_counter() - started:.1f}s!")
+        print(f"   Posts: {db.session.scalar(select(func.count(Post.id))):,}")
+        print(f"   Comments: {db.session.scalar(select(func.count(Comment.id))):,}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,211 @@
+"""
+JSON serialization: an orjson-backed Flask JSON provider and converters
+from result rows to the API's post and comment dictionaries.
+
+List endpoints select plain columns (`POST_COLUMNS` and `COMMENT_COLUMNS`
+in models.py) and turn each row tuple into a dictionary with
+`post_dict`/`comment_dict`, skipping ORM instances entirely. The
+`to_dict` methods of the models build the same dictionaries through the
+same functions. Post listings can return a subset of the fields
+(`parse_post_fields`; projection.py selects the matching columns).
+
+orjson is optional: `JSON_PROVIDER` (config.py) selects 'orjson', 'json'
+(Flask's stdlib provider) or 'auto', which uses orjson when it is
+installed.
+"""
+
+import json
+from flask.json.provider import DefaultJSONProvider
+from validation import ValidationError
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson
+    orjson = None
+
+
+def iso_utc(value):
+    """
+    Format a naive UTC datetime as ISO 8601 with an explicit offset.
+
+    Same output as ``value.replace(tzinfo=timezone.utc).isoformat()``
+    without building an aware copy of every timestamp.
+    """
+    return value.isoformat() + '+00:00' if value else None
+
+
+def average_rating(rating_sum, rating_count):
+    """Average rating rounded to 2 decimals, or None if unrated."""
+    if not rating_count:
+        return None
+    return round(rating_sum / rating_count, 2)
+
+
+def post_dict(row):
+    """
+    Build the JSON dictionary of a post.
+
+    Args:
+        row: Tuple of the values of `POST_COLUMNS`, in order
+
+    Returns:
+        Dictionary representation of the post
+    """
+    post_id, title, content, author, created_at, updated_at, comment_count, rating_sum, rating_count = row
+    return {
+        'id': post_id,
+        'title': title,
+        'content': content,
+        'author': author,
+        'created_at': iso_utc(created_at),
+        'updated_at': iso_utc(updated_at),
+        'comment_count': comment_count,
+        'average_rating': average_rating(rating_sum, rating_count)
+    }
+
+
+def comment_dict(row):
+    """
+    Build the JSON dictionary of a comment.
+
+    Args:
+        row: Tuple of the values of `COMMENT_COLUMNS`, in order
+
+    Returns:
+        Dictionary representation of the comment
+    """
+    comment_id, post_id, author, content, rating, created_at, updated_at = row
+    return {
+        'id': comment_id,
+        'post_id': post_id,
+        'author': author,
+        'content': content,
+        'rating': rating,
+        'created_at': iso_utc(created_at),
+        'updated_at': iso_utc(updated_at)
+    }
+
+
+# Fields a post listing can return, in response order
+POST_FIELDS = (
+    'id', 'title', 'content', 'excerpt', 'author', 'created_at', 'updated_at',
+    'comment_count', 'average_rating'
+)
+
+# Named field sets accepted by `fields=`; listings default to 'summary'
+POST_FIELD_SETS = {
+    'summary': ('id', 'title', 'excerpt', 'author', 'created_at', 'updated_at', 'comment_count', 'average_rating'),
+    'full': ('id', 'title', 'content', 'author', 'created_at', 'updated_at', 'comment_count', 'average_rating'),
+}
+
+
+def parse_post_fields(value, default='summary'):
+    """
+    Resolve a `fields` query parameter.
+
+    Args:
+        value: Comma-separated field names and/or field set names (e.g.
+            'summary', 'full', 'id,title'); empty selects `default`
+        default: Field set used when `value` is empty
+
+    Returns:
+        Tuple of field names in response order, always including 'id'
+
+    Raises:
+        ValidationError: If a name is neither a field nor a field set
+    """
+    requested = set()
+    for name in (value or '').split(','):
+        name = name.strip()
+        if not name:
+            continue
+        if name in POST_FIELD_SETS:
+            requested.update(POST_FIELD_SETS[name])
+        elif name in POST_FIELDS:
+            requested.add(name)
+        else:
+            raise ValidationError(f'Unknown field: {name}')
+
+    if not requested:
+        requested.update(POST_FIELD_SETS[default])
+    requested.add('id')
+    return tuple(field for field in POST_FIELDS if field in requested)
+
+
+def excerpt(text, length):
+    """
+    Shorten `text` to `length` characters, marking a cut with an ellipsis.
+
+    Args:
+        text: Prefix of the content of at least `length + 1` characters
+            when the content is longer than `length`
+        length: Maximum characters kept
+    """
+    if text is None or len(text) <= length:
+        return text
+    return text[:length].rstrip() + '\u2026'
+
+
+if orjson is not None:
+    # Non-string keys are converted like the stdlib does; datetimes go to
+    # `default` so they keep Flask's HTTP-date format
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps_bytes(obj):
+        """Encode `obj` as compact UTF-8 JSON."""
+        return orjson.dumps(obj, default=DefaultJSONProvider.default, option=ORJSON_OPTIONS)
+else:  # pragma: no cover
+    def dumps_bytes(obj):
+        """Encode `obj` as compact UTF-8 JSON."""
+        return json.dumps(obj, default=DefaultJSONProvider.default, separators=(',', ':')).encode('utf-8')
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that encodes and decodes with orjson.
+
+    Calls with stdlib-only keyword arguments (e.g. `indent`, `sort_keys`)
+    are handed to the default provider. Responses are built from orjson's
+    bytes directly, without a round trip through `str`.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        option = ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE
+        if self.compact is False or (self.compact is None and self._app.debug):
+            option |= orjson.OPT_INDENT_2
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=option), mimetype=self.mimetype
+        )
+
+
+def json_provider_class(name):
+    """
+    Resolve the `JSON_PROVIDER` setting.
+
+    Args:
+        name: 'auto', 'orjson' or 'json'
+
+    Returns:
+        JSON provider class
+
+    Raises:
+        ValueError: If `name` is unknown, or 'orjson' is not installed
+    """
+    if name == 'json' or (name == 'auto' and orjson is None):
+        return DefaultJSONProvider
+    if name not in ('auto', 'orjson'):
+        raise ValueError(f'Unknown JSON_PROVIDER: {name}')
+    if orjson is None:
+        raise ValueError('JSON_PROVIDER=orjson requires the orjson package')
+    return OrjsonProvider
@@ -0,0 +1,169 @@
+"""
+Single-flight cache fills: at most one build of a cache key at a time.
+
+When a hot key expires, or a write moves its generation, every request for
+it misses at once and would rebuild it from the database. `read_through`
+in caching.py coalesces those misses at two levels:
+
+- `SingleFlight`: within a process, the first thread builds the value and
+  the others wait for it and share the result
+- `FillLock`: across processes, the process holding the key's lock builds
+  the value and the others poll the cache until it appears
+
+`AsyncSingleFlight` is the asyncio counterpart of `SingleFlight`, used by
+async_caching.py.
+"""
+
+import asyncio
+import threading
+import uuid
+from cachelib import RedisCache
+
+# Deletes the lock only if it still holds the caller's token, so a holder
+# whose lock expired never releases the lock of the process that took over
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def lock_key(key):
+    """Cache key of the fill lock of `key`."""
+    return f'lock:{key}'
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.failed = False
+
+
+class SingleFlight:
+    """Runs one call per key at a time in this process; concurrent callers share its result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def run(self, key, fn, wait):
+        """
+        Call `fn`, or wait for the call already running for `key`.
+
+        Args:
+            key: Cache key
+            fn: Callable producing the value
+            wait: Seconds to wait for another thread's call; after that,
+                or if it raised, `fn` is called in this thread
+
+        Returns:
+            The result of `fn`
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            if flight.done.wait(wait) and not flight.failed:
+                return flight.value
+            return fn()
+
+        try:
+            flight.value = fn()
+        except BaseException:
+            flight.failed = True
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.value
+
+
+class AsyncSingleFlight:
+    """`SingleFlight` for coroutines on one event loop."""
+
+    def __init__(self):
+        self._flights = {}
+
+    async def run(self, key, fn, wait):
+        """Await `fn()`, or the call already running for `key` (see SingleFlight.run)."""
+        flight = self._flights.get(key)
+        if flight is not None:
+            try:
+                return await asyncio.wait_for(asyncio.shield(flight), wait)
+            except asyncio.CancelledError:
+                # Only the other call was cancelled, not this one
+                if not flight.cancelled():
+                    raise
+            except Exception:
+                pass
+            return await fn()
+
+        flight = self._flights[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await fn()
+        except Exception as e:
+            flight.set_exception(e)
+            # Retrieved here, so a flight nobody waited for does not warn
+            flight.exception()
+            raise
+        except BaseException:
+            flight.cancel()
+            raise
+        else:
+            flight.set_result(value)
+        finally:
+            del self._flights[key]
+        return value
+
+
+class FillLock:
+    """
+    Cross-process lock on building a cache key.
+
+    With a Redis cache the lock is a `SET NX PX` key next to the cached
+    values, released by a compare-and-delete script; other backends use
+    their own `add`.
+
+    Args:
+        backend: cachelib backend of the Flask-Caching `cache`
+        ttl: Seconds a lock is held at most, so a crashed holder's lock
+            expires
+    """
+
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self.redis = backend._write_client if isinstance(backend, RedisCache) else None
+        if self.redis is not None:
+            self._release = self.redis.register_script(RELEASE_SCRIPT)
+
+    def _redis_key(self, key):
+        return self.backend.key_prefix + lock_key(key)
+
+    def acquire(self, key):
+        """Take the lock of `key` without waiting; returns a token, or None if it is held."""
+        token = uuid.uuid4().hex
+        if self.redis is not None:
+            acquired = self.redis.set(self._redis_key(key), token, nx=True, px=int(self.ttl * 1000))
+        else:
+            acquired = self.backend.add(lock_key(key), token, timeout=self.ttl)
+        return token if acquired else None
+
+    def held(self, key):
+        """Whether some process holds the lock of `key`."""
+        if self.redis is not None:
+            return bool(self.redis.exists(self._redis_key(key)))
+        return self.backend.has(lock_key(key))
+
+    def release(self, key, token):
+        """Release the lock of `key` if `token` still holds it."""
+        if self.redis is not None:
+            self._release(keys=[self._redis_key(key)], args=[token])
+        elif self.backend.get(lock_key(key)) == token:
+            self.backend.delete(lock_key(key))
@@ -1,12 +1,39 @@
 import pytest
 from flask import Flask
+from sqlalchemy import event
 from app import create_app
+from models import db
+
+
+def create_post(client, title='Hello', content='Body', author='Ava'):
+    """Create a post through the API (Flask or ASGI test client) and return its id."""
+    response = client.post('/api/posts', json={'title': title, 'content': content, 'author': author})
+    assert response.status_code == 201
+    # Werkzeug parses JSON in a property, httpx in a method
+    body = response.json() if callable(response.json) else response.json
+    return body['data']['id']
 
 @pytest.fixture
 def app():
-    app = create_app()
-    yield app
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
 
 @pytest.fixture
 def client(app):
-    return app.test_client()
\ No newline at end of file
+    return app.test_client()
+
+@pytest.fixture
+def query_counter(app):
+    """Collects every SQL statement executed against the test engine."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
@@ -0,0 +1,188 @@
+import threading
+import pytest
+from flask import request
+from admission import MemoryTokenBuckets, RedisTokenBuckets, classify, client_id, upstream_queue_time
+from app import create_app
+from config import TestingConfig
+from models import db
+
+BUDGETS = {
+    'read': {'rate': None, 'client_rate': 10, 'client_burst': 3, 'max_in_flight': None},
+    'expensive': {'rate': 2, 'burst': 2, 'client_rate': None, 'max_in_flight': 1, 'max_queue_ms': 0},
+    'write': {'rate': None, 'client_rate': None, 'max_in_flight': None},
+    'export': {'rate': None, 'client_rate': None, 'max_in_flight': 1, 'max_queue_ms': 100},
+}
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(TestingConfig, 'ADMISSION_ENABLED', True)
+    monkeypatch.setattr(TestingConfig, 'ADMISSION_BUDGETS', BUDGETS)
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+class TestTokenBuckets:
+    def test_burst_then_refill(self, monkeypatch):
+        clock = [100.0]
+        monkeypatch.setattr('admission.time.monotonic', lambda: clock[0])
+        buckets = MemoryTokenBuckets()
+
+        assert [buckets.take('a', rate=2, burst=3) for _ in range(3)] == [0, 0, 0]
+        assert buckets.take('a', rate=2, burst=3) == 0.5
+        assert buckets.take('b', rate=2, burst=3) == 0
+
+        clock[0] += 0.5
+        assert buckets.take('a', rate=2, burst=3) == 0
+
+    def test_negative_cost_gives_tokens_back_up_to_burst(self):
+        buckets = MemoryTokenBuckets()
+
+        assert buckets.take('a', rate=0.001, burst=2) == 0
+        assert buckets.take('a', rate=0.001, burst=2, cost=-5) == 0
+        assert [buckets.take('a', rate=0.001, burst=2) for _ in range(2)] == [0, 0]
+        assert buckets.take('a', rate=0.001, burst=2) > 0
+
+    def test_redis_errors_fall_back_to_memory(self):
+        class DownRedis:
+            def register_script(self, script):
+                def run(keys, args):
+                    raise ConnectionError('Redis is down')
+                return run
+
+        buckets = RedisTokenBuckets(DownRedis())
+
+        assert buckets.take('a', rate=1, burst=1) == 0
+        assert buckets.take('a', rate=1, burst=1) > 0
+
+
+class TestClassify:
+    def test_costly_requests(self, app):
+        cases = {
+            ('/api/posts', 'GET'): 'read',
+            ('/api/posts?page=21', 'GET'): 'expensive',
+            ('/api/posts?page=21&cursor=abc', 'GET'): 'read',
+            ('/api/posts?per_page=100', 'GET'): 'expensive',
+            ('/api/posts?search=flask', 'GET'): 'expensive',
+            ('/api/posts', 'POST'): 'write',
+            ('/api/export/posts', 'GET'): 'export',
+        }
+        for (path, method), expected in cases.items():
+            with app.test_request_context(path, method=method):
+                assert classify(request, app.config) == expected, path
+
+    def test_client_id_trusts_only_our_proxies(self, app):
+        def identify(forwarded_for, header='X-Forwarded-For', hops=0):
+            config = dict(app.config, ADMISSION_CLIENT_HEADER=header, ADMISSION_TRUSTED_PROXIES=hops)
+            with app.test_request_context(headers={'X-Forwarded-For': forwarded_for},
+                                          environ_base={'REMOTE_ADDR': '10.0.0.9'}):
+                return client_id(request, config)
+
+        # A forged leftmost entry is never believed
+        assert identify('1.1.1.1, 203.0.113.7', hops=1) == '203.0.113.7'
+        assert identify('1.1.1.1, 203.0.113.7, 10.0.0.5', hops=2) == '203.0.113.7'
+        # Without trusted proxies, or with fewer entries than proxies, the peer address
+        assert identify('1.1.1.1, 203.0.113.7') == '10.0.0.9'
+        assert identify('203.0.113.7', hops=2) == '10.0.0.9'
+        assert identify('203.0.113.7', header=None, hops=1) == '10.0.0.9'
+
+    def test_upstream_queue_time(self):
+        assert upstream_queue_time('t=1000.5', now=1001.0) == 0.5
+        assert upstream_queue_time('t=1700000000500', now=1700000001.0) == pytest.approx(0.5)
+        assert upstream_queue_time('1700000000000000', now=1700000001.0) == pytest.approx(1.0)
+        assert upstream_queue_time('garbage') == 0.0
+        assert upstream_queue_time(None) == 0.0
+
+
+class TestAdmission:
+    def test_client_rate_limit(self, client):
+        for _ in range(3):
+            assert client.get('/api/posts').status_code == 200
+
+        response = client.get('/api/posts')
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == '1'
+        assert response.get_json() == {'success': False, 'error': 'Too many requests, retry later'}
+
+        # Other clients and exempt endpoints are unaffected
+        assert client.get('/api/posts', environ_base={'REMOTE_ADDR': '10.0.0.2'}).status_code == 200
+        assert client.get('/health').status_code == 200
+
+    def test_costly_requests_get_the_stricter_budget(self, client):
+        statuses = [client.get(f'/api/posts?search=word{i}').status_code for i in range(3)]
+
+        assert statuses == [200, 200, 503]
+        # Cached reads have their own, larger budget
+        assert client.get('/api/posts').status_code == 200
+
+    def test_cost_classes_of_a_route_have_separate_budgets(self, app, client):
+        entered, leave = threading.Event(), threading.Event()
+
+        def slow():
+            if request.args.get('search'):
+                entered.set()
+                leave.wait(5)
+            return {'success': True}
+        app.add_url_rule('/slow', 'slow', slow)
+        budgets = dict(BUDGETS, read=dict(BUDGETS['read'], client_rate=None, max_in_flight=4, max_queue_ms=0))
+        app.config['ADMISSION_BUDGETS'] = budgets
+
+        search = threading.Thread(target=lambda: app.test_client().get('/slow?search=word'))
+        search.start()
+        assert entered.wait(5)
+        try:
+            # The one search slot is taken, the read slots are not
+            assert client.get('/slow?search=other').status_code == 503
+            assert [client.get('/slow').status_code for _ in range(5)] == [200] * 5
+        finally:
+            leave.set()
+            search.join()
+
+        # Searches spent the route's search bucket (2 tokens), not its reads'
+        assert client.get('/slow?search=third').status_code == 503
+        assert client.get('/slow').status_code == 200
+
+    def test_route_rejection_does_not_spend_the_client_token(self, app, client):
+        app.config['ADMISSION_BUDGETS'] = dict(
+            BUDGETS, read={'rate': 0.001, 'burst': 1, 'client_rate': 0.001, 'client_burst': 2, 'max_in_flight': None}
+        )
+
+        assert client.get('/api/posts').status_code == 200
+        # The route bucket is empty; the client keeps its last token
+        assert [client.get('/api/posts').status_code for _ in range(3)] == [503] * 3
+
+    def test_in_flight_cap(self, app, client):
+        entered, leave = threading.Event(), threading.Event()
+
+        def slow():
+            entered.set()
+            leave.wait(5)
+            return {'success': True}
+        app.add_url_rule('/slow', 'slow', slow)
+        app.config['ADMISSION_ROUTE_CLASSES'] = {'slow': 'export'}
+
+        first = threading.Thread(target=lambda: app.test_client().get('/slow'))
+        first.start()
+        assert entered.wait(5)
+        try:
+            # The one slot stays taken for longer than the 100 ms budget
+            response = client.get('/slow')
+            assert response.status_code == 503
+            assert response.headers['Retry-After'] == '1'
+        finally:
+            leave.set()
+            first.join()
+
+        assert client.get('/slow').status_code == 200
+
+    def test_queue_time_budget(self, app, client):
+        app.config['ADMISSION_ROUTE_CLASSES'] = {'posts.get_all_posts': 'export'}
+
+        response = client.get('/api/posts', headers={'X-Request-Start': 't=1000'})
+
+        assert response.status_code == 503
+        assert client.get('/api/posts').status_code == 200
@@ -0,0 +1,209 @@
+import asyncio
+import pytest
+import async_api
+from sqlalchemy import update
+from starlette.testclient import TestClient
+from async_api import async_database_uri, create_asgi_app, create_async_engine_for
+from config import config, TestingConfig
+from models import db, Post
+from search import SearchBackend
+from tests.conftest import create_post
+
+
+@pytest.fixture
+def asgi_app(tmp_path):
+    # A file database: the async engine and the Flask fallback share it
+    config['asgi_test'] = type('AsgiTestConfig', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/asgi.db',
+    })
+    app = create_asgi_app('asgi_test')
+    with app.state.flask_app.app_context():
+        db.create_all()
+    yield app
+    with app.state.flask_app.app_context():
+        db.engine.dispose()
+    del config['asgi_test']
+
+
+@pytest.fixture
+def asgi_client(asgi_app):
+    with TestClient(asgi_app) as client:
+        yield client
+
+
+class TestAsyncPosts:
+    def test_crud(self, asgi_client):
+        post_id = create_post(asgi_client)
+
+        response = asgi_client.put(f'/api/posts/{post_id}', json={'title': 'Edited'})
+        assert response.status_code == 200
+        assert response.json()['data']['title'] == 'Edited'
+
+        body = asgi_client.get(f'/api/posts/{post_id}').json()
+        assert body['data']['title'] == 'Edited'
+        assert body['data']['comments'] == []
+
+        assert asgi_client.delete(f'/api/posts/{post_id}').status_code == 200
+        assert asgi_client.get(f'/api/posts/{post_id}').status_code == 404
+
+    def test_validation_matches_flask(self, asgi_client):
+        response = asgi_client.post('/api/posts', json={'title': 'No body'})
+        assert response.status_code == 400
+        assert response.json() == {'success': False, 'error': 'Title, content, and author are required'}
+
+        assert asgi_client.post('/api/posts', content=b'not json').json()['error'] == 'Request body is required'
+        assert asgi_client.put('/api/posts/999', json={'title': 'x'}).status_code == 404
+
+    def test_offset_and_cursor_pagination(self, asgi_client):
+        for i in range(5):
+            create_post(asgi_client, f'Post {i}')
+
+        body = asgi_client.get('/api/posts?page=2&per_page=2').json()
+        assert [post['title'] for post in body['data']] == ['Post 2', 'Post 1']
+        assert body['pagination'] == {
+            'page': 2, 'per_page': 2, 'total': 5, 'pages': 3, 'has_next': True, 'has_prev': True
+        }
+
+        first = asgi_client.get('/api/posts?cursor=&per_page=2').json()
+        token = first['pagination']['next_cursor']
+        second = asgi_client.get(f'/api/posts?cursor={token}&per_page=2').json()
+        assert [post['title'] for post in second['data']] == ['Post 2', 'Post 1']
+
+        assert asgi_client.get('/api/posts?cursor=forged').status_code == 400
+
+    def test_cursors_are_interchangeable_with_flask(self, asgi_app, asgi_client):
+        for i in range(3):
+            create_post(asgi_client, f'Post {i}')
+        token = asgi_client.get('/api/posts?cursor=&per_page=1').json()['pagination']['next_cursor']
+
+        flask_client = asgi_app.state.flask_app.test_client()
+        body = flask_client.get(f'/api/posts?cursor={token}&per_page=1').get_json()
+        assert [post['title'] for post in body['data']] == ['Post 1']
+
+    def test_search_falls_back_to_flask(self, asgi_client):
+        create_post(asgi_client, 'Async servers')
+        create_post(asgi_client, 'Something else')
+
+        body = asgi_client.get('/api/posts?search=async').json()
+        assert [post['title'] for post in body['data']] == ['Async servers']
+
+
+    def test_search_backend_runs_off_the_event_loop(self, asgi_client, monkeypatch):
+        calls = []
+
+        def post_saved(self, post):
+            try:
+                asyncio.get_running_loop()
+                calls.append('event loop')
+            except RuntimeError:
+                calls.append('thread')
+        monkeypatch.setattr(SearchBackend, 'post_saved', post_saved)
+
+        create_post(asgi_client)
+        assert calls == ['thread']
+
+
+class TestAsyncComments:
+    def test_comment_writes_maintain_post_aggregates(self, asgi_client):
+        post_id = create_post(asgi_client)
+
+        response = asgi_client.post('/api/comments', json={'post_id': post_id, 'author': 'Bo', 'content': 'Hi', 'rating': 4})
+        assert response.status_code == 201
+        comment_id = response.json()['data']['id']
+        asgi_client.put(f'/api/comments/{comment_id}', json={'rating': 2})
+
+        post = asgi_client.get(f'/api/posts/{post_id}').json()['data']
+        assert (post['comment_count'], post['average_rating']) == (1, 2.0)
+        assert [comment['id'] for comment in post['comments']] == [comment_id]
+
+        assert asgi_client.delete(f'/api/comments/{comment_id}').status_code == 200
+        post = asgi_client.get(f'/api/posts/{post_id}').json()['data']
+        assert (post['comment_count'], post['average_rating']) == (0, None)
+
+    def test_listings(self, asgi_client):
+        post_id = create_post(asgi_client)
+        for i in range(3):
+            asgi_client.post('/api/comments', json={'post_id': post_id, 'author': 'Bo', 'content': f'#{i}'})
+
+        assert asgi_client.get('/api/comments').json()['pagination']['total'] == 3
+        assert asgi_client.get(f'/api/comments?post_id={post_id}').json()['pagination']['total'] == 3
+        body = asgi_client.get(f'/api/comments/post/{post_id}?per_page=2').json()
+        assert [comment['content'] for comment in body['data']] == ['#2', '#1']
+
+        assert asgi_client.get('/api/comments/post/999').status_code == 404
+        assert asgi_client.post('/api/comments', json={'post_id': 999, 'author': 'Bo', 'content': 'x'}).status_code == 404
+
+    def test_comment_writes_update_rankings(self, asgi_client):
+        first = create_post(asgi_client, 'First')
+        second = create_post(asgi_client, 'Second')
+        asgi_client.post('/api/comments', json={'post_id': first, 'author': 'Bo', 'content': 'x', 'rating': 2})
+        assert [post['id'] for post in asgi_client.get('/api/posts/trending').json()['data']] == [first]
+
+        response = asgi_client.post('/api/comments', json={'post_id': second, 'author': 'Bo', 'content': 'x', 'rating': 5})
+        asgi_client.post('/api/comments', json={'post_id': second, 'author': 'Bo', 'content': 'y'})
+        assert [post['id'] for post in asgi_client.get('/api/posts/trending').json()['data']] == [second, first]
+        assert [post['id'] for post in asgi_client.get('/api/posts/top-rated').json()['data']] == [second, first]
+
+        asgi_client.delete(f"/api/comments/{response.json()['data']['id']}")
+        assert [post['id'] for post in asgi_client.get('/api/posts/top-rated').json()['data']] == [first]
+
+
+class TestSharedCache:
+    def test_flask_and_async_share_entries(self, asgi_app, asgi_client):
+        create_post(asgi_client)
+        flask_client = asgi_app.state.flask_app.test_client()
+        assert flask_client.get('/api/posts').status_code == 200
+
+        # Changed behind the cache's back: the async route must serve the
+        # page the Flask route cached
+        with asgi_app.state.flask_app.app_context():
+            db.session.execute(update(Post).values(title='Changed'))
+            db.session.commit()
+        assert asgi_client.get('/api/posts').json()['data'][0]['title'] == 'Hello'
+
+        # A write through the fallback invalidates it for both
+        response = asgi_client.post('/api/posts/batch', json={'items': [{'title': 'New', 'content': 'B', 'author': 'C'}]})
+        assert response.status_code == 201
+        titles = [post['title'] for post in asgi_client.get('/api/posts').json()['data']]
+        assert titles == ['New', 'Changed']
+
+    def test_flask_and_async_send_the_same_etags(self, asgi_app, asgi_client):
+        create_post(asgi_client)
+        flask_client = asgi_app.state.flask_app.test_client()
+
+        response = asgi_client.get('/api/posts')
+        flask_response = flask_client.get('/api/posts')
+        assert response.headers['ETag'] == flask_response.headers['ETag']
+        assert response.content == flask_response.data
+
+        response = asgi_client.get('/api/posts', headers={'If-None-Match': flask_response.headers['ETag']})
+        assert response.status_code == 304
+        assert response.headers['Cache-Control'] == 'no-cache'
+
+
+class TestAsyncEngine:
+    def test_async_drivers(self):
+        assert async_database_uri('sqlite:///blog.db').drivername == 'sqlite+aiosqlite'
+        assert async_database_uri('postgresql://u:p@db/blog').drivername == 'postgresql+asyncpg'
+        assert async_database_uri('postgresql+psycopg2://u:p@db/blog').drivername == 'postgresql+asyncpg'
+        with pytest.raises(ValueError):
+            async_database_uri('mysql://u:p@db/blog')
+
+    def test_statement_timeout_uses_asyncpg_server_settings(self, asgi_app, monkeypatch):
+        created = {}
+        monkeypatch.setattr(async_api, 'create_async_engine', lambda url, **options: created.update(url=url, **options))
+        flask_app = asgi_app.state.flask_app
+        flask_app.config.update(
+            SQLALCHEMY_DATABASE_URI='postgresql://u:p@localhost/blog',
+            SQLALCHEMY_ENGINE_OPTIONS={'pool_size': 3, 'poolclass': object, 'connect_args': {'options': '-c x=1'}},
+            DB_STATEMENT_TIMEOUT_MS=2500,
+        )
+
+        create_async_engine_for(flask_app)
+
+        assert created['url'].drivername == 'postgresql+asyncpg'
+        assert created['pool_size'] == 3
+        # The sync pool class and libpq options do not apply to asyncpg
+        assert 'poolclass' not in created
+        assert created['connect_args'] == {'server_settings': {'statement_timeout': '2500'}}
+
@@ -0,0 +1,159 @@
+from models import db, Post, Comment
+
+
+def _post(title='Hello'):
+    return {'title': title, 'content': 'Body', 'author': 'Ava'}
+
+
+def _create_posts(client, count):
+    response = client.post('/api/posts/batch', json={'items': [_post(f'Post {i}') for i in range(count)]})
+    return [item['id'] for item in response.get_json()['data']]
+
+
+def _aggregates(post_id):
+    post = db.session.get(Post, post_id)
+    db.session.refresh(post)
+    return post.comment_count, post.rating_sum, post.rating_count
+
+
+class TestPostBatch:
+    def test_create_returns_ids_in_order(self, client):
+        response = client.post('/api/posts/batch', json={'items': [_post('One'), _post('Two')]})
+
+        assert response.status_code == 201
+        ids = [item['id'] for item in response.get_json()['data']]
+        assert [db.session.get(Post, post_id).title for post_id in ids] == ['One', 'Two']
+
+    def test_atomic_batch_is_rejected_as_a_whole(self, client):
+        response = client.post('/api/posts/batch', json={'items': [_post(), {'title': 'No body'}]})
+
+        assert response.status_code == 400
+        errors = response.get_json()['data']
+        assert errors == [{'index': 1, 'success': False, 'error': 'Title, content, and author are required'}]
+        assert Post.query.count() == 0
+
+    def test_non_atomic_batch_applies_valid_items(self, client):
+        response = client.post('/api/posts/batch', json={'items': [_post(), 'oops'], 'atomic': False})
+
+        assert response.status_code == 207
+        data = response.get_json()['data']
+        assert data[0]['success'] is True
+        assert data[1] == {'index': 1, 'success': False, 'error': 'Item must be an object'}
+        assert Post.query.count() == 1
+
+    def test_rejects_malformed_and_oversized_batches(self, app, client):
+        assert client.post('/api/posts/batch', json={'items': []}).status_code == 400
+        assert client.post('/api/posts/batch', json={'items': [_post()], 'atomic': 'no'}).status_code == 400
+
+        app.config['BATCH_MAX_ITEMS'] = 2
+        response = client.post('/api/posts/batch', json={'items': [_post()] * 3})
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'A batch can contain at most 2 items'
+
+    def test_update_checks_existence_with_one_query(self, client, query_counter):
+        ids = _create_posts(client, 3)
+        query_counter.clear()
+
+        response = client.put('/api/posts/batch', json={'items': [
+            {'id': ids[0], 'title': 'Changed'},
+            {'id': ids[1], 'title': 'Also changed'},
+            {'id': ids[2], 'content': 'New body'},
+        ]})
+
+        assert response.status_code == 200
+        selects = [s for s in query_counter if s.lstrip().upper().startswith('SELECT')]
+        assert len(selects) == 1
+        assert db.session.get(Post, ids[0]).title == 'Changed'
+        assert db.session.get(Post, ids[2]).content == 'New body'
+
+    def test_update_reports_missing_and_duplicate_ids(self, client):
+        [post_id] = _create_posts(client, 1)
+
+        response = client.put('/api/posts/batch', json={'atomic': False, 'items': [
+            {'id': post_id, 'title': 'Changed'},
+            {'id': post_id, 'title': 'Again'},
+            {'id': 999, 'title': 'Missing'},
+        ]})
+
+        assert response.status_code == 207
+        errors = [item.get('error') for item in response.get_json()['data']]
+        assert errors == [None, 'Duplicate id in batch', 'Post not found']
+        assert db.session.get(Post, post_id).title == 'Changed'
+
+    def test_delete_removes_posts_and_comments(self, client):
+        ids = _create_posts(client, 2)
+        client.post('/api/comments', json={'post_id': ids[0], 'author': 'Sam', 'content': 'Nice'})
+
+        response = client.delete('/api/posts/batch', json={'ids': ids})
+
+        assert response.status_code == 200
+        assert Post.query.count() == 0
+        assert Comment.query.count() == 0
+
+    def test_batch_writes_invalidate_cached_listing(self, client):
+        _create_posts(client, 1)
+        assert client.get('/api/posts').get_json()['pagination']['total'] == 1
+
+        _create_posts(client, 2)
+
+        assert client.get('/api/posts').get_json()['pagination']['total'] == 3
+
+
+class TestCommentBatch:
+    def test_create_updates_aggregates_per_post(self, client):
+        first, second = _create_posts(client, 2)
+
+        response = client.post('/api/comments/batch', json={'items': [
+            {'post_id': first, 'author': 'Sam', 'content': 'Nice', 'rating': 4},
+            {'post_id': first, 'author': 'Kim', 'content': 'Meh', 'rating': 2},
+            {'post_id': second, 'author': 'Lee', 'content': 'Unrated'},
+        ]})
+
+        assert response.status_code == 201
+        assert _aggregates(first) == (2, 6, 2)
+        assert _aggregates(second) == (1, 0, 0)
+
+    def test_create_checks_posts_with_one_query(self, client, query_counter):
+        first, second = _create_posts(client, 2)
+        query_counter.clear()
+
+        response = client.post('/api/comments/batch', json={'atomic': False, 'items': [
+            {'post_id': first, 'author': 'Sam', 'content': 'Nice'},
+            {'post_id': second, 'author': 'Kim', 'content': 'Nice'},
+            {'post_id': 999, 'author': 'Lee', 'content': 'Lost'},
+        ]})
+
+        assert response.status_code == 207
+        assert response.get_json()['data'][2]['error'] == 'Post not found'
+        selects = [s for s in query_counter if s.lstrip().upper().startswith('SELECT')]
+        assert len(selects) == 1
+        assert Comment.query.count() == 2
+
+    def test_update_and_delete_keep_aggregates_in_step(self, client):
+        [post_id] = _create_posts(client, 1)
+        response = client.post('/api/comments/batch', json={'items': [
+            {'post_id': post_id, 'author': 'Sam', 'content': 'Nice', 'rating': 4},
+            {'post_id': post_id, 'author': 'Kim', 'content': 'Meh'},
+        ]})
+        first, second = [item['id'] for item in response.get_json()['data']]
+
+        client.put('/api/comments/batch', json={'items': [
+            {'id': first, 'rating': None},
+            {'id': second, 'rating': 5, 'content': 'Better'},
+        ]})
+        assert _aggregates(post_id) == (2, 5, 1)
+        assert db.session.get(Comment, second).content == 'Better'
+
+        client.delete('/api/comments/batch', json={'ids': [second]})
+        assert _aggregates(post_id) == (1, 0, 0)
+
+    def test_atomic_delete_with_missing_id_changes_nothing(self, client):
+        [post_id] = _create_posts(client, 1)
+        response = client.post('/api/comments', json={'post_id': post_id, 'author': 'Sam', 'content': 'Nice'})
+        comment_id = response.get_json()['data']['id']
+
+        response = client.delete('/api/comments/batch', json={'ids': [comment_id, 999]})
+
+        assert response.status_code == 400
+        assert Comment.query.count() == 1
+        assert _aggregates(post_id) == (1, 0, 0)
@@ -0,0 +1,49 @@
+import json
+from benchmarks.bench_api import compare, main, percentile
+
+
+class TestBenchApi:
+    def test_percentile_uses_nearest_rank(self):
+        samples = list(range(1, 101))
+
+        assert percentile(samples, 0.50) == 50
+        assert percentile(samples, 0.95) == 95
+        assert percentile(samples, 0.99) == 99
+        assert percentile([], 0.5) == 0.0
+
+    def test_compare_flags_latency_and_query_regressions(self):
+        baseline = {'wsgi': {'list': {'p95_ms': 10.0, 'queries_per_request': 2.0, 'errors': 0}}}
+
+        within = {'wsgi': {'list': {'p95_ms': 11.0, 'queries_per_request': 2.0, 'errors': 0}}}
+        slower = {'wsgi': {'list': {'p95_ms': 13.0, 'queries_per_request': 2.0, 'errors': 0}}}
+        chattier = {'wsgi': {'list': {'p95_ms': 10.0, 'queries_per_request': 3.0, 'errors': 0}}}
+        new_scenario = {'wsgi': {'detail': {'p95_ms': 99.0, 'queries_per_request': 9.0, 'errors': 0}}}
+
+        assert compare(within, baseline, 0.2) == []
+        assert len(compare(slower, baseline, 0.2)) == 1
+        assert len(compare(chattier, baseline, 0.2)) == 1
+        assert compare(new_scenario, baseline, 0.2) == []
+
+    def test_compare_flags_errors(self):
+        baseline = {'wsgi': {'list': {'p95_ms': 10.0, 'queries_per_request': 2.0, 'errors': 0}}}
+
+        # Fast because every request failed
+        failing = {'wsgi': {'list': {'p95_ms': 1.0, 'queries_per_request': 0.0, 'errors': 5}}}
+        failing_new = {'wsgi': {'detail': {'p95_ms': 1.0, 'queries_per_request': 0.0, 'errors': 1}}}
+
+        assert compare(failing, baseline, 0.2) == ['wsgi/list: errors 0 -> 5']
+        assert compare(failing_new, baseline, 0.2) == ['wsgi/detail: errors 1']
+
+    def test_small_run_saves_and_checks_baseline(self, tmp_path):
+        baseline = tmp_path / 'baseline.json'
+        args = [
+            '--posts', '20', '--comments', '100', '--requests', '3', '--warmup', '1',
+            '--transports', 'test-client', '--save-baseline', str(baseline)
+        ]
+
+        assert main(args) == 0
+
+        results = json.loads(baseline.read_text())['test-client']
+        assert results['post_detail_hot']['requests'] == 3
+        assert all(result['errors'] == 0 for result in results.values())
+        assert main(args[:-2] + ['--baseline', str(baseline), '--threshold', '1000']) == 0
@@ -0,0 +1,58 @@
+from tests.conftest import create_post
+
+
+class TestReadThroughCache:
+    def test_repeated_listing_is_served_from_cache(self, client, query_counter):
+        create_post(client)
+        client.get('/api/posts?page=1&per_page=10')
+
+        query_counter.clear()
+        response = client.get('/api/posts?per_page=10&page=1')
+
+        assert response.status_code == 200
+        assert len(response.get_json()['data']) == 1
+        assert query_counter == []
+
+    def test_search_key_is_case_insensitive(self, client, query_counter):
+        create_post(client)
+        client.get('/api/posts?search=Hello')
+
+        query_counter.clear()
+        client.get('/api/posts?search=hello')
+
+        assert query_counter == []
+
+    def test_post_update_invalidates_listing_and_detail(self, client):
+        post_id = create_post(client)
+        client.get('/api/posts')
+        client.get(f'/api/posts/{post_id}')
+
+        client.put(f'/api/posts/{post_id}', json={'title': 'Updated'})
+
+        assert client.get('/api/posts').get_json()['data'][0]['title'] == 'Updated'
+        assert client.get(f'/api/posts/{post_id}').get_json()['data']['title'] == 'Updated'
+
+    def test_comment_write_only_invalidates_its_post(self, client, query_counter):
+        first_id = create_post(client, 'First')
+        second_id = create_post(client, 'Second')
+        client.get(f'/api/posts/{first_id}')
+        client.get(f'/api/posts/{second_id}')
+
+        client.post('/api/comments', json={'post_id': first_id, 'author': 'Sam', 'content': 'Nice'})
+
+        query_counter.clear()
+        client.get(f'/api/posts/{second_id}')
+        assert query_counter == []
+
+        detail = client.get(f'/api/posts/{first_id}').get_json()['data']
+        assert detail['comment_count'] == 1
+        assert len(detail['comments']) == 1
+
+    def test_deleted_post_is_not_served_from_cache(self, client):
+        post_id = create_post(client)
+        client.get(f'/api/posts/{post_id}')
+
+        client.delete(f'/api/posts/{post_id}')
+
+        assert client.get(f'/api/posts/{post_id}').status_code == 404
+        assert client.get('/api/posts').get_json()['data'] == []
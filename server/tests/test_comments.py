@@ -0,0 +1,57 @@
+from commands import find_aggregate_drift, reconcile_post_aggregates
+from models import db, Post, Comment
+from tests.conftest import create_post
+
+
+def _aggregates(post_id):
+    post = db.session.get(Post, post_id)
+    db.session.refresh(post)
+    return post.comment_count, post.rating_sum, post.rating_count
+
+
+class TestCommentAggregates:
+    def test_create_updates_aggregates(self, client):
+        post_id = create_post(client)
+
+        client.post('/api/comments', json={'post_id': post_id, 'author': 'Sam', 'content': 'Nice', 'rating': 4})
+        client.post('/api/comments', json={'post_id': post_id, 'author': 'Kim', 'content': 'Meh'})
+
+        assert _aggregates(post_id) == (2, 4, 1)
+        data = client.get(f'/api/posts/{post_id}').get_json()['data']
+        assert data['comment_count'] == 2
+        assert data['average_rating'] == 4
+
+    def test_rating_changes_update_aggregates(self, client):
+        post_id = create_post(client)
+        response = client.post('/api/comments', json={'post_id': post_id, 'author': 'Sam', 'content': 'Nice', 'rating': 4})
+        comment_id = response.get_json()['data']['id']
+
+        client.put(f'/api/comments/{comment_id}', json={'rating': 2})
+        assert _aggregates(post_id) == (1, 2, 1)
+
+        client.put(f'/api/comments/{comment_id}', json={'rating': None})
+        assert _aggregates(post_id) == (1, 0, 0)
+
+        client.put(f'/api/comments/{comment_id}', json={'rating': 5})
+        assert _aggregates(post_id) == (1, 5, 1)
+
+    def test_delete_updates_aggregates(self, client):
+        post_id = create_post(client)
+        response = client.post('/api/comments', json={'post_id': post_id, 'author': 'Sam', 'content': 'Nice', 'rating': 3})
+        comment_id = response.get_json()['data']['id']
+
+        client.delete(f'/api/comments/{comment_id}')
+
+        assert _aggregates(post_id) == (0, 0, 0)
+
+    def test_reconcile_repairs_drift(self, client):
+        post_id = create_post(client)
+        db.session.add(Comment(post_id=post_id, author='Sam', content='Direct insert', rating=5))
+        db.session.commit()
+
+        assert find_aggregate_drift() == [(post_id, (0, 0, 0), (1, 5, 1))]
+
+        reconcile_post_aggregates()
+
+        assert find_aggregate_drift() == []
+        assert _aggregates(post_id) == (1, 5, 1)
@@ -0,0 +1,94 @@
+import gzip
+import json
+import brotli
+import zstandard
+from compression import compress_stream, negotiate
+from tests.conftest import create_post
+
+
+def _decode(data, coding):
+    if coding == 'zstd':
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    if coding == 'br':
+        return brotli.decompress(data)
+    return gzip.decompress(data)
+
+
+class TestNegotiation:
+    def test_server_preference_breaks_ties(self):
+        assert negotiate('gzip, deflate, br, zstd', ['zstd', 'br', 'gzip']) == 'zstd'
+        assert negotiate('gzip, br', ['zstd', 'br', 'gzip']) == 'br'
+
+    def test_quality_values(self):
+        assert negotiate('br;q=0.5, gzip', ['zstd', 'br', 'gzip']) == 'gzip'
+        assert negotiate('gzip;q=0, *;q=0.5', ['gzip']) is None
+        assert negotiate('*', ['zstd', 'gzip']) == 'zstd'
+        assert negotiate('identity', ['gzip']) is None
+        assert negotiate(None, ['gzip']) is None
+
+    def test_stream_chunks_decode_as_they_arrive(self):
+        chunks = compress_stream([b'{"id":1}\n', b'{"id":2}\n'], 'gzip', 6)
+        decoder = gzip.zlib.decompressobj(31)
+        assert decoder.decompress(next(chunks)) == b'{"id":1}\n'
+        assert decoder.decompress(next(chunks)) == b'{"id":2}\n'
+        decoder.decompress(b''.join(chunks))
+        assert decoder.eof
+
+
+class TestCompressedResponses:
+    def test_large_responses_are_compressed(self, client):
+        create_post(client, content='word ' * 2000)
+        plain = client.get('/api/posts?fields=full')
+
+        for coding in ('zstd', 'br', 'gzip'):
+            response = client.get('/api/posts?fields=full', headers={'Accept-Encoding': coding})
+            assert response.headers['Content-Encoding'] == coding
+            assert 'Accept-Encoding' in response.headers['Vary']
+            assert len(response.data) < len(plain.data)
+            assert json.loads(_decode(response.data, coding)) == plain.get_json()
+            assert response.headers['ETag'] == plain.headers['ETag'][:-1] + f'-{coding}"'
+
+    def test_small_responses_are_not(self, client):
+        create_post(client)
+        response = client.get('/api/posts', headers={'Accept-Encoding': 'gzip'})
+
+        assert 'Content-Encoding' not in response.headers
+        assert response.headers['Vary'] == 'Accept-Encoding'
+
+    def test_compressed_bodies_are_cached(self, client, monkeypatch):
+        post_id = create_post(client, content='word ' * 2000)
+        client.get(f'/api/posts/{post_id}', headers={'Accept-Encoding': 'gzip'})
+
+        calls = []
+        monkeypatch.setattr('compression.compress', lambda *args: calls.append(args))
+        response = client.get(f'/api/posts/{post_id}', headers={'Accept-Encoding': 'gzip'})
+
+        assert calls == []
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert json.loads(gzip.decompress(response.data))['data']['id'] == post_id
+
+        # A write moves the generation, so the cached body is not reused
+        client.put(f'/api/posts/{post_id}', json={'title': 'Edited'})
+        monkeypatch.undo()
+        response = client.get(f'/api/posts/{post_id}', headers={'Accept-Encoding': 'gzip'})
+        assert json.loads(gzip.decompress(response.data))['data']['title'] == 'Edited'
+
+    def test_compressed_etag_revalidates(self, client):
+        create_post(client, content='word ' * 2000)
+        etag = client.get('/api/posts?fields=full', headers={'Accept-Encoding': 'br'}).headers['ETag']
+
+        response = client.get('/api/posts?fields=full', headers={'Accept-Encoding': 'br', 'If-None-Match': etag})
+
+        assert response.status_code == 304
+        assert response.headers['ETag'] == etag
+
+    def test_streamed_exports_are_compressed(self, client):
+        for i in range(3):
+            create_post(client, f'Post {i}')
+
+        response = client.get('/api/export/posts', headers={'Accept-Encoding': 'zstd'})
+
+        assert response.headers['Content-Encoding'] == 'zstd'
+        assert 'Content-Length' not in response.headers
+        lines = _decode(response.get_data(), 'zstd').splitlines()
+        assert [json.loads(line)['title'] for line in lines] == ['Post 0', 'Post 1', 'Post 2']
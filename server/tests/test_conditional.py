@@ -0,0 +1,113 @@
+from datetime import datetime, timezone
+from werkzeug.http import http_date
+from conditional import Validators, key_time_ms
+from config import config, TestingConfig
+from app import create_app
+from models import db
+from tests.conftest import create_post
+
+
+class TestValidators:
+    KEY = 'posts:list:1700000000500.1700000002250:abc'
+
+    def test_last_modified_is_the_newest_generation(self):
+        assert key_time_ms(self.KEY) == 1700000002250
+
+        validators = Validators.for_key(self.KEY, 'OrjsonProvider', now_ms=1700000005000)
+        assert validators.last_modified == datetime.fromtimestamp(1700000002, timezone.utc)
+        assert validators.headers()['Last-Modified'] == http_date(1700000002)
+
+    def test_last_modified_waits_for_the_second_to_end(self):
+        # Another write within the same second would not change it
+        assert Validators.for_key(self.KEY, 'OrjsonProvider', now_ms=1700000002900).last_modified is None
+
+    def test_etag_depends_on_key_and_encoder(self):
+        etag = Validators.for_key(self.KEY, 'OrjsonProvider').etag
+        assert Validators.for_key(self.KEY, 'OrjsonProvider').etag == etag
+        assert Validators.for_key(self.KEY, 'DefaultJSONProvider').etag != etag
+        assert Validators.for_key(self.KEY.replace('abc', 'abd'), 'OrjsonProvider').etag != etag
+        assert Validators.for_key(None, 'OrjsonProvider') is None
+
+    def test_matching(self):
+        validators = Validators.for_key(self.KEY, 'OrjsonProvider', now_ms=1700000005000)
+        etag = validators.headers()['ETag']
+
+        assert validators.matches({'If-None-Match': etag})
+        assert validators.matches({'If-None-Match': f'"other", W/{etag}'})
+        assert validators.matches({'If-None-Match': '*'})
+        assert not validators.matches({'If-None-Match': '"other"'})
+        assert validators.matches({'If-Modified-Since': http_date(1700000002)})
+        assert not validators.matches({'If-Modified-Since': http_date(1700000001)})
+        assert not validators.matches({'If-Modified-Since': 'garbage'})
+        # If-None-Match takes precedence
+        assert not validators.matches({'If-None-Match': '"other"', 'If-Modified-Since': http_date(1700000002)})
+        assert not validators.matches({})
+
+
+class TestConditionalGet:
+    def test_matching_etag_gets_304_without_queries(self, client, query_counter):
+        create_post(client)
+        response = client.get('/api/posts')
+        etag = response.headers['ETag']
+        assert response.headers['Cache-Control'] == 'no-cache'
+
+        query_counter.clear()
+        response = client.get('/api/posts', headers={'If-None-Match': etag})
+
+        assert response.status_code == 304
+        assert response.data == b''
+        assert response.headers['ETag'] == etag
+        assert response.headers['Cache-Control'] == 'no-cache'
+        assert query_counter == []
+
+    def test_write_changes_the_etag(self, client):
+        post_id = create_post(client)
+        listing = client.get('/api/posts').headers['ETag']
+        detail = client.get(f'/api/posts/{post_id}').headers['ETag']
+        comments = client.get(f'/api/comments/post/{post_id}').headers['ETag']
+        all_comments = client.get('/api/comments').headers['ETag']
+
+        client.post('/api/comments', json={'post_id': post_id, 'author': 'Sam', 'content': 'Nice'})
+
+        for path, etag in (
+            ('/api/posts', listing), (f'/api/posts/{post_id}', detail),
+            (f'/api/comments/post/{post_id}', comments), ('/api/comments', all_comments),
+        ):
+            response = client.get(path, headers={'If-None-Match': etag})
+            assert response.status_code == 200
+            assert response.headers['ETag'] != etag
+
+    def test_parameters_change_the_etag(self, client):
+        create_post(client)
+        assert client.get('/api/posts?per_page=5').headers['ETag'] != client.get('/api/posts').headers['ETag']
+
+    def test_if_modified_since(self, client, monkeypatch):
+        create_post(client)
+        # Let the write fall into a past second
+        monkeypatch.setattr('conditional.time.time', lambda: 2 ** 40)
+        last_modified = client.get('/api/posts').headers['Last-Modified']
+
+        assert client.get('/api/posts', headers={'If-Modified-Since': last_modified}).status_code == 304
+
+    def test_errors_have_no_validators(self, client):
+        response = client.get('/api/posts/999')
+        assert response.status_code == 404
+        assert 'ETag' not in response.headers
+
+    def test_cache_control_per_endpoint(self):
+        config['conditional_test'] = type('ConditionalTestConfig', (TestingConfig,), {
+            'HTTP_CACHE_CONTROL': {'posts.get_post': 'public, max-age=60'},
+        })
+        try:
+            app = create_app('conditional_test')
+            with app.app_context():
+                db.create_all()
+                client = app.test_client()
+                post_id = create_post(client)
+
+                assert client.get(f'/api/posts/{post_id}').headers['Cache-Control'] == 'public, max-age=60'
+                assert client.get('/api/posts').headers['Cache-Control'] == 'no-cache'
+                db.session.remove()
+                db.drop_all()
+        finally:
+            del config['conditional_test']
@@ -0,0 +1,109 @@
+import threading
+import pytest
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from app import create_app
+from config import config, TestingConfig
+from database import InstrumentedQueuePool, configure_engine_options
+from flask import Flask
+from models import db
+
+
+def _configured(**settings):
+    app = Flask(__name__)
+    app.config.update(settings)
+    configure_engine_options(app)
+    return app.config['SQLALCHEMY_ENGINE_OPTIONS']
+
+
+class TestEngineOptions:
+    def test_queue_pool_is_instrumented(self):
+        options = _configured(
+            SQLALCHEMY_DATABASE_URI='sqlite:////tmp/pool.db',
+            SQLALCHEMY_ENGINE_OPTIONS={'pool_size': 3}
+        )
+
+        assert options['poolclass'] is InstrumentedQueuePool
+        assert options['pool_logging_name'] == 'primary'
+
+    def test_static_pool_engines_are_left_alone(self):
+        assert _configured(SQLALCHEMY_DATABASE_URI='sqlite://', SQLALCHEMY_ENGINE_OPTIONS={}) == {}
+
+    def test_statement_timeout_uses_startup_options(self):
+        options = _configured(
+            SQLALCHEMY_DATABASE_URI='postgresql://u:p@db/blog',
+            SQLALCHEMY_ENGINE_OPTIONS={'pool_size': 3},
+            DB_STATEMENT_TIMEOUT_MS=5000
+        )
+
+        assert options['connect_args'] == {'options': '-c statement_timeout=5000'}
+
+    def test_pgbouncer_mode_avoids_startup_options_and_prepared_statements(self):
+        options = _configured(
+            SQLALCHEMY_DATABASE_URI='postgresql+asyncpg://u:p@db/blog',
+            SQLALCHEMY_ENGINE_OPTIONS={'pool_size': 3},
+            DB_STATEMENT_TIMEOUT_MS=5000,
+            DB_PGBOUNCER=True
+        )
+
+        assert 'options' not in options['connect_args']
+        assert options['connect_args']['statement_cache_size'] == 0
+
+    def test_shared_config_dictionaries_are_not_mutated(self):
+        shared = {'pool_size': 3}
+        _configured(SQLALCHEMY_DATABASE_URI='sqlite:////tmp/pool.db', SQLALCHEMY_ENGINE_OPTIONS=shared)
+
+        assert shared == {'pool_size': 3}
+
+
+@pytest.fixture
+def pooled_app(tmp_path):
+    config['pool_test'] = type('PoolTestConfig', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/pool.db',
+        'SQLALCHEMY_ENGINE_OPTIONS': {'pool_size': 1, 'max_overflow': 0, 'pool_timeout': 0.05},
+        'METRICS_ENABLED': True,
+    })
+    app = create_app('pool_test')
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+    del config['pool_test']
+
+
+class TestPoolInstrumentation:
+    def test_exports_gauges_and_checkout_waits(self, pooled_app):
+        client = pooled_app.test_client()
+        with pooled_app.app_context():
+            db.create_all()
+
+        client.get('/api/posts')
+        body = client.get('/metrics').get_data(as_text=True)
+
+        assert 'db_pool_size{pool="primary"} 1' in body
+        assert 'db_pool_checked_out{pool="primary"} 0' in body
+        assert 'db_pool_saturation{pool="primary"} 0' in body
+        assert 'db_pool_checkout_wait_seconds_count{pool="primary"}' in body
+
+    def test_counts_checkout_timeouts(self, pooled_app):
+        with pooled_app.app_context():
+            held = db.engine.connect()
+            try:
+                failure = []
+                thread = threading.Thread(target=lambda: failure.append(_checkout(pooled_app)))
+                thread.start()
+                thread.join()
+            finally:
+                held.close()
+
+            assert failure == [True]
+            body = pooled_app.extensions['metrics'].render()
+            assert 'db_pool_timeouts_total{pool="primary"} 1' in body
+            assert 'db_pool_saturation{pool="primary"}' in body
+
+
+def _checkout(app):
+    with app.app_context():
+        try:
+            db.engine.connect().close()
+        except PoolTimeoutError:
+            return True
+    return False
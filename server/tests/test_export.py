@@ -0,0 +1,48 @@
+import gzip
+import json
+from datetime import datetime
+from models import db, Post, Comment
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def _seed():
+    old = Post(title='Old', content='Body', author='Ava', created_at=datetime(2026, 1, 1), updated_at=datetime(2026, 1, 1))
+    new = Post(title='New', content='Body', author='Ava', created_at=datetime(2026, 3, 1), updated_at=datetime(2026, 3, 1))
+    db.session.add_all([old, new])
+    db.session.flush()
+    db.session.add(Comment(post_id=new.id, author='Sam', content='Hi', rating=4))
+    db.session.commit()
+
+
+class TestExport:
+    def test_streams_posts_as_ndjson(self, client):
+        _seed()
+
+        response = client.get('/api/export/posts')
+
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        assert response.is_streamed
+        assert [post['title'] for post in _lines(response)] == ['Old', 'New']
+
+    def test_since_filters_by_updated_at(self, client):
+        _seed()
+
+        posts = _lines(client.get('/api/export/posts?since=2026-02-01T00:00:00Z'))
+
+        assert [post['title'] for post in posts] == ['New']
+
+    def test_comments_export_with_gzip(self, client):
+        _seed()
+
+        response = client.get('/api/export/comments?gzip=true')
+
+        assert response.headers['Content-Encoding'] == 'gzip'
+        comments = [json.loads(line) for line in gzip.decompress(response.get_data()).splitlines()]
+        assert [(comment['content'], comment['rating']) for comment in comments] == [('Hi', 4)]
+
+    def test_invalid_since_is_rejected(self, client):
+        assert client.get('/api/export/posts?since=yesterday').status_code == 400
@@ -0,0 +1,145 @@
+import pytest
+from ingest import CREATED, FAILED, PENDING, QueueFull, get_comment_queue, run_worker
+from tests.conftest import create_post
+
+
+@pytest.fixture
+def queued(app, tmp_path):
+    app.config['COMMENT_INGEST_MODE'] = 'queue'
+    app.config['COMMENT_QUEUE_PATH'] = str(tmp_path / 'comment_queue.db')
+    app.config['COMMENT_QUEUE_MAX_PENDING'] = 5
+    return app
+
+
+def _queue_comment(client, post_id, rating=None):
+    return client.post('/api/comments', json={'post_id': post_id, 'author': 'Bo', 'content': 'Hi', 'rating': rating})
+
+
+class TestQueuedCreate:
+    def test_accepted_then_created_by_the_worker(self, queued, client):
+        post_id = create_post(client)
+        response = _queue_comment(client, post_id, rating=4)
+
+        assert response.status_code == 202
+        data = response.get_json()['data']
+        assert data['status'] == PENDING
+        assert response.headers['Location'].endswith(f"/api/comments/ingest/{data['ticket']}")
+        assert client.get(response.headers['Location']).get_json()['data']['status'] == PENDING
+        assert client.get(f'/api/comments/post/{post_id}').get_json()['data'] == []
+
+        assert run_worker(batch_size=10, max_wait=0, once=True) == (1, 0)
+
+        status = client.get(response.headers['Location']).get_json()['data']
+        assert status['status'] == CREATED
+        comments = client.get(f'/api/comments/post/{post_id}').get_json()['data']
+        assert [comment['id'] for comment in comments] == [status['comment_id']]
+        post = client.get(f'/api/posts/{post_id}').get_json()['data']
+        assert post['comment_count'] == 1
+        assert post['average_rating'] == 4
+
+    def test_validation_still_happens_in_the_request(self, queued, client):
+        response = client.post('/api/comments', json={'post_id': 1, 'author': 'Bo'})
+
+        assert response.status_code == 400
+        assert get_comment_queue().pending() == 0
+
+    def test_comments_of_deleted_posts_fail(self, queued, client):
+        post_id = create_post(client)
+        kept = _queue_comment(client, post_id).get_json()['data']['ticket']
+        lost = _queue_comment(client, 999).get_json()['data']['ticket']
+
+        assert run_worker(batch_size=10, max_wait=0, once=True) == (1, 1)
+
+        assert client.get(f'/api/comments/ingest/{kept}').get_json()['data']['status'] == CREATED
+        status = client.get(f'/api/comments/ingest/{lost}').get_json()['data']
+        assert status == {'ticket': lost, 'status': FAILED, 'error': 'Post not found'}
+
+    def test_unknown_ticket(self, queued, client):
+        assert client.get('/api/comments/ingest/nope').status_code == 404
+
+    def test_full_queue_sheds_load(self, queued, client):
+        post_id = create_post(client)
+        for _ in range(5):
+            assert _queue_comment(client, post_id).status_code == 202
+
+        response = _queue_comment(client, post_id)
+
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '2'
+        with pytest.raises(QueueFull):
+            get_comment_queue().enqueue({'post_id': post_id, 'author': 'Bo', 'content': 'Hi', 'rating': None})
+
+        run_worker(batch_size=2, max_wait=0, once=True)
+        assert _queue_comment(client, post_id).status_code == 202
+
+
+class TestWorker:
+    def test_batches_and_retries(self, queued, client, monkeypatch):
+        post_id = create_post(client)
+        for _ in range(3):
+            _queue_comment(client, post_id)
+        queue = get_comment_queue()
+
+        def broken(rows):
+            raise RuntimeError('database down')
+        monkeypatch.setattr('routes.comments.insert_comments', broken)
+        assert run_worker(batch_size=10, max_wait=0, once=True) == (0, 0)
+        # The failed batch was released, not lost
+        assert queue.pending() == 3
+
+        monkeypatch.undo()
+        assert run_worker(batch_size=2, max_wait=0, once=True) == (3, 0)
+        assert queue.pending() == 0
+        assert client.get(f'/api/posts/{post_id}').get_json()['data']['comment_count'] == 3
+
+    def test_comment_that_keeps_failing_is_failed_alone(self, queued, client, monkeypatch):
+        from routes.comments import insert_comments
+        post_id = create_post(client)
+        tickets = [_queue_comment(client, post_id).get_json()['data']['ticket'] for _ in range(3)]
+        poison = client.post('/api/comments', json={'post_id': post_id, 'author': 'Bo', 'content': 'Poison'})
+        queue = get_comment_queue()
+
+        def fails_on_poison(rows):
+            if any(row['content'] == 'Poison' for row in rows):
+                raise RuntimeError('value too long')
+            return insert_comments(rows)
+        monkeypatch.setattr('routes.comments.insert_comments', fails_on_poison)
+
+        # Retried as a batch until the last attempt, then one by one
+        for _ in range(queued.config['INGEST_MAX_ATTEMPTS'] - 1):
+            assert run_worker(batch_size=10, max_wait=0, once=True) == (0, 0)
+            assert queue.pending() == 4
+        assert run_worker(batch_size=10, max_wait=0, once=True) == (3, 1)
+        assert queue.pending() == 0
+
+        assert [client.get(f'/api/comments/ingest/{ticket}').get_json()['data']['status'] for ticket in tickets] == \
+            [CREATED] * 3
+        status = client.get(f"/api/comments/ingest/{poison.get_json()['data']['ticket']}").get_json()['data']
+        assert status['status'] == FAILED
+        assert status['error'] == 'value too long'
+
+    def test_worker_dying_after_commit_does_not_duplicate(self, queued, client, monkeypatch):
+        queued.config['INGEST_CLAIM_TIMEOUT'] = 0
+        post_id = create_post(client)
+        ticket = _queue_comment(client, post_id).get_json()['data']['ticket']
+        queue = get_comment_queue()
+
+        def dies(created, failed):
+            raise RuntimeError('worker killed')
+        monkeypatch.setattr(queue, 'complete', dies)
+        assert run_worker(batch_size=10, max_wait=0, once=True) == (0, 0)
+        monkeypatch.undo()
+
+        # The comment was committed but its status never recorded
+        assert run_worker(batch_size=10, max_wait=0, once=True) == (1, 0)
+        assert client.get(f'/api/comments/ingest/{ticket}').get_json()['data']['status'] == CREATED
+        assert len(client.get(f'/api/comments/post/{post_id}').get_json()['data']) == 1
+        assert client.get(f'/api/posts/{post_id}').get_json()['data']['comment_count'] == 1
+
+    def test_cli_once(self, queued, client):
+        post_id = create_post(client)
+        _queue_comment(client, post_id)
+
+        result = queued.test_cli_runner().invoke(args=['ingest-comments', '--once', '--max-wait-ms', '0'])
+
+        assert 'Created 1 comment(s), 0 failed' in result.output
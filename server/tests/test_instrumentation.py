@@ -0,0 +1,79 @@
+import json
+import logging
+import re
+from instrumentation import Metrics
+from tests.conftest import create_post
+
+
+def _request_logs(caplog):
+    return [json.loads(r.getMessage()) for r in caplog.records if r.name == 'blogsite.requests']
+
+
+class TestRequestInstrumentation:
+    def test_server_timing_reports_queries_and_cache(self, client):
+        post_id = create_post(client)
+
+        miss = client.get(f'/api/posts/{post_id}')
+        hit = client.get(f'/api/posts/{post_id}')
+
+        assert re.match(r'db;dur=[\d.]+;desc="[1-9]\d* queries", app;dur=', miss.headers['Server-Timing'])
+        assert 'cache;desc="0 hits 1 misses"' in miss.headers['Server-Timing']
+        assert hit.headers['Server-Timing'].startswith('db;dur=0.0;desc="0 queries"')
+        assert 'cache;desc="1 hits 0 misses"' in hit.headers['Server-Timing']
+
+    def test_logs_one_structured_line_per_request(self, client, caplog):
+        caplog.set_level(logging.INFO, logger='blogsite.requests')
+        post_id = create_post(client)
+
+        client.get(f'/api/posts/{post_id}?include_comments=false')
+
+        record = _request_logs(caplog)[-1]
+        assert record['route'] == '/api/posts/<int:post_id>'
+        assert record['status'] == 200
+        assert record['queries'] == 1
+        assert record['slowest_query'].startswith('SELECT')
+        assert record['cache_misses'] == 1
+
+    def test_warns_when_request_exceeds_query_threshold(self, app, client, caplog):
+        app.config['N_PLUS_ONE_THRESHOLD'] = 1
+        post_id = create_post(client)
+
+        client.get(f'/api/posts/{post_id}')
+
+        alerts = [json.loads(r.getMessage()) for r in caplog.records if r.levelno == logging.WARNING]
+        assert alerts and alerts[-1]['alert'] == 'n_plus_one'
+        assert alerts[-1]['queries'] > 1
+
+    def test_metrics_endpoint_is_opt_in(self, app, client):
+        assert client.get('/metrics').status_code == 404
+
+        app.config['METRICS_ENABLED'] = True
+        client.get('/api/posts')
+        body = client.get('/metrics').get_data(as_text=True)
+
+        assert '# TYPE http_request_duration_seconds histogram' in body
+        assert 'http_request_duration_seconds_count{method="GET",route="/api/posts",status="200"} 1' in body
+        assert 'db_queries_total{route="/api/posts"}' in body
+
+
+class TestMetrics:
+    def test_histogram_buckets_are_cumulative(self):
+        metrics = Metrics()
+        metrics.observe('latency', 'Latency', 0.02, buckets=(0.01, 0.1), route='/a')
+        metrics.observe('latency', 'Latency', 0.005, buckets=(0.01, 0.1), route='/a')
+
+        body = metrics.render()
+
+        assert 'latency_bucket{route="/a",le="0.01"} 1' in body
+        assert 'latency_bucket{route="/a",le="0.1"} 2' in body
+        assert 'latency_bucket{route="/a",le="+Inf"} 2' in body
+        assert 'latency_count{route="/a"} 2' in body
+
+    def test_gauges_are_read_at_render_time(self):
+        metrics = Metrics()
+        value = {'n': 1}
+        metrics.gauge('pool_size', 'Pool size', lambda: [({'pool': 'primary'}, value['n'])])
+
+        value['n'] = 5
+
+        assert 'pool_size{pool="primary"} 5' in metrics.render()
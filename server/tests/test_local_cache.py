@@ -0,0 +1,169 @@
+import queue
+import threading
+import time
+from caching import POSTS_SCOPE, _generation_key, cache, get_generations
+from local_cache import InvalidationBus, LocalCache, LocalTier, get_local_tier, size_of
+from tests.conftest import create_post
+
+
+class FakeRedis:
+    """Just enough of redis.Redis pub/sub to connect InvalidationBus instances."""
+
+    def __init__(self):
+        self.subscribers = []
+
+    def publish(self, channel, message):
+        for subscriber in self.subscribers:
+            subscriber.put({'type': 'message', 'data': message})
+
+    def pubsub(self, ignore_subscribe_messages=True):
+        redis = self
+
+        class PubSub:
+            def subscribe(self, channel):
+                self.messages = queue.Queue()
+                redis.subscribers.append(self.messages)
+
+            def listen(self):
+                while True:
+                    yield self.messages.get()
+
+        return PubSub()
+
+
+class TestLocalCache:
+    def test_lru_eviction_by_count_and_size(self):
+        local = LocalCache(max_items=2, max_bytes=10)
+        local.set('a', b'1234', ttl=60)
+        local.set('b', b'1234', ttl=60)
+        local.get('a')
+        local.set('c', b'12', ttl=60)
+
+        assert (local.get('a'), local.get('b'), local.get('c')) == (b'1234', None, b'12')
+
+        local.set('d', b'12345678', ttl=60)
+        assert local.get('a') is None
+        assert len(local) == 2 and local.bytes == 10
+        local.set('e', b'x' * 11, ttl=60)
+        assert local.get('e') is None and local.get('d') == b'12345678'
+
+    def test_size_estimate_scales_with_rows(self):
+        def page(rows):
+            return {'success': True, 'data': [{'id': i, 'title': 'x' * 50} for i in range(rows)]}
+
+        assert size_of(b'12345') == 5
+        small, large = size_of(page(10)), size_of(page(1000))
+        assert 50 * 10 < small < 50 * 10 * 10
+        assert 80 * small < large < 120 * small
+
+    def test_entries_expire(self, monkeypatch):
+        clock = [100.0]
+        monkeypatch.setattr('local_cache.time.monotonic', lambda: clock[0])
+        local = LocalCache(max_items=10, max_bytes=1000)
+        local.set('a', {'data': []}, ttl=5)
+
+        clock[0] += 4.9
+        assert local.get('a') == {'data': []}
+        clock[0] += 0.2
+        assert local.get('a') is None
+        assert local.bytes == 0
+
+
+class TestTiers:
+    def test_concurrent_first_use_creates_one_tier(self, app, monkeypatch):
+        created = []
+        original = LocalTier.__init__
+
+        def slow_init(self, *args):
+            created.append(self)
+            time.sleep(0.05)
+            original(self, *args)
+        monkeypatch.setattr(LocalTier, '__init__', slow_init)
+        app.extensions.pop('local_cache', None)
+
+        tiers = []
+        threads = [threading.Thread(target=lambda: tiers.append(get_local_tier(app))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(created) == 1
+        assert all(tier is tiers[0] for tier in tiers)
+
+    def test_hot_reads_stay_in_process(self, app, client, monkeypatch):
+        create_post(client)
+        client.get('/api/posts')
+
+        calls = []
+        get, get_many = cache.get, cache.get_many
+        monkeypatch.setattr(cache, 'get', lambda *args: calls.append(args) or get(*args))
+        monkeypatch.setattr(cache, 'get_many', lambda *args: calls.append(args) or get_many(*args))
+        response = client.get('/api/posts')
+
+        assert response.status_code == 200
+        assert calls == []
+        stats = get_local_tier().stats
+        assert stats.hits['l1'] >= 1
+        assert stats.hit_ratio('l1') > 0
+
+    def test_hit_ratios_on_metrics(self, app, client):
+        app.config['METRICS_ENABLED'] = True
+        client.get('/api/posts')
+        client.get('/api/posts')
+
+        body = client.get('/metrics').get_data(as_text=True)
+
+        assert 'cache_tier_hit_ratio{tier="l1"} 0.5' in body
+        assert 'cache_tier_misses_total{tier="l2"} 1' in body
+
+    def test_other_processes_writes_are_seen_within_the_generation_ttl(self, app, client, monkeypatch):
+        clock = [time.monotonic()]
+        monkeypatch.setattr('local_cache.time.monotonic', lambda: clock[0])
+        before = get_generations(POSTS_SCOPE)
+
+        # Another process bumps the generation in the shared cache only
+        cache.set(_generation_key(POSTS_SCOPE), before[0] + 1000, timeout=0)
+
+        assert get_generations(POSTS_SCOPE) == before
+        clock[0] += app.config['CACHE_L1_GENERATION_TTL'] + 0.1
+        assert get_generations(POSTS_SCOPE) == [before[0] + 1000]
+
+    def test_own_writes_are_seen_at_once(self, app, client):
+        create_post(client, 'First')
+        client.get('/api/posts')
+
+        create_post(client, 'Second')
+
+        assert client.get('/api/posts').get_json()['pagination']['total'] == 2
+
+
+class TestInvalidationBus:
+    def test_invalidations_reach_other_processes(self, app):
+        redis = FakeRedis()
+        config = dict(app.config)
+        first, second = LocalTier(config, redis), LocalTier(config, redis)
+        key = _generation_key(POSTS_SCOPE)
+        for tier in (first, second):
+            tier.cache.set(key, 1, ttl=60)
+            tier.cache.set('other', 2, ttl=60)
+
+        first.invalidated([key])
+
+        deadline = time.monotonic() + 2
+        while second.cache.get(key) is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert second.cache.get(key) is None
+        assert second.cache.get('other') == 2
+        assert first.cache.get(key) is None
+
+    def test_own_messages_are_ignored(self):
+        local = LocalCache(max_items=10, max_bytes=1000)
+        bus = InvalidationBus(FakeRedis(), 'channel', local)
+        local.set('a', 1, ttl=60)
+
+        bus.handle(bus.message(['a']))
+        assert local.get('a') == 1
+
+        bus.handle(InvalidationBus(None, 'channel', local).message(['a']))
+        assert local.get('a') is None
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+from models import db, Post, Comment
+
+
+def _seed_posts(count):
+    now = datetime(2026, 1, 1)
+    posts = [
+        Post(title=f'Post {i}', content='Body', author='Ava', created_at=now + timedelta(minutes=i // 2))
+        for i in range(count)
+    ]
+    db.session.add_all(posts)
+    db.session.commit()
+    return posts
+
+
+class TestCursorPagination:
+    def test_walks_all_posts_forward_and_back(self, client):
+        _seed_posts(7)
+
+        pages = []
+        cursor = ''
+        while cursor is not None:
+            body = client.get(f'/api/posts?per_page=3&cursor={cursor}').get_json()
+            pages.append([post['id'] for post in body['data']])
+            assert 'total' not in body['pagination']
+            cursor = body['pagination']['next_cursor']
+
+        seen = [post_id for page in pages for post_id in page]
+        assert [len(page) for page in pages] == [3, 3, 1]
+        assert sorted(seen) == list(range(1, 8))
+        # Ties on created_at are broken by id, newest first
+        assert seen == sorted(seen, reverse=True)
+
+        first = client.get('/api/posts?per_page=3&cursor=').get_json()
+        second = client.get(f"/api/posts?per_page=3&cursor={first['pagination']['next_cursor']}").get_json()
+        back = client.get(f"/api/posts?per_page=3&cursor={second['pagination']['prev_cursor']}").get_json()
+        assert [post['id'] for post in back['data']] == pages[0]
+        assert back['pagination']['has_prev'] is False
+
+    def test_cursor_mode_skips_count_unless_requested(self, client, query_counter):
+        _seed_posts(3)
+
+        query_counter.clear()
+        client.get('/api/posts?cursor=')
+        assert not any('count(' in statement.lower() for statement in query_counter)
+
+        body = client.get('/api/posts?cursor=&include_total=true').get_json()
+        assert body['pagination']['total'] == 3
+
+    def test_tampered_cursor_is_rejected(self, client):
+        _seed_posts(4)
+        cursor = client.get('/api/posts?per_page=2&cursor=').get_json()['pagination']['next_cursor']
+        tampered = cursor[:-2] + ('AA' if cursor[-2:] != 'AA' else 'BB')
+
+        response = client.get(f'/api/posts?cursor={tampered}')
+
+        assert response.status_code == 400
+
+    def test_comments_for_post_support_cursor(self, client):
+        post = _seed_posts(1)[0]
+        db.session.add_all([
+            Comment(post_id=post.id, author='Sam', content=f'Comment {i}', created_at=datetime(2026, 1, 1) + timedelta(minutes=i))
+            for i in range(5)
+        ])
+        db.session.commit()
+
+        body = client.get(f'/api/comments/post/{post.id}?per_page=2&cursor=').get_json()
+        assert [comment['content'] for comment in body['data']] == ['Comment 4', 'Comment 3']
+
+        body = client.get(f"/api/comments/post/{post.id}?per_page=2&cursor={body['pagination']['next_cursor']}").get_json()
+        assert [comment['content'] for comment in body['data']] == ['Comment 2', 'Comment 1']
@@ -0,0 +1,124 @@
+from models import db, Post, Comment
+
+
+def _seed(num_posts, comments_per_post=2):
+    for i in range(num_posts):
+        post = Post(
+            title=f'Post {i}', content='Body', author='Ava Smith',
+            comment_count=comments_per_post,
+            rating_sum=5 * comments_per_post,
+            rating_count=comments_per_post
+        )
+        db.session.add(post)
+        db.session.flush()
+        for j in range(comments_per_post):
+            db.session.add(Comment(post_id=post.id, author='Sam Hill', content=f'Comment {j}', rating=5))
+    db.session.commit()
+
+
+class TestListPosts:
+    def test_comment_counts_are_included(self, client):
+        _seed(3, comments_per_post=2)
+
+        response = client.get('/api/posts')
+
+        assert response.status_code == 200
+        data = response.get_json()['data']
+        assert len(data) == 3
+        assert all(post['comment_count'] == 2 for post in data)
+        assert all(post['average_rating'] == 5 for post in data)
+
+    def test_query_count_does_not_grow_with_page_size(self, client, query_counter):
+        _seed(50)
+
+        query_counter.clear()
+        client.get('/api/posts?per_page=5')
+        small_page = len(query_counter)
+
+        query_counter.clear()
+        client.get('/api/posts?per_page=50')
+        large_page = len(query_counter)
+
+        assert small_page == large_page
+        assert large_page <= 3
+
+
+class TestListFields:
+    def test_summary_has_excerpt_instead_of_content(self, client, query_counter):
+        db.session.add(Post(title='Long', content='word ' * 1000, author='Ava'))
+        db.session.commit()
+
+        query_counter.clear()
+        post = client.get('/api/posts?excerpt_length=12').get_json()['data'][0]
+
+        assert 'content' not in post
+        assert post['excerpt'] == 'word word wo\u2026'
+        assert set(post) == {
+            'id', 'title', 'excerpt', 'author', 'created_at', 'updated_at', 'comment_count', 'average_rating'
+        }
+        # The full text is never selected
+        assert not any('posts.content AS' in statement for statement in query_counter)
+
+    def test_short_content_is_not_marked_as_cut(self, client):
+        _seed(1)
+
+        assert client.get('/api/posts').get_json()['data'][0]['excerpt'] == 'Body'
+
+    def test_sparse_and_full_fieldsets(self, client):
+        _seed(2)
+
+        posts = client.get('/api/posts?fields=title,comment_count').get_json()['data']
+        assert [set(post) for post in posts] == [{'id', 'title', 'comment_count'}] * 2
+
+        full = client.get('/api/posts?fields=full').get_json()['data'][0]
+        assert full == Post.query.get(full['id']).to_dict()
+
+        # Each projection is cached separately
+        assert 'excerpt' in client.get('/api/posts').get_json()['data'][0]
+
+    def test_fields_work_with_cursor_pagination(self, client):
+        _seed(3)
+
+        first = client.get('/api/posts?cursor=&per_page=2&fields=title').get_json()
+        token = first['pagination']['next_cursor']
+        rest = client.get(f'/api/posts?cursor={token}&per_page=2&fields=title').get_json()['data']
+
+        assert [post['title'] for post in first['data'] + rest] == ['Post 2', 'Post 1', 'Post 0']
+
+    def test_unknown_field_is_rejected(self, client):
+        response = client.get('/api/posts?fields=title,password')
+
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'Unknown field: password'
+
+
+class TestPostDetail:
+    def test_embeds_first_page_of_comments_with_cursor(self, client):
+        _seed(1, comments_per_post=5)
+
+        data = client.get('/api/posts/1?comments=2').get_json()['data']
+
+        assert [comment['content'] for comment in data['comments']] == ['Comment 4', 'Comment 3']
+        assert data['comments_pagination']['has_next'] is True
+
+        cursor = data['comments_pagination']['next_cursor']
+        rest = client.get(f'/api/comments/post/1?cursor={cursor}').get_json()['data']
+        assert [comment['content'] for comment in rest] == ['Comment 2', 'Comment 1', 'Comment 0']
+
+    def test_comment_query_is_bounded(self, client, query_counter):
+        _seed(1, comments_per_post=30)
+
+        query_counter.clear()
+        data = client.get('/api/posts/1?comments=3').get_json()['data']
+
+        assert len(data['comments']) == 3
+        assert data['comment_count'] == 30
+        assert any('LIMIT' in statement for statement in query_counter)
+
+    def test_comments_can_be_left_out(self, client):
+        _seed(1, comments_per_post=3)
+
+        data = client.get('/api/posts/1?include_comments=false').get_json()['data']
+
+        assert 'comments' not in data
+        assert data['comment_count'] == 3
@@ -0,0 +1,151 @@
+from datetime import datetime, timedelta
+from models import db, Comment
+from rankings import TOP_RATED, TRENDING, MemoryRankingStore, get_rankings
+from tests.conftest import create_post
+
+
+def _comment(client, post_id, rating=None):
+    response = client.post('/api/comments', json={'post_id': post_id, 'author': 'Bo', 'content': 'Hi', 'rating': rating})
+    return response.get_json()['data']['id']
+
+
+def _titles(client, path):
+    return [post['title'] for post in client.get(path).get_json()['data']]
+
+
+class TestMemoryRankingStore:
+    def test_sorted_set_operations(self):
+        store = MemoryRankingStore()
+        store.replace('r', {1: 1.0, 2: 3.0, 3: 2.0}, epoch=0)
+        store.increment('r', {1: 5.0, 4: 0.5})
+        store.set_scores('r', {2: 0.1})
+        store.remove('r', [3])
+
+        assert store.range('r', 0, 10) == [1, 4, 2]
+        assert store.range('r', 1, 1) == [4]
+        assert store.size('r') == 3
+        assert store.epoch('r') == 0
+
+
+class TestFirstBuild:
+    def test_one_request_builds_while_others_are_asked_to_retry(self, app, client):
+        post = create_post(client, 'Post')
+        _comment(client, post)
+        store = get_rankings().store
+
+        # Another request is building the rankings
+        token = store.acquire_build_lock(60)
+        response = client.get('/api/posts/trending')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '2'
+        assert store.epoch(TRENDING) is None
+
+        store.release_build_lock(token)
+        assert _titles(client, '/api/posts/trending') == ['Post']
+        assert store.epoch(TRENDING) is not None
+
+
+class TestTrending:
+    def test_recent_activity_ranks_first(self, client):
+        quiet = create_post(client, 'Quiet')
+        busy = create_post(client, 'Busy')
+        _comment(client, quiet)
+        for _ in range(3):
+            _comment(client, busy)
+
+        assert _titles(client, '/api/posts/trending') == ['Busy', 'Quiet']
+
+    def test_older_comments_weigh_less(self, app, client):
+        old = create_post(client, 'Old')
+        new = create_post(client, 'New')
+        # Three comments two days ago (two half-lives) weigh 0.75 in all
+        two_days_ago = datetime.utcnow() - timedelta(days=2)
+        db.session.add_all([Comment(post_id=old, author='Bo', content='Hi', created_at=two_days_ago) for _ in range(3)])
+        db.session.add(Comment(post_id=new, author='Bo', content='Hi'))
+        db.session.commit()
+        # Outside the window: not counted by a rebuild
+        db.session.add(Comment(post_id=old, author='Bo', content='Hi', created_at=datetime.utcnow() - timedelta(days=30)))
+        db.session.commit()
+
+        assert get_rankings().rebuild() == {TRENDING: 2, TOP_RATED: 0}
+        assert _titles(client, '/api/posts/trending') == ['New', 'Old']
+
+    def test_deleting_comments_older_than_the_window_changes_nothing(self, app, client):
+        post = create_post(client, 'Post')
+        old = Comment(post_id=post, author='Bo', content='Hi', created_at=datetime.utcnow() - timedelta(days=30))
+        db.session.add(old)
+        db.session.commit()
+        _comment(client, post)
+        rankings = get_rankings()
+        rankings.rebuild()
+        score = rankings.store._scores[TRENDING][post]
+
+        assert client.delete(f'/api/comments/{old.id}').status_code == 200
+        assert rankings.store._scores[TRENDING][post] == score
+
+    def test_writes_update_the_ranking_incrementally(self, client):
+        first = create_post(client, 'First')
+        second = create_post(client, 'Second')
+        _comment(client, first)
+        assert _titles(client, '/api/posts/trending') == ['First']
+
+        for _ in range(2):
+            _comment(client, second)
+        assert _titles(client, '/api/posts/trending') == ['Second', 'First']
+
+        response = client.delete('/api/comments/batch', json={'ids': [2, 3]})
+        assert response.status_code == 200
+        client.post('/api/comments/batch', json={'items': [{'post_id': first, 'author': 'Bo', 'content': 'x'}]})
+        assert _titles(client, '/api/posts/trending')[0] == 'First'
+
+        client.delete(f'/api/posts/{first}')
+        assert _titles(client, '/api/posts/trending') == ['Second']
+
+
+class TestTopRated:
+    def test_bayesian_order_and_updates(self, client):
+        single = create_post(client, 'One five')
+        many = create_post(client, 'Many fours')
+        create_post(client, 'Unrated')
+        _comment(client, single, rating=5)
+        for _ in range(10):
+            _comment(client, many, rating=4)
+
+        # (3*5 + 5) / 6 = 3.33 < (3*5 + 40) / 15 = 3.67
+        assert _titles(client, '/api/posts/top-rated') == ['Many fours', 'One five']
+
+        for _ in range(20):
+            comment_id = _comment(client, single, rating=1)
+        client.put(f'/api/comments/{comment_id}', json={'rating': 5})
+        body = client.get('/api/posts/top-rated?per_page=1&page=2').get_json()
+        assert [post['title'] for post in body['data']] == ['One five']
+        assert body['pagination']['total'] == 2
+
+        client.delete(f'/api/comments/{comment_id}')
+        assert _titles(client, '/api/posts/top-rated') == ['Many fours', 'One five']
+
+    def test_pages_only_load_their_posts(self, client, query_counter):
+        for i in range(5):
+            post_id = create_post(client, f'Post {i}')
+            _comment(client, post_id, rating=1 + i % 5)
+        client.get('/api/posts/top-rated')
+
+        query_counter.clear()
+        body = client.get('/api/posts/top-rated?per_page=2&fields=id,title').get_json()
+
+        assert [post['title'] for post in body['data']] == ['Post 4', 'Post 3']
+        assert len(query_counter) == 1
+        assert 'comments' not in query_counter[0]
+
+
+class TestRebuild:
+    def test_rebuild_corrects_drift(self, app, client):
+        post_id = create_post(client, 'Hello')
+        _comment(client, post_id, rating=4)
+        rankings = get_rankings()
+        rankings.store.set_scores(TOP_RATED, {post_id: 0.0, 999: 5.0})
+
+        result = app.test_cli_runner().invoke(args=['rebuild-rankings'])
+
+        assert 'top_rated: 1 post(s) ranked' in result.output
+        assert rankings.store.range(TOP_RATED, 0, 10) == [post_id]
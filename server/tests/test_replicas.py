@@ -0,0 +1,102 @@
+import pytest
+from sqlalchemy import insert
+from app import create_app
+from config import config, TestingConfig
+from database import STICKY_COOKIE
+from models import db, Post
+
+
+def _make_app(tmp_path, create_replicas=True, **settings):
+    config['replica_test'] = type('ReplicaTestConfig', (TestingConfig,), dict({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/primary.db',
+        'SQLALCHEMY_REPLICA_URIS': [f'sqlite:///{tmp_path}/replica.db'],
+        'REPLICA_CHECK_INTERVAL': 0,
+    }, **settings))
+    app = create_app('replica_test')
+    with app.app_context():
+        db.create_all()
+    if create_replicas:
+        db.metadata.create_all(_replica_engine(app))
+    return app
+
+
+def _replica_engine(app):
+    return app.extensions['replica_router'].replicas[0].engine
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    app = _make_app(tmp_path, CACHE_TYPE='NullCache')
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+    app.extensions['replica_router'].dispose()
+    del config['replica_test']
+
+
+def _insert_post(app, replica=False):
+    with app.app_context():
+        engine = _replica_engine(app) if replica else db.engine
+        with engine.begin() as conn:
+            conn.execute(insert(Post.__table__), {'title': 'Hello', 'content': 'Body', 'author': 'Ava'})
+
+
+def _total(client):
+    return client.get('/api/posts').get_json()['pagination']['total']
+
+
+class TestReplicaRouting:
+    def test_reads_go_to_the_replica(self, replica_app):
+        client = replica_app.test_client()
+        _insert_post(replica_app)
+
+        assert _total(client) == 0
+
+        _insert_post(replica_app, replica=True)
+        assert _total(client) == 1
+
+    def test_writes_go_to_the_primary_and_pin_the_writer(self, replica_app):
+        writer = replica_app.test_client()
+        other = replica_app.test_client()
+
+        response = writer.post('/api/posts', json={'title': 'Hello', 'content': 'Body', 'author': 'Ava'})
+
+        assert response.status_code == 201
+        assert STICKY_COOKIE in response.headers['Set-Cookie']
+        assert _total(writer) == 1
+        assert _total(other) == 0
+
+    def test_failed_writes_do_not_pin(self, replica_app):
+        client = replica_app.test_client()
+
+        response = client.post('/api/posts', json={'title': ''})
+
+        assert response.status_code == 400
+        assert 'Set-Cookie' not in response.headers
+
+    def test_unreachable_replica_falls_back_to_primary(self, tmp_path):
+        app = _make_app(tmp_path, create_replicas=False, CACHE_TYPE='NullCache',
+                        SQLALCHEMY_REPLICA_URIS=[f'sqlite:///{tmp_path}/missing/replica.db'])
+        _insert_post(app)
+
+        assert _total(app.test_client()) == 1
+
+    def test_lagging_replica_falls_back_to_primary(self, tmp_path):
+        app = _make_app(tmp_path, CACHE_TYPE='NullCache', REPLICA_MAX_LAG_SECONDS=-1)
+        _insert_post(app)
+
+        assert _total(app.test_client()) == 1
+
+
+class TestReplicaCaching:
+    def test_replica_reads_right_after_a_write_are_not_cached(self, tmp_path):
+        app = _make_app(tmp_path, CACHE_TYPE='SimpleCache')
+        writer = app.test_client()
+        reader = app.test_client()
+
+        writer.post('/api/posts', json={'title': 'Hello', 'content': 'Body', 'author': 'Ava'})
+        assert _total(reader) == 0
+
+        # The replica catches up; the stale empty page must not be served
+        _insert_post(app, replica=True)
+        assert _total(reader) == 1
@@ -0,0 +1,51 @@
+from tests.conftest import create_post
+
+
+def _search(client, query):
+    return [post['id'] for post in client.get(f'/api/posts?{query}').get_json()['data']]
+
+
+class TestFullTextSearch:
+    def test_matches_words_and_prefixes_in_any_field(self, client):
+        mountain = create_post(client, 'Mountain trip', 'We hiked for days.')
+        river = create_post(client, 'River notes', 'Quiet evenings.', author='Noah Mountainview')
+        create_post(client, 'City lights', 'Traffic everywhere.')
+
+        assert sorted(_search(client, 'search=mountain')) == [mountain, river]
+        assert _search(client, 'search=hik') == [mountain]
+        assert _search(client, 'search=MOUNTAIN%20trip') == [mountain]
+
+    def test_relevance_ranks_title_matches_first(self, client):
+        title_match = create_post(client, 'Wetlands', 'A short note.')
+        create_post(client, 'Other news', 'Mentions wetlands once.')
+
+        assert _search(client, 'search=wetlands&sort=relevance')[0] == title_match
+
+    def test_index_follows_updates_and_deletes(self, client):
+        post_id = create_post(client, 'Desert', 'Sand and sun.')
+
+        client.put(f'/api/posts/{post_id}', json={'title': 'Glacier'})
+        assert _search(client, 'search=desert') == []
+        assert _search(client, 'search=glacier') == [post_id]
+
+        client.delete(f'/api/posts/{post_id}')
+        assert _search(client, 'search=glacier') == []
+
+    def test_terms_found_by_no_word_fall_back_to_substring(self, client):
+        hello = create_post(client, 'Hello world', 'Body')
+        create_post(client, 'Other', 'Body')
+
+        # Not a word prefix, but a substring, as before full-text search
+        assert _search(client, 'search=ell') == [hello]
+        assert _search(client, 'search=ello%20wor') == [hello]
+        assert _search(client, 'search=zzz') == []
+
+    def test_term_without_words_falls_back_to_substring(self, client):
+        post_id = create_post(client, 'Hello!?', 'Body')
+
+        assert _search(client, 'search=%21%3F') == [post_id]
+
+    def test_relevance_is_rejected_in_cursor_mode(self, client):
+        response = client.get('/api/posts?search=x&sort=relevance&cursor=')
+
+        assert response.status_code == 400
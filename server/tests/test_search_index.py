@@ -0,0 +1,77 @@
+import pytest
+from search_index import InvertedIndex
+
+
+@pytest.fixture
+def index():
+    index = InvertedIndex()
+    index.add(1, 'Mountain trip', 'We hiked up the mountain for three days.', 'Ava Smith', created_at=1)
+    index.add(2, 'River notes', 'A quiet trip down the river.', 'Noah Mountainview', created_at=2)
+    index.add(3, 'City lights', 'Traffic and noise, day and night.', 'Ava Lee', created_at=3)
+    return index
+
+
+class TestInvertedIndex:
+    def test_prefix_matches_across_fields(self, index):
+        assert set(index.search('mountain')) == {1, 2}
+        assert set(index.search('hik*')) == {1}
+
+    def test_all_clauses_must_match(self, index):
+        assert set(index.search('ava trip')) == {1}
+
+    def test_phrase_query_requires_adjacent_words(self, index):
+        assert set(index.search('"quiet trip"')) == {2}
+        assert index.search('"trip quiet"') == {}
+        # Phrases never span two fields
+        assert index.search('"trip ava"') == {}
+
+    def test_bm25_prefers_higher_term_frequency(self, index):
+        assert index.ranked_ids('mountain', sort='relevance') == [1, 2]
+        assert index.ranked_ids('mountain', sort='newest') == [2, 1]
+
+    def test_incremental_update_and_remove(self, index):
+        index.add(1, 'Glacier walk', 'Ice everywhere.', 'Ava Smith', created_at=1)
+        assert set(index.search('mountain')) == {2}
+        assert set(index.search('glacier')) == {1}
+
+        index.remove(2)
+        assert index.search('mountain') == {}
+        assert len(index) == 2
+
+    def test_compaction_keeps_live_documents(self):
+        index = InvertedIndex(compact_ratio=0.1)
+        for post_id in range(20):
+            index.add(post_id, f'Post {post_id}', 'shared words', 'Ava')
+        for post_id in range(10):
+            index.remove(post_id)
+
+        assert sorted(index.search('shared')) == list(range(10, 20))
+
+    def test_repeated_updates_stay_bounded(self, index):
+        for version in range(200):
+            index.add(1, f'Mountain trip {version}', 'We hiked up the mountain.', 'Ava Smith', created_at=1)
+
+        assert len(index._doc_post_ids) <= 4
+        assert len(index._postings['mountain'].docs) <= 4
+        assert len(index._postings) < 30
+        assert set(index.search('mountain')) == {1, 2}
+        assert set(index.search('199')) == {1}
+        assert index.ranked_ids('mountain', sort='newest') == [2, 1]
+
+
+class TestMemorySearchBackend:
+    def test_listing_searches_through_the_index(self, app, client):
+        app.config['SEARCH_BACKEND'] = 'memory'
+        for title in ('Mountain trip', 'River notes', 'Mountain lake'):
+            client.post('/api/posts', json={'title': title, 'content': 'Body', 'author': 'Ava'})
+
+        body = client.get('/api/posts?search=mountain&per_page=1').get_json()
+        assert [post['title'] for post in body['data']] == ['Mountain lake']
+        assert body['pagination']['total'] == 2
+
+        created = client.post('/api/posts', json={'title': 'Mountain hut', 'content': 'Body', 'author': 'Ava'})
+        client.delete('/api/posts/1')
+
+        body = client.get('/api/posts?search=mountain').get_json()
+        assert [post['title'] for post in body['data']] == ['Mountain hut', 'Mountain lake']
+        assert created.status_code == 201
@@ -0,0 +1,80 @@
+import pytest
+from collections import Counter
+from commands import find_aggregate_drift
+from models import db, Post, Comment
+from datetime import datetime
+from seed import DEFAULT_NOW, DataGenerator, ZipfSampler, parse_args, populate
+
+
+class TestDataGenerator:
+    def test_same_seed_gives_same_rows(self):
+        first = DataGenerator(seed=7)
+        second = DataGenerator(seed=7)
+
+        assert list(first.posts(1, 20)) == list(second.posts(1, 20))
+        assert list(first.comments(1, 20, 50)) == list(second.comments(1, 20, 50))
+
+    def test_timestamps_count_back_from_a_fixed_time(self):
+        rows = list(DataGenerator().posts(1, 20))
+        assert all(row['created_at'] <= DEFAULT_NOW for row in rows)
+
+        later = datetime(2030, 6, 1)
+        shifted = list(DataGenerator(now=later).posts(1, 20))
+        assert [row['created_at'] - DEFAULT_NOW for row in rows] == \
+            [row['created_at'] - later for row in shifted]
+
+    def test_now_option(self):
+        assert parse_args([]).now == DEFAULT_NOW
+        assert parse_args(['--now', '2030-06-01T12:00:00']).now == datetime(2030, 6, 1, 12)
+        assert parse_args(['--now', '2030-06-01T14:00:00+02:00']).now == datetime(2030, 6, 1, 12)
+        with pytest.raises(SystemExit):
+            parse_args(['--now', 'tomorrow'])
+
+    def test_content_length_is_respected(self):
+        rows = list(DataGenerator(content_length=2000).posts(1, 50))
+        average = sum(len(row['content']) for row in rows) / len(rows)
+
+        assert 1000 < average < 3500
+
+    def test_skew_concentrates_comments(self):
+        def top_share(skew):
+            counts = Counter(row['post_id'] for row in DataGenerator().comments(1, 1000, 20000, skew))
+            return counts.most_common(1)[0][1] / 20000
+
+        assert top_share(1.2) > 10 * top_share(0.0)
+
+    def test_zipf_sampler_stays_in_range(self):
+        rng = DataGenerator().rng
+        for s in (0.0, 0.5, 1.0, 2.0):
+            sampler = ZipfSampler(10, s)
+            assert {sampler.sample(rng) for _ in range(2000)} <= set(range(10))
+
+
+class TestPopulate:
+    def test_writes_rows_in_chunks_with_consistent_aggregates(self, app, query_counter):
+        assert populate(posts=30, comments=200, skew=1.0, chunk_size=64) == (30, 200)
+
+        assert Post.query.count() == 30
+        assert Comment.query.count() == 200
+        assert find_aggregate_drift() == []
+        inserts = [s for s in query_counter if s.startswith('INSERT INTO comments')]
+        assert len(inserts) <= 4
+
+    def test_no_clear_appends_after_existing_posts(self, app):
+        populate(posts=5, comments=10)
+        populate(posts=5, comments=10, seed=1, clear=False)
+
+        assert Post.query.count() == 10
+        assert Comment.query.count() == 20
+        assert find_aggregate_drift() == []
+
+    def test_now_is_passed_to_the_generator(self, app):
+        now = datetime(2030, 6, 1)
+        populate(posts=5, comments=10, now=now)
+
+        newest = db.session.scalar(db.select(db.func.max(Post.created_at)))
+        assert DEFAULT_NOW < newest <= now
+
+    def test_copy_requires_postgres(self, app):
+        with pytest.raises(ValueError, match='PostgreSQL'):
+            populate(posts=1, comments=0, method='copy')
@@ -0,0 +1,60 @@
+import json
+import pytest
+from datetime import datetime, timezone
+from flask.json.provider import DefaultJSONProvider
+from models import db, Post, Comment, POST_COLUMNS, COMMENT_COLUMNS
+from serializers import OrjsonProvider, comment_dict, iso_utc, json_provider_class, post_dict
+
+
+def _seed():
+    post = Post(title='Hello', content='Body', author='Ava', rating_sum=9, rating_count=2, comment_count=2)
+    db.session.add(post)
+    db.session.flush()
+    db.session.add(Comment(post_id=post.id, author='Sam', content='Hi', rating=4))
+    db.session.commit()
+    return post
+
+
+class TestRowSerializers:
+    def test_iso_utc_matches_aware_isoformat(self):
+        for value in (datetime(2026, 3, 1), datetime(2026, 3, 1, 12, 30, 5, 123456)):
+            assert iso_utc(value) == value.replace(tzinfo=timezone.utc).isoformat()
+        assert iso_utc(None) is None
+
+    def test_rows_and_instances_serialize_alike(self, app):
+        post = _seed()
+        comment = Comment.query.one()
+
+        assert post_dict(db.session.query(*POST_COLUMNS).one()) == post.to_dict()
+        assert comment_dict(db.session.query(*COMMENT_COLUMNS).one()) == comment.to_dict()
+        assert post.to_dict()['average_rating'] == 4.5
+
+
+class TestJsonProvider:
+    def test_provider_selection(self):
+        assert json_provider_class('auto') is OrjsonProvider
+        assert json_provider_class('orjson') is OrjsonProvider
+        assert json_provider_class('json') is DefaultJSONProvider
+        with pytest.raises(ValueError):
+            json_provider_class('yaml')
+
+    def test_app_uses_orjson(self, app):
+        assert isinstance(app.json, OrjsonProvider)
+
+    def test_encodes_like_the_stdlib_provider(self, app):
+        value = {'when': datetime(2026, 3, 1), 'text': 'café', 'none': None}
+
+        assert json.loads(app.json.dumps(value)) == json.loads(DefaultJSONProvider(app).dumps(value))
+        assert json.loads(app.json.dumps({1: 'one'})) == {'1': 'one'}
+        # Stdlib-only options still work
+        assert app.json.dumps({'b': 1, 'a': 2}, sort_keys=True) == '{"a": 2, "b": 1}'
+
+    def test_responses_and_requests(self, client):
+        _seed()
+
+        response = client.get('/api/posts')
+        assert response.mimetype == 'application/json'
+        assert response.get_json()['data'][0]['title'] == 'Hello'
+
+        response = client.post('/api/posts', data='{"title": "T", "content": "C", "author": "A"}', content_type='application/json')
+        assert response.status_code == 201
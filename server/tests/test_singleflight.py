@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import time
+from async_caching import AsyncResponseCache, InProcessCache
+from caching import CacheEntry, cache, needs_refresh, read_through, _fill_state
+from singleflight import AsyncSingleFlight
+
+
+class Builder:
+    """Counts its calls; each takes `delay` seconds."""
+
+    def __init__(self, value='fresh', delay=0.1):
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return self.value
+
+
+def _concurrently(app, count, fn):
+    results = [None] * count
+    start = threading.Barrier(count)
+
+    def run(index):
+        with app.app_context():
+            start.wait()
+            results[index] = fn()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestSingleFlight:
+    def test_concurrent_misses_build_once(self, app):
+        builder = Builder()
+
+        results = _concurrently(app, 16, lambda: read_through('hot', 60, builder))
+
+        assert builder.calls == 1
+        assert results == ['fresh'] * 16
+        assert cache.get('hot').value == 'fresh'
+
+    def test_stale_entry_is_rebuilt_once_while_others_get_it(self, app):
+        cache.set('hot', CacheEntry('old', time.time() - 1, 0.1), timeout=60)
+        builder = Builder(delay=0.2)
+
+        results = _concurrently(app, 16, lambda: read_through('hot', 60, builder))
+
+        assert builder.calls == 1
+        assert sorted(results) == ['fresh'] + ['old'] * 15
+        assert cache.get('hot').value == 'fresh'
+
+    def test_waits_for_another_process_fill(self, app):
+        lock = _fill_state()[1]
+        token = lock.acquire('hot')
+        builder = Builder()
+
+        def other_process():
+            time.sleep(0.1)
+            cache.set('hot', CacheEntry('theirs', time.time() + 60, 0.1), timeout=60)
+            lock.release('hot', token)
+        threading.Thread(target=other_process).start()
+
+        assert read_through('hot', 60, builder) == 'theirs'
+        assert builder.calls == 0
+
+    def test_builds_when_the_other_process_gives_up(self, app):
+        lock = _fill_state()[1]
+        token = lock.acquire('hot')
+        threading.Timer(0.1, lock.release, args=('hot', token)).start()
+        builder = Builder(delay=0)
+
+        assert read_through('hot', 60, builder) == 'fresh'
+        assert builder.calls == 1
+
+    def test_bare_values_are_served(self, app):
+        cache.set('hot', {'data': []})
+
+        assert read_through('hot', 60, Builder()) == {'data': []}
+
+
+class TestEarlyRefresh:
+    def test_probability_grows_near_expiry(self):
+        entry = CacheEntry('value', fresh_until=100.0, build_time=1.0)
+
+        # -log(1 - 0.5) = 0.69 s ahead of expiry with a 1 s build
+        assert not needs_refresh(entry, 1.0, now=99.0, rand=lambda: 0.5)
+        assert needs_refresh(entry, 1.0, now=99.5, rand=lambda: 0.5)
+        assert needs_refresh(entry, 1.0, now=100.0, rand=lambda: 0.0)
+        assert not needs_refresh(entry, 0, now=99.99, rand=lambda: 0.99)
+        assert not needs_refresh({'bare': 'value'}, 1.0)
+
+
+class TestAsync:
+    def test_concurrent_misses_build_once(self, app):
+        responses = AsyncResponseCache(InProcessCache(cache.cache, 10), app.config)
+        calls = []
+
+        async def build():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'fresh'
+
+        async def main():
+            return await asyncio.gather(*[responses.read_through('hot', 60, build) for _ in range(16)])
+
+        assert asyncio.run(main()) == ['fresh'] * 16
+        assert calls == [1]
+
+    def test_failures_are_not_shared(self):
+        flights = AsyncSingleFlight()
+        calls = []
+
+        async def flaky():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            if len(calls) == 1:
+                raise RuntimeError('database down')
+            return 'fresh'
+
+        async def main():
+            return await asyncio.gather(flights.run('k', flaky, 1), flights.run('k', flaky, 1), return_exceptions=True)
+
+        first, second = asyncio.run(main())
+        assert isinstance(first, RuntimeError)
+        assert second == 'fresh'
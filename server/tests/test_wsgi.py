@@ -0,0 +1,29 @@
+import os
+import runpy
+import config
+
+GUNICORN_CONF = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gunicorn.conf.py')
+
+
+class TestGunicornConfig:
+    def test_settings_come_from_config(self, monkeypatch):
+        monkeypatch.setenv('FLASK_ENV', 'production')
+        monkeypatch.setattr(config.ProductionConfig, 'WSGI_WORKERS', 3)
+        monkeypatch.setattr(config.ProductionConfig, 'WSGI_THREADS', 8)
+        monkeypatch.setattr(config.ProductionConfig, 'WSGI_MAX_REQUESTS', 100)
+
+        settings = runpy.run_path(GUNICORN_CONF)
+
+        assert settings['workers'] == 3
+        assert settings['threads'] == 8
+        assert settings['worker_class'] == 'gthread'
+        assert settings['max_requests'] == 100
+        assert settings['preload_app'] is True
+        # Module-level names gunicorn would mistake for settings stay private
+        assert 'config' not in settings
+
+    def test_single_thread_uses_sync_worker(self, monkeypatch):
+        monkeypatch.setenv('FLASK_ENV', 'production')
+        monkeypatch.setattr(config.ProductionConfig, 'WSGI_THREADS', 1)
+
+        assert runpy.run_path(GUNICORN_CONF)['worker_class'] == 'sync'
@@ -0,0 +1,171 @@
+"""
+Validation of post and comment payloads.
+
+Shared by the single-item and batch endpoints so both accept exactly the
+same input and report the same error messages.
+"""
+
+
+class ValidationError(ValueError):
+    """Raised when a payload is invalid; the message is safe to return."""
+
+
+def _text(value):
+    return value.strip() if isinstance(value, str) else ''
+
+
+def _rating(value):
+    if value is not None:
+        if not isinstance(value, int) or isinstance(value, bool) or value < 1 or value > 5:
+            raise ValidationError('Rating must be an integer between 1 and 5')
+    return value
+
+
+def validate_new_post(data):
+    """
+    Validate the payload for creating a post.
+
+    Args:
+        data: Request JSON object
+
+    Returns:
+        Dictionary with cleaned title, content and author
+
+    Raises:
+        ValidationError: If a field is missing or invalid
+    """
+    title = _text(data.get('title'))
+    content = _text(data.get('content'))
+    author = _text(data.get('author'))
+
+    if not title or not content or not author:
+        raise ValidationError('Title, content, and author are required')
+
+    if len(title) > 200:
+        raise ValidationError('Title must be max 200 characters')
+
+    if len(author) > 100:
+        raise ValidationError('Author must be max 100 characters')
+
+    return {'title': title, 'content': content, 'author': author}
+
+
+def validate_post_changes(data):
+    """
+    Validate a partial update of a post.
+
+    Args:
+        data: Request JSON object
+
+    Returns:
+        Dictionary with the cleaned fields present in `data`
+
+    Raises:
+        ValidationError: If a provided field is invalid
+    """
+    changes = {}
+
+    if 'title' in data:
+        title = _text(data['title'])
+        if not title:
+            raise ValidationError('Title cannot be empty')
+        if len(title) > 200:
+            raise ValidationError('Title must be max 200 characters')
+        changes['title'] = title
+
+    if 'content' in data:
+        content = _text(data['content'])
+        if not content:
+            raise ValidationError('Content cannot be empty')
+        changes['content'] = content
+
+    if 'author' in data:
+        author = _text(data['author'])
+        if not author:
+            raise ValidationError('Author cannot be empty')
+        if len(author) > 100:
+            raise ValidationError('Author must be max 100 characters')
+        changes['author'] = author
+
+    return changes
+
+
+def validate_new_comment(data):
+    """
+    Validate the payload for creating a comment.
+
+    Args:
+        data: Request JSON object
+
+    Returns:
+        Dictionary with post_id and cleaned author, content and rating
+
+    Raises:
+        ValidationError: If a field is missing or invalid
+    """
+    post_id = data.get('post_id')
+    author = _text(data.get('author'))
+    content = _text(data.get('content'))
+
+    if not post_id or not isinstance(post_id, int) or isinstance(post_id, bool):
+        raise ValidationError('post_id is required and must be an integer')
+
+    if not author or not content:
+        raise ValidationError('Author and content are required')
+
+    if len(author) > 100:
+        raise ValidationError('Author must be max 100 characters')
+
+    return {
+        'post_id': post_id,
+        'author': author,
+        'content': content,
+        'rating': _rating(data.get('rating'))
+    }
+
+
+def validate_comment_changes(data):
+    """
+    Validate a partial update of a comment.
+
+    Args:
+        data: Request JSON object
+
+    Returns:
+        Dictionary with the cleaned fields present in `data`
+
+    Raises:
+        ValidationError: If a provided field is invalid
+    """
+    changes = {}
+
+    if 'author' in data:
+        author = _text(data['author'])
+        if not author:
+            raise ValidationError('Author cannot be empty')
+        if len(author) > 100:
+            raise ValidationError('Author must be max 100 characters')
+        changes['author'] = author
+
+    if 'content' in data:
+        content = _text(data['content'])
+        if not content:
+            raise ValidationError('Content cannot be empty')
+        changes['content'] = content
+
+    if 'rating' in data:
+        changes['rating'] = _rating(data['rating'])
+
+    return changes
+
+
+def validate_id(value, name='id'):
+    """
+    Validate an entity id from a batch payload.
+
+    Raises:
+        ValidationError: If `value` is not a positive integer
+    """
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise ValidationError(f'{name} is required and must be an integer')
+    return value
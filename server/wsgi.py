@@ -0,0 +1,12 @@
+"""
+WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Uses the configuration named by FLASK_ENV (default: production).
+"""
+
+import os
+from app import create_app
+
+app = create_app(os.environ.get('FLASK_ENV', 'production'))